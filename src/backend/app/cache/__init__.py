@@ -0,0 +1 @@
+"""Read-through cache."""
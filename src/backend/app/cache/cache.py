@@ -0,0 +1,418 @@
+# Copyright (c) 2022, 2023 Humanitarian OpenStreetMap Team
+#
+# This file is part of FMTM.
+#
+#     FMTM is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     FMTM is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with FMTM.  If not, see <https:#www.gnu.org/licenses/>.
+#
+"""Read-through cache of the hot read endpoints.
+
+Responses are kept in an in-process LRU and, when CACHE_REDIS_URL is set and
+redis is installed, in Redis shared by all the workers. The entries of a
+project are keyed by its versions, so a response older than the project can
+not be served, whatever the worker that cached it.
+
+Triggers notify the fmtm_cache channel when a project, its tasks, features or
+submissions, or the XLSForms change. Every worker listens to it, drops the
+in-process entries that can no longer be reached and keeps the project
+versions in memory. While the listener is connected, a cache hit makes no
+query at all; when it is not, the versions are read from the database on
+every request. Stale entries in Redis are never read and expire with their
+TTL.
+"""
+import json
+import select
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+import psycopg2
+from fastapi import HTTPException, Response
+from fastapi.logger import logger as logger
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..config import settings
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+CHANNEL = "fmtm_cache"
+# Scope of the entries depending on the XLSForms, and payload of their changes
+FORMS = "forms"
+
+# Keys are tuples starting with the name of the cached endpoint and its scope,
+# the ID of the project or a name such as FORMS. Notifications name a scope,
+# or a project and one of its tile layers, for the entries named after it.
+Key = Tuple[Hashable, ...]
+
+# Every LRUCache, dropped from on notifications
+local_caches = []
+
+
+class LRUCache:
+    """A thread safe LRU cache, bounded by the total size of its values."""
+
+    def __init__(self, max_bytes: int):
+        """
+        Args:
+            max_bytes (int): The size above which the least recently used values are dropped.
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.values = OrderedDict()
+        self.lock = threading.Lock()
+        local_caches.append(self)
+
+    def get(self, key: Key) -> Any:
+        """
+        Return a cached value and mark it as recently used.
+
+        Args:
+            key (Key): The key of the value.
+
+        Returns:
+            Any: The value, or None if it is not cached.
+        """
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                return None
+            self.values.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: Key, value: Any, size: int):
+        """
+        Cache a value, dropping the least recently used values above max_bytes.
+
+        Args:
+            key (Key): The key of the value.
+            value (Any): The value.
+            size (int): The size of the value in bytes.
+        """
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.values.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self.values[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, dropped) = self.values.popitem(last=False)
+                self.size -= dropped
+
+    def drop(self, scope: Hashable, name: Optional[str] = None):
+        """
+        Drop the values of a scope.
+
+        Args:
+            scope (Hashable): The ID of a project, or a name such as FORMS.
+            name (str, optional): Only drop the values of this name, such as a tile layer. Defaults to None.
+        """
+        with self.lock:
+            stale = [
+                key
+                for key in self.values
+                if key[1] == scope and (name is None or key[0] == name)
+            ]
+            for key in stale:
+                self.size -= self.values.pop(key)[1]
+
+    def clear(self):
+        """Drop every cached value."""
+        with self.lock:
+            self.values.clear()
+            self.size = 0
+
+
+class CachedResponse(NamedTuple):
+    """
+    A response kept in the cache.
+
+    Attributes:
+        body (bytes): The body of the response.
+        headers (dict): The headers of the response.
+    """
+
+    body: bytes
+    headers: Dict[str, str]
+
+    def response(self) -> Response:
+        """Build a response to send from the cached one."""
+        return Response(self.body, headers=self.headers)
+
+    def dumps(self) -> bytes:
+        """Serialise the response for Redis, its headers as JSON before its body."""
+        headers = json.dumps(self.headers).encode()
+        return len(headers).to_bytes(4, "big") + headers + self.body
+
+    @classmethod
+    def loads(cls, data: bytes) -> "CachedResponse":
+        """Read back a response serialised by dumps."""
+        end = 4 + int.from_bytes(data[:4], "big")
+        return cls(data[end:], json.loads(data[4:end]))
+
+
+class ResponseCache:
+    """Responses cached in the worker, and in Redis when it is configured."""
+
+    def __init__(self, max_bytes: int, redis_url: str = None, ttl: int = 3600):
+        """
+        Args:
+            max_bytes (int): The size of the in-process cache.
+            redis_url (str, optional): The URL of the Redis shared by the workers. Defaults to None.
+            ttl (int, optional): The seconds the entries are kept in Redis. Defaults to 3600.
+        """
+        self.local = LRUCache(max_bytes)
+        self.ttl = ttl
+        self.shared = None
+        if redis_url:
+            if redis is None:
+                logger.warning("CACHE_REDIS_URL is set but redis is not installed")
+            else:
+                self.shared = redis.Redis.from_url(redis_url)
+
+    @staticmethod
+    def shared_key(key: Key) -> str:
+        """Get the Redis key of an entry, starting with its scope."""
+        name, scope, *rest = key
+        return "\x1f".join(str(part) for part in ("fmtm", scope, name, *rest))
+
+    def get(self, key: Key) -> Optional[CachedResponse]:
+        """
+        Return a cached response, from the worker or else from Redis.
+
+        Args:
+            key (Key): The key of the response.
+
+        Returns:
+            CachedResponse: The response, or None if it is not cached.
+        """
+        cached = self.local.get(key)
+        if cached is not None or self.shared is None:
+            return cached
+
+        try:
+            data = self.shared.get(self.shared_key(key))
+        except redis.RedisError as e:
+            logger.warning(f"Shared cache unavailable: {e}")
+            return None
+        if data is None:
+            return None
+        cached = CachedResponse.loads(data)
+        self.local.set(key, cached, len(cached.body))
+        return cached
+
+    def set(self, key: Key, cached: CachedResponse):
+        """
+        Cache a response in the worker and in Redis.
+
+        Args:
+            key (Key): The key of the response.
+            cached (CachedResponse): The response.
+        """
+        self.local.set(key, cached, len(cached.body))
+        if self.shared is None:
+            return
+        try:
+            self.shared.set(self.shared_key(key), cached.dumps(), ex=self.ttl)
+        except redis.RedisError as e:
+            logger.warning(f"Shared cache unavailable: {e}")
+
+    def read_through(self, key: Key, build: Callable[[], Response]) -> Response:
+        """
+        Return the cached response, or build it and cache it.
+
+        Args:
+            key (Key): The key of the response, starting with the endpoint name and its scope.
+            build (Callable[[], Response]): Builds the response. Errors it raises are not cached.
+
+        Returns:
+            Response: The response.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached.response()
+
+        response = build()
+        self.set(key, CachedResponse(response.body, dict(response.headers)))
+        return response
+
+
+response_cache = ResponseCache(
+    settings.CACHE_MB * 1024 * 1024, settings.CACHE_REDIS_URL, settings.CACHE_TTL
+)
+
+
+class Versions(NamedTuple):
+    """
+    The versions of a project, bumped by triggers on every write.
+
+    Attributes:
+        project (int): The version of the project, its info and its tasks.
+        features (int): The version of its features.
+        submissions (int): The version of its synced submissions.
+    """
+
+    project: int
+    features: int
+    submissions: int
+
+
+VERSIONS_SQL = text(
+    """SELECT p.version,
+        coalesce(max(v.version) FILTER (WHERE v.layer = 'features'), 0),
+        coalesce(max(v.version) FILTER (WHERE v.layer = 'submissions'), 0)
+    FROM projects p
+    LEFT JOIN tile_versions v ON v.project_id = p.id
+    WHERE p.id = :project_id
+    GROUP BY p.id"""
+)
+
+
+class Listener(threading.Thread):
+    """Listens to the cache notifications and keeps the project versions."""
+
+    def __init__(self):
+        super().__init__(name="cache-listener", daemon=True)
+        self.connected = False
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.versions = {}
+        # Bumped on every notification, so a version read from the database
+        # while one arrives is not kept
+        self.generation = 0
+
+    def get_versions(self, db: Session, project_id: int) -> Versions:
+        """
+        Get the versions of a project, from memory while the listener is connected.
+
+        Args:
+            db (Session): A database session.
+            project_id (int): The ID of the project.
+
+        Raises:
+            HTTPException: If the project does not exist.
+
+        Returns:
+            Versions: The versions of the project.
+        """
+        with self.lock:
+            versions = self.versions.get(project_id)
+            generation = self.generation
+        if versions is not None:
+            return versions
+
+        row = db.execute(VERSIONS_SQL, {"project_id": project_id}).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Project not found")
+        versions = Versions(*row)
+
+        with self.lock:
+            if self.connected and generation == self.generation:
+                self.versions[project_id] = versions
+        return versions
+
+    def notified(self, payload: str):
+        """
+        Drop what a notification makes stale.
+
+        Args:
+            payload (str): The ID of the changed project, "<ID>:<layer>" when
+                one of its tile layers changed, or FORMS.
+        """
+        scope, _, layer = payload.partition(":")
+        scope = int(scope) if scope.isdigit() else scope
+        with self.lock:
+            self.generation += 1
+            self.versions.pop(scope, None)
+        for local in local_caches:
+            local.drop(scope, layer or None)
+
+    def set_connected(self, connected: bool):
+        """Record the state of the connection, forgetting the versions."""
+        with self.lock:
+            self.connected = connected
+            self.generation += 1
+            self.versions.clear()
+
+    def run(self):
+        """Listen until stopped, reconnecting when the connection is lost."""
+        while not self.stopping.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(str(settings.FMTM_DB_URL))
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {CHANNEL}")
+                # Anything may have changed while disconnected
+                for local in local_caches:
+                    local.clear()
+                self.set_connected(True)
+                logger.debug(f"Listening to {CHANNEL}")
+
+                while not self.stopping.is_set():
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.notified(conn.notifies.pop(0).payload)
+            except psycopg2.Error as e:
+                logger.warning(f"Cache listener disconnected: {e}")
+            finally:
+                self.set_connected(False)
+                if conn is not None:
+                    conn.close()
+            self.stopping.wait(5)
+
+    def stop(self):
+        """Stop listening."""
+        self.stopping.set()
+
+
+listener = Listener()
+
+
+def start_listener():
+    """Start listening to the cache notifications, unless already listening."""
+    global listener
+    if listener.is_alive():
+        return
+    if listener.ident is not None:
+        # A thread can only be started once
+        listener = Listener()
+    listener.start()
+
+
+def stop_listener():
+    """Stop listening to the cache notifications."""
+    listener.stop()
+
+
+def get_versions(db: Session, project_id: int) -> Versions:
+    """
+    Get the versions of a project.
+
+    Args:
+        db (Session): A database session.
+        project_id (int): The ID of the project.
+
+    Raises:
+        HTTPException: If the project does not exist.
+
+    Returns:
+        Versions: The versions of the project.
+    """
+    return listener.get_versions(db, project_id)
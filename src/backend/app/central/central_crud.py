@@ -16,15 +16,18 @@
 #     along with FMTM.  If not, see <https:#www.gnu.org/licenses/>.
 #
 import base64
+import concurrent.futures
+import csv
+import io
 import json
 import os
-import pathlib
+import queue
+import threading
 import zlib
 
 # import osm_fieldwork
 
 # Qr code imports
-import segno
 import xmltodict
 from fastapi import HTTPException
 from fastapi.logger import logger as logger
@@ -35,7 +38,14 @@ from sqlalchemy.orm import Session
 
 from ..config import settings
 from ..db import db_models
+from ..pagination.pagination import keyset_paginate
 from ..projects import project_schemas
+from ..workspace.workspace import WorkspaceFull, workspace
+
+# Number of XForm CSVs downloaded from ODK Central at the same time
+CSV_DOWNLOAD_WORKERS = 4
+# Number of downloaded rows waiting to be converted
+CSV_QUEUE_SIZE = 1000
 
 
 def get_odk_project(odk_central: project_schemas.ODKCentral = None):
@@ -355,7 +365,8 @@ def create_odk_xform(
 
     if result != 200 and result != 409:
         return result
-    data = f"/tmp/{title}.geojson"
+    # The data extract is written next to the XForm
+    data = f"{os.path.splitext(filespec)[0]}.geojson"
 
     # This modifies an existing published XForm to be in draft mode.
     # An XForm must be in draft mode to upload an attachment.
@@ -470,28 +481,37 @@ def list_submissions(project_id: int, odk_central: project_schemas.ODKCentral =
     return submissions
 
 
-def get_form_list(db: Session, skip: int, limit: int):
+def get_form_list(
+    db: Session, skip: int, limit: int, cursor: str = None, count: bool = False
+):
     """
     Get a list of IDs and titles of XForms from the database.
 
     Args:
         db (Session): The database session.
-        skip (int): The number of records to skip before returning results.
+        skip (int): The number of records to skip before returning results, when no cursor is given.
         limit (int): The maximum number of records to return.
+        cursor (str, optional): The cursor of the page to return. Defaults to None.
+        count (bool, optional): Whether to estimate the total number of XForms. Defaults to False.
 
     Returns:
-        A list of tuples containing the IDs and titles of XForms from the database.
+        Page: A page of tuples containing the IDs and titles of XForms from the database.
 
     Raises:
         HTTPException: If there is an error querying the database.
     """
     try:
-        return (
-            db.query(db_models.DbXForm.id, db_models.DbXForm.title)
-            .offset(skip)
-            .limit(limit)
-            .all()
+        return keyset_paginate(
+            db,
+            db.query(db_models.DbXForm.id, db_models.DbXForm.title),
+            [db_models.DbXForm.id],
+            cursor,
+            limit,
+            skip,
+            count,
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(e)
         raise HTTPException(e) from e
@@ -542,14 +562,18 @@ async def test_form_validity(
         HTTPException: If the XForm is invalid.
     """
     try:
-        xlsform_path = f"/tmp/validate_form.{form_type}"
-        outfile = f"/tmp/outfile.xml"
+        with workspace("validate") as ws:
+            xlsform_path = ws.file(f"validate_form.{form_type}")
+            outfile = ws.file("outfile.xml")
 
-        with open(xlsform_path, "wb") as f:
-            f.write(xform_content)
+            with open(xlsform_path, "wb") as f:
+                f.write(xform_content)
 
-        xls2xform_convert(xlsform_path=xlsform_path, xform_path=outfile, validate=False)
+            xls2xform_convert(xlsform_path=xlsform_path, xform_path=outfile, validate=False)
         return {"message": "Your form is valid"}
+    except WorkspaceFull:
+        # Out of workspace space, not a problem with the form
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail={
             "message": "Your form is invalid",
@@ -688,9 +712,6 @@ def create_qrcode(project_id: int,
         zlib.compress(json.dumps(qr_code_setting).encode("utf-8"))
     )
 
-    # Generate qr code using segno
-    qrcode = segno.make(qr_data, micro=False)
-    qrcode.save(f"/tmp/{name}_qr.png", scale=5)
     return qr_data
 
 
@@ -733,55 +754,158 @@ def download_media(
     xform.getMedia(project_id, xform_id, filename)
 
 
-def convert_csv(
-    filespec: str,
-    data: bytes,
+def iter_submission_csv(
+    project_id: int,
+    xform_id: str,
+    odk_central: project_schemas.ODKCentral = None,
 ):
     """
-    Convert an ODK CSV file to OSM XML and GeoJson.
+    Stream the CSV submissions of an XForm from a remote ODK server.
 
     Args:
-        filespec (str): The path to the CSV file to convert.
-        data (bytes): The content of the CSV file.
+        project_id (int): The ID of the project to download submissions for.
+        xform_id (str): The ID of the XForm to download submissions for.
+        odk_central (project_schemas.ODKCentral, optional): The ODK Central credentials. Defaults to None.
 
-    Returns:
-        True if the conversion is successful.
+    Yields:
+        dict: Each CSV row, keyed by the column headers.
+    """
+    xform = get_odk_form(odk_central)
+    url = f"{xform.base}projects/{project_id}/forms/{xform_id}/submissions.csv"
+    with xform.session.get(
+        url, auth=xform.auth, verify=xform.verify, stream=True
+    ) as response:
+        if response.status_code != 200:
+            logger.error(f"Submissions for {project_id}, Form {xform_id} doesn't exist")
+            return
+        response.raw.decode_content = True
+        yield from csv.DictReader(
+            io.TextIOWrapper(response.raw, encoding="utf-8", newline="")
+        )
+
+
+def iter_project_csv_rows(
+    project_id: int,
+    xform_ids: list,
+    odk_central: project_schemas.ODKCentral = None,
+):
     """
-    pathlib.Path(osm_fieldwork.__file__).resolve().parent
-    csvin = CSVDump("/xforms.yaml")
+    Merge the CSV submissions of several XForms into one stream of rows.
 
-    osmoutfile = f"{filespec}.osm"
-    csvin.createOSM(osmoutfile)
+    The XForms are downloaded concurrently and rows are handed over through a
+    bounded queue, so memory does not grow with the number of submissions.
+    Each CSV is read with its own header, which is not repeated in the output.
 
-    jsonoutfile = f"{filespec}.geojson"
-    csvin.createGeoJson(jsonoutfile)
+    Args:
+        project_id (int): The ID of the project to download submissions for.
+        xform_ids (list): The IDs of the XForms to download submissions for.
+        odk_central (project_schemas.ODKCentral, optional): The ODK Central credentials. Defaults to None.
 
-    if len(data) == 0:
-        logger.debug("Parsing csv file %r" % filespec)
-        # The yaml file is in the package files for osm_fieldwork
-        data = csvin.parse(filespec)
-    else:
-        csvdata = csvin.parse(filespec, data)
-        for entry in csvdata:
-            logger.debug(f"Parsing csv data {entry}")
-            if len(data) <= 1:
+    Yields:
+        dict: Each CSV row, keyed by the column headers.
+
+    Raises:
+        Exception: The error of an XForm that could not be downloaded, so the
+            response fails instead of silently leaving its submissions out.
+    """
+    rows = queue.Queue(maxsize=CSV_QUEUE_SIZE)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                rows.put(item, timeout=1)
+                return True
+            except queue.Full:
                 continue
-            feature = csvin.createEntry(entry)
-            # Sometimes bad entries, usually from debugging XForm design, sneak in
-            if len(feature) > 0:
-                if "tags" not in feature:
-                    logger.warning("Bad record! %r" % feature)
-                else:
-                    if "lat" not in feature["attrs"]:
-                        import epdb
+        return False
 
-                        epdb.st()
-                    csvin.writeOSM(feature)
-                    # This GeoJson file has all the data values
-                    csvin.writeGeoJson(feature)
-                    pass
+    def download(xform_id):
+        try:
+            for row in iter_submission_csv(project_id, xform_id, odk_central):
+                if not put(row):
+                    return
+        except Exception as e:
+            logger.error(f"Error downloading submissions for form {xform_id}: {e}")
+            put(e)
+        finally:
+            put(done)
 
-    csvin.finishOSM()
-    csvin.finishGeoJson()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=CSV_DOWNLOAD_WORKERS)
+    try:
+        for xform_id in xform_ids:
+            executor.submit(download, xform_id)
+
+        remaining = len(xform_ids)
+        while remaining:
+            row = rows.get()
+            if row is done:
+                remaining -= 1
+                continue
+            if isinstance(row, Exception):
+                raise row
+            yield row
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def csv_row_tags(csvin: CSVDump, row: dict):
+    """
+    Convert the columns of an ODK CSV row to OSM tags.
 
-    return True
+    This follows CSVDump.parse for a single row.
+
+    Args:
+        csvin (CSVDump): The converter holding the OSM tag mappings.
+        row (dict): The CSV row, keyed by the column headers.
+
+    Returns:
+        dict: The converted tags.
+    """
+    tags = dict()
+    for keyword, value in row.items():
+        if not keyword or value is None:
+            continue
+        # Columns of grouped questions are prefixed with the group names
+        base = csvin.basename(keyword).lower()
+        if base in csvin.ignore:
+            continue
+        # Without a GPS fix the location falls back to the warmup point
+        if base in ("latitude", "longitude") and len(value) == 0:
+            value = row.get(f"warmup-{base.capitalize()}", "")
+        items = csvin.convertEntry(base, value)
+        if isinstance(items, dict):
+            tags.update(items)
+        elif isinstance(items, list):
+            for item in items:
+                tags.update(item)
+    return tags
+
+
+def convert_csv(rows):
+    """
+    Convert ODK CSV rows to OSM features, one row at a time.
+
+    Args:
+        rows (Iterable[dict]): CSV rows, keyed by the column headers.
+
+    Yields:
+        dict: A feature with "attrs", "tags" and optionally "private" entries.
+    """
+    # The yaml file is in the package files for osm_fieldwork
+    csvin = CSVDump()
+
+    for row in rows:
+        entry = csv_row_tags(csvin, row)
+        try:
+            feature = csvin.createEntry(entry)
+        except KeyError:
+            # There is no location in the row
+            feature = dict()
+        # Sometimes bad entries, usually from debugging XForm design, sneak in
+        if "tags" not in feature or not feature["attrs"].get("lat"):
+            logger.warning("Bad record! %r" % entry)
+            continue
+        yield feature
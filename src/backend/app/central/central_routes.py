@@ -19,8 +19,9 @@
 import json
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
 from fastapi.logger import logger as logger
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy import (
     column,
     select,
@@ -29,9 +30,13 @@ from sqlalchemy import (
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import text
 
+from ..cache import cache
 from ..central import central_crud
 from ..db import database
+from ..pagination.pagination import set_page_headers
+from ..responses.responses import FastJSONResponse
 from ..projects import project_crud, project_schemas
+from ..submission import submission_crud
 
 router = APIRouter(
     prefix="/central",
@@ -90,21 +95,35 @@ async def create_appuser(
 async def get_form_lists(
     db: Session = Depends(database.get_db),
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    cursor: str = None,
+    count: bool = False,
 ):
     """
     Retrieve a list of XForms from a database.
 
+    The cursors of the next and previous pages are returned in the
+    X-Next-Cursor and X-Prev-Cursor headers. Responses are cached until the
+    XForms change.
+
     Args:
         db (Session, optional): The database session. Injected by FastAPI.
-        skip (int, optional): The number of records to skip before returning results. Defaults to 0.
+        skip (int, optional): The number of records to skip before returning results, when no cursor is given. Defaults to 0.
         limit (int, optional): The maximum number of records to return. Defaults to 100.
+        cursor (str, optional): The cursor of the page to return. Defaults to None.
+        count (bool, optional): Whether to send an estimate of the total in X-Total-Count. Defaults to False.
 
     Returns:
         A list of dictionaries containing the ID and title of each XForm record retrieved from the database.
     """
-    forms = central_crud.get_form_list(db, skip, limit)
-    return forms
+    def build():
+        page = central_crud.get_form_list(db, skip, limit, cursor, count)
+        response = FastJSONResponse(jsonable_encoder(page.items))
+        set_page_headers(response, page)
+        return response
+
+    key = ("form_list", cache.FORMS, skip, limit, cursor, count)
+    return cache.response_cache.read_through(key, build)
 
 
 @router.get("/download_submissions")
@@ -120,7 +139,7 @@ async def download_submissions(
         db (Session, optional): The database session. Injected by FastAPI.
 
     Returns:
-        A dictionary containing the downloaded submissions data from ODK Central for the specified project.
+        A zip of the submissions converted to OSM XML and GeoJSON, streamed as they are downloaded.
     """
     project = table(
         "projects", column("project_name_prefix"), column("xform_title"), column("id"), column("odkid")
@@ -131,24 +150,19 @@ async def download_submissions(
     first = result.first()
     if not first:
         return {"error": "No such project!"}
-    # FIXME: this should be configurable
-    tmp = "/tmp"
-    filespec = f"{tmp}/{first.project_name_prefix}_{first.xform_title}"
+    base = f"{first.project_name_prefix}_{first.xform_title}"
 
     xforms = central_crud.list_odk_xforms(first.odkid)
-    submissions = list()
-    for xform in xforms:
-        data = central_crud.download_submissions(first.odkid, xform["xmlFormId"])
-        # An empty submissions only has the CSV headers
-        # headers = data[0]
-        if len(submissions) == 0:
-            submissions.append(data[0])
-        if len(data) >= 2:
-            for entry in range(1, len(data)):
-                submissions.append(data[entry])
-
-    result = central_crud.convert_csv(filespec, submissions)
-    return {"data": result}
+    xform_ids = [xform["xmlFormId"] for xform in xforms]
+    rows = central_crud.iter_project_csv_rows(first.odkid, xform_ids)
+    features = central_crud.convert_csv(rows)
+
+    headers = {"Content-Disposition": f"attachment; filename={base}_osm.zip"}
+    return StreamingResponse(
+        submission_crud.stream_osm_zip(features, base),
+        media_type="application/zip",
+        headers=headers,
+    )
 
 
 @router.get("/list-submissions")
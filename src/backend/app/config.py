@@ -116,6 +116,22 @@ class Settings(BaseSettings):
 
     SENTRY_DSN: Optional[str]
 
+    # Point at a tmpfs mount (e.g. /dev/shm/fmtm) to keep scratch files in memory
+    WORKSPACE_DIR: str = "/tmp/fmtm"
+    WORKSPACE_QUOTA_MB: int = 2048
+    # Submission attachments kept between downloads, least recently used go first
+    ATTACHMENT_CACHE_DIR: str = "/tmp/fmtm-attachments"
+    ATTACHMENT_CACHE_MB: int = 4096
+    # Seconds between pulls of new submissions from ODK Central, 0 to disable
+    SUBMISSION_SYNC_INTERVAL: int = 300
+    # Vector tiles kept in memory by each worker, least recently used go first
+    TILE_CACHE_MB: int = 256
+    # Read responses kept in memory by each worker, and optionally in a Redis
+    # shared by the workers for CACHE_TTL seconds
+    CACHE_MB: int = 128
+    CACHE_REDIS_URL: Optional[str]
+    CACHE_TTL: int = 3600
+
     class Config:
         """Pydantic settings config."""
 
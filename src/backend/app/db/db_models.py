@@ -16,14 +16,18 @@
 #     along with FMTM.  If not, see <https:#www.gnu.org/licenses/>.
 #
 
+import hashlib
+
 from geoalchemy2 import Geometry
 from sqlalchemy import (
     ARRAY,
+    DDL,
     BigInteger,
     Boolean,
     Column,
     DateTime,
     Enum,
+    FetchedValue,
     ForeignKey,
     ForeignKeyConstraint,
     Index,
@@ -33,12 +37,16 @@ from sqlalchemy import (
     Table,
     UniqueConstraint,
     desc,
+    event,
+    text,
 )
-from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.dialects.postgresql import JSON, JSONB, TSVECTOR
 from sqlalchemy.orm import (  # , declarative_base  # , declarative_base
     backref,
     object_session,
+    query_expression,
     relationship,
+    synonym,
 )
 
 from ..models.enums import (
@@ -58,6 +66,13 @@ from ..models.enums import (
 from .database import Base, FmtmMetadata
 from .postgis_utils import timestamp
 
+# Triggers, functions and backfills create_all cannot express, by name, in
+# the order apply_startup_ddl applies them
+STARTUP_DDL = {}
+# Advisory lock taken while the schema is created or changed, so workers
+# starting together do not race on it
+SCHEMA_LOCK = 7264000
+
 
 class DbUser(Base):
     """
@@ -242,7 +257,7 @@ class DbProjectInfo(Base):
         name (String): The name of the project.
         short_description (String): A short description of the project.
         description (String): A description of the project.
-        text_searchable (TSVECTOR): A searchable text field populated by a database trigger.
+        text_searchable (TSVECTOR): A searchable text field populated by the project_info_search trigger.
         per_task_instructions (String): Instructions for completing tasks in this project.
     """
 
@@ -259,7 +274,7 @@ class DbProjectInfo(Base):
     per_task_instructions = Column(String)
 
     __table_args__ = (
-        Index("textsearch_idx", "text_searchable"),
+        Index("textsearch_idx", "text_searchable", postgresql_using="gin"),
         {},
     )
 
@@ -448,10 +463,21 @@ class DbTaskHistory(Base):
         ),
         Index("idx_task_history_composite", "task_id", "project_id"),
         Index("idx_task_history_project_id_user_id", "user_id", "project_id"),
+        # Pages the history of a project newest first without sorting it
+        Index("idx_task_history_project_id_id", project_id, id.desc()),
         {},
     )
 
 
+# create_all does not add indexes to an existing table
+TASK_HISTORY_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_task_history_project_id_id
+    ON task_history (project_id, id DESC);
+"""
+
+STARTUP_DDL["task_history_indexes"] = TASK_HISTORY_INDEXES
+
+
 class DbQrCode(Base):
     """
     A SQLAlchemy model representing a QR Code.
@@ -479,6 +505,8 @@ class DbTask(Base):
         project_task_index (Integer): The index of this Task within its project.
         project_task_name (String): The name of this Task within its project.
         outline (Geometry("POLYGON", srid=4326)): The outline geometry for this Task in WGS84 coordinates.
+        geometry_geojson (JSON): The outline as a GeoJSON Feature, written by the tasks_geojson trigger.
+        centroid_geojson (JSON): The centroid of the outline as a GeoJSON Feature, written by the tasks_geojson trigger.
     """    
 
     __tablename__ = "tasks"
@@ -491,7 +519,12 @@ class DbTask(Base):
     project_task_index = Column(Integer)
     project_task_name = Column(String)
     outline = Column(Geometry("POLYGON", srid=4326))
-    geometry_geojson = Column(String)
+    geometry_geojson = Column(
+        JSON, server_default=FetchedValue(), server_onupdate=FetchedValue()
+    )
+    centroid_geojson = Column(
+        JSON, server_default=FetchedValue(), server_onupdate=FetchedValue()
+    )
     initial_feature_count = Column(Integer)
     task_status = Column(Enum(TaskStatus), default=TaskStatus.READY)
     locked_by = Column(
@@ -516,6 +549,18 @@ class DbTask(Base):
     lock_holder = relationship(DbUser, foreign_keys=[locked_by])
     mapper = relationship(DbUser, foreign_keys=[mapped_by])
 
+    # The outline rendered with other geometry options than the stored one,
+    # set by queries with with_expression
+    rendered_geojson = query_expression()
+    outline_centroid = synonym("centroid_geojson")
+
+    @property
+    def outline_geojson(self):
+        """The outline as a GeoJSON Feature, as rendered by the query or stored."""
+        if self.rendered_geojson is not None:
+            return self.rendered_geojson
+        return self.geometry_geojson
+
     ## ---------------------------------------------- ##
     # FOR REFERENCE: OTHER ATTRIBUTES IN TASKING MANAGER
     # x = Column(Integer)
@@ -560,11 +605,22 @@ class DbProject(Base):
     # GEOMETRY
     outline = Column(Geometry("POLYGON", srid=4326))
     # geometry = Column(Geometry("POLYGON", srid=4326, from_text='ST_GeomFromWkt'))
+    # The outline as a GeoJSON Feature, only rendered by the queries that
+    # return it, see project_crud.get_project_by_id
+    outline_geojson = query_expression()
 
     # PROJECT STATUS
     last_updated = Column(DateTime, default=timestamp)
     status = Column(Enum(ProjectStatus), default=ProjectStatus.DRAFT, nullable=False)
     total_tasks = Column(Integer)
+    # Bumped by the projects_version triggers on every write to the project,
+    # its info or its tasks
+    version = Column(
+        Integer,
+        nullable=False,
+        server_default="1",
+        server_onupdate=FetchedValue(),
+    )
     # tasks_mapped = Column(Integer, default=0, nullable=False)
     # tasks_validated = Column(Integer, default=0, nullable=False)
     # tasks_bad_imagery = Column(Integer, default=0, nullable=False)
@@ -611,6 +667,7 @@ class DbProject(Base):
 
     __table_args__ = (
         Index("idx_geometry", outline, postgresql_using="gist"),
+        Index("idx_projects_centroid", "centroid", postgresql_using="gist"),
         {},
     )
 
@@ -653,7 +710,12 @@ class DbProject(Base):
     extra_id_params = Column(String)
     license_id = Column(Integer, ForeignKey("licenses.id", name="fk_licenses"))
     # GEOMETRY
-    centroid = Column(Geometry("POINT", srid=4326))
+    # Set by the projects_centroid trigger, indexed for nearest project lookups
+    centroid = Column(
+        Geometry("POINT", srid=4326, spatial_index=False),
+        server_default=FetchedValue(),
+        server_onupdate=FetchedValue(),
+    )
     # country = Column(ARRAY(String), default=[])
     # FEEDBACK
     project_chat = relationship(DbProjectChat, lazy="dynamic", cascade="all")
@@ -671,6 +733,366 @@ class DbProject(Base):
     task_split_type = Column(String)         # Type of split (Grid or Feature)
     hashtags = Column(ARRAY(String))         # Project hashtag
 
+
+class DbProjectSummary(Base):
+    """
+    The summary of a project shown in project lists.
+
+    Rows are kept up to date by database triggers on projects, project_info,
+    tasks and task_history, so reading a summary never aggregates tasks.
+
+    Attributes:
+        project_id (Integer): The ID of the project.
+        name (String): The name of the project.
+        short_description (String): A short description of the project.
+        total_tasks (Integer): The number of tasks in the project.
+        tasks_mapped (Integer): The number of mapped tasks.
+        tasks_validated (Integer): The number of validated tasks.
+        tasks_bad (Integer): The number of tasks marked as bad.
+        num_contributors (Integer): The number of users with task history in the project.
+    """
+
+    __tablename__ = "project_summaries"
+
+    project_id = Column(
+        Integer, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True
+    )
+    name = Column(String(512))
+    short_description = Column(String)
+    total_tasks = Column(Integer, nullable=False, server_default="0")
+    tasks_mapped = Column(Integer, nullable=False, server_default="0")
+    tasks_validated = Column(Integer, nullable=False, server_default="0")
+    tasks_bad = Column(Integer, nullable=False, server_default="0")
+    num_contributors = Column(Integer, nullable=False, server_default="0")
+
+
+# Keeps project_summaries up to date, and backfills the projects that have no
+# summary yet. Like every startup DDL block, it must stay idempotent.
+PROJECT_SUMMARY_TRIGGERS = """
+CREATE OR REPLACE FUNCTION project_summaries_project() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO project_summaries (project_id) VALUES (NEW.id)
+    ON CONFLICT (project_id) DO NOTHING;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION project_summaries_info() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO project_summaries (project_id, name, short_description)
+    VALUES (NEW.project_id, NEW.name, NEW.short_description)
+    ON CONFLICT (project_id) DO UPDATE
+    SET name = EXCLUDED.name, short_description = EXCLUDED.short_description;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION project_summaries_tasks() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE project_summaries SET
+            total_tasks = total_tasks - 1,
+            tasks_mapped = tasks_mapped
+                - (OLD.task_status IS NOT DISTINCT FROM 'MAPPED')::int,
+            tasks_validated = tasks_validated
+                - (OLD.task_status IS NOT DISTINCT FROM 'VALIDATED')::int,
+            tasks_bad = tasks_bad
+                - (OLD.task_status IS NOT DISTINCT FROM 'BAD')::int
+        WHERE project_id = OLD.project_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO project_summaries AS s
+            (project_id, total_tasks, tasks_mapped, tasks_validated, tasks_bad)
+        VALUES (
+            NEW.project_id,
+            1,
+            (NEW.task_status IS NOT DISTINCT FROM 'MAPPED')::int,
+            (NEW.task_status IS NOT DISTINCT FROM 'VALIDATED')::int,
+            (NEW.task_status IS NOT DISTINCT FROM 'BAD')::int
+        )
+        ON CONFLICT (project_id) DO UPDATE SET
+            total_tasks = s.total_tasks + 1,
+            tasks_mapped = s.tasks_mapped + EXCLUDED.tasks_mapped,
+            tasks_validated = s.tasks_validated + EXCLUDED.tasks_validated,
+            tasks_bad = s.tasks_bad + EXCLUDED.tasks_bad;
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION project_summaries_contributors() RETURNS trigger AS $$
+BEGIN
+    -- Like count(DISTINCT user_id), history without a user is no contributor
+    IF coalesce(NEW.user_id, OLD.user_id) IS NULL THEN
+        RETURN NULL;
+    END IF;
+    -- Concurrent writes for the same user and project would each miss the
+    -- other's row, and count the user twice or not remove them
+    PERFORM pg_advisory_xact_lock(
+        coalesce(NEW.project_id, OLD.project_id),
+        hashtext(coalesce(NEW.user_id, OLD.user_id)::text)
+    );
+    IF TG_OP = 'INSERT' THEN
+        IF NOT EXISTS (
+            SELECT 1 FROM task_history
+            WHERE user_id = NEW.user_id AND project_id = NEW.project_id
+            AND id <> NEW.id
+        ) THEN
+            UPDATE project_summaries SET num_contributors = num_contributors + 1
+            WHERE project_id = NEW.project_id;
+        END IF;
+    ELSIF NOT EXISTS (
+        SELECT 1 FROM task_history
+        WHERE user_id = OLD.user_id AND project_id = OLD.project_id
+    ) THEN
+        UPDATE project_summaries SET num_contributors = num_contributors - 1
+        WHERE project_id = OLD.project_id;
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS project_summaries_project ON projects;
+CREATE TRIGGER project_summaries_project AFTER INSERT ON projects
+    FOR EACH ROW EXECUTE FUNCTION project_summaries_project();
+
+DROP TRIGGER IF EXISTS project_summaries_info ON project_info;
+CREATE TRIGGER project_summaries_info
+    AFTER INSERT OR UPDATE OF name, short_description ON project_info
+    FOR EACH ROW EXECUTE FUNCTION project_summaries_info();
+
+DROP TRIGGER IF EXISTS project_summaries_tasks ON tasks;
+CREATE TRIGGER project_summaries_tasks
+    AFTER INSERT OR DELETE OR UPDATE OF task_status, project_id ON tasks
+    FOR EACH ROW EXECUTE FUNCTION project_summaries_tasks();
+
+DROP TRIGGER IF EXISTS project_summaries_contributors ON task_history;
+CREATE TRIGGER project_summaries_contributors
+    AFTER INSERT OR DELETE ON task_history
+    FOR EACH ROW EXECUTE FUNCTION project_summaries_contributors();
+
+INSERT INTO project_summaries (
+    project_id, name, short_description, total_tasks,
+    tasks_mapped, tasks_validated, tasks_bad, num_contributors
+)
+SELECT p.id, i.name, i.short_description,
+    (SELECT count(*) FROM tasks t WHERE t.project_id = p.id),
+    (SELECT count(*) FROM tasks t
+        WHERE t.project_id = p.id AND t.task_status = 'MAPPED'),
+    (SELECT count(*) FROM tasks t
+        WHERE t.project_id = p.id AND t.task_status = 'VALIDATED'),
+    (SELECT count(*) FROM tasks t
+        WHERE t.project_id = p.id AND t.task_status = 'BAD'),
+    (SELECT count(DISTINCT h.user_id) FROM task_history h
+        WHERE h.project_id = p.id)
+FROM projects p
+LEFT JOIN project_info i ON i.project_id = p.id
+WHERE NOT EXISTS (SELECT 1 FROM project_summaries s WHERE s.project_id = p.id)
+ON CONFLICT (project_id) DO NOTHING;
+
+-- Recount the contributors once, for counts written before the lock was taken
+UPDATE project_summaries s SET num_contributors = (
+    SELECT count(DISTINCT h.user_id) FROM task_history h
+    WHERE h.project_id = s.project_id
+);
+"""
+
+STARTUP_DDL["project_summaries"] = PROJECT_SUMMARY_TRIGGERS
+
+# Renders the GeoJSON of a task whenever its outline, index or name is
+# written, and backfills the tasks rendered before the trigger existed.
+# Databases created before then lack centroid_geojson and store
+# geometry_geojson as a string, which create_all does not change.
+TASK_GEOJSON_TRIGGER = """
+ALTER TABLE tasks
+    ADD COLUMN IF NOT EXISTS centroid_geojson json,
+    ALTER COLUMN geometry_geojson TYPE json USING geometry_geojson::json;
+
+CREATE OR REPLACE FUNCTION tasks_geojson() RETURNS trigger AS $$
+BEGIN
+    IF NEW.outline IS NULL THEN
+        NEW.geometry_geojson := NULL;
+        NEW.centroid_geojson := NULL;
+    ELSE
+        -- Stored at postgis_utils.DEFAULT_PRECISION decimal places
+        NEW.geometry_geojson := json_build_object(
+            'type', 'Feature',
+            'id', NEW.id,
+            'geometry', ST_AsGeoJSON(NEW.outline, 7)::json,
+            'properties', json_build_object(
+                'fid', NEW.project_task_index,
+                'uid', NEW.id,
+                'name', NEW.project_task_name
+            ),
+            'bbox', json_build_array(
+                round(ST_XMin(NEW.outline)::numeric, 7),
+                round(ST_YMin(NEW.outline)::numeric, 7),
+                round(ST_XMax(NEW.outline)::numeric, 7),
+                round(ST_YMax(NEW.outline)::numeric, 7)
+            )
+        );
+        NEW.centroid_geojson := json_build_object(
+            'type', 'Feature',
+            'geometry', ST_AsGeoJSON(ST_Centroid(NEW.outline), 7)::json,
+            'properties', json_build_object()
+        );
+    END IF;
+    RETURN NEW;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tasks_geojson ON tasks;
+CREATE TRIGGER tasks_geojson
+    BEFORE INSERT OR UPDATE OF outline, project_task_index, project_task_name
+    ON tasks
+    FOR EACH ROW EXECUTE FUNCTION tasks_geojson();
+
+UPDATE tasks SET outline = outline
+WHERE outline IS NOT NULL AND centroid_geojson IS NULL;
+"""
+
+STARTUP_DDL["tasks_geojson"] = TASK_GEOJSON_TRIGGER
+
+# Renders the GeoJSON of every task again, once, so the tasks stored at
+# postgis_utils.FULL_PRECISION before the trigger rounded them catch up.
+# Its schema_ddl row is the marker that it ran.
+TASK_GEOJSON_PRECISION = """
+UPDATE tasks SET outline = outline WHERE outline IS NOT NULL;
+"""
+
+STARTUP_DDL["tasks_geojson_precision_7"] = TASK_GEOJSON_PRECISION
+
+# Bumps projects.version on every write to a project, its info or its tasks,
+# so clients can revalidate what they downloaded with a cheap lookup. The
+# info triggers are per statement, so a bulk write bumps the version once.
+# Task writes are frequent and concurrent, mappers lock and unlock tasks of
+# the same project all the time, so their trigger is deferred to commit: the
+# projects row is then only locked while the transaction commits, instead of
+# from the task write onwards. A transaction local setting keeps it to one
+# bump per project and transaction, however many tasks it writes.
+PROJECT_VERSION_TRIGGERS = """
+ALTER TABLE projects
+    ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION projects_version() RETURNS trigger AS $$
+BEGIN
+    NEW.version := OLD.version + 1;
+    RETURN NEW;
+END $$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION projects_version_children() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE projects SET version = version + 1
+        WHERE id IN (SELECT project_id FROM old_rows);
+    ELSE
+        UPDATE projects SET version = version + 1
+        WHERE id IN (SELECT project_id FROM new_rows);
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION projects_version_task() RETURNS trigger AS $$
+DECLARE
+    project integer;
+    bumped text;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        project := OLD.project_id;
+    ELSE
+        project := NEW.project_id;
+    END IF;
+    bumped := 'fmtm.project_version_' || project;
+    IF current_setting(bumped, true) IS DISTINCT FROM 'on' THEN
+        PERFORM set_config(bumped, 'on', true);
+        UPDATE projects SET version = version + 1 WHERE id = project;
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS projects_version ON projects;
+CREATE TRIGGER projects_version BEFORE UPDATE ON projects
+    FOR EACH ROW WHEN (NEW.version = OLD.version)
+    EXECUTE FUNCTION projects_version();
+
+DROP TRIGGER IF EXISTS projects_version_tasks_insert ON tasks;
+DROP TRIGGER IF EXISTS projects_version_tasks_update ON tasks;
+DROP TRIGGER IF EXISTS projects_version_tasks_delete ON tasks;
+DROP TRIGGER IF EXISTS projects_version_tasks ON tasks;
+CREATE CONSTRAINT TRIGGER projects_version_tasks
+    AFTER INSERT OR UPDATE OR DELETE ON tasks
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION projects_version_task();
+
+DROP TRIGGER IF EXISTS projects_version_info_insert ON project_info;
+CREATE TRIGGER projects_version_info_insert AFTER INSERT ON project_info
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION projects_version_children();
+
+DROP TRIGGER IF EXISTS projects_version_info_update ON project_info;
+CREATE TRIGGER projects_version_info_update AFTER UPDATE ON project_info
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION projects_version_children();
+
+DROP TRIGGER IF EXISTS projects_version_info_delete ON project_info;
+CREATE TRIGGER projects_version_info_delete AFTER DELETE ON project_info
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION projects_version_children();
+"""
+
+STARTUP_DDL["projects_version"] = PROJECT_VERSION_TRIGGERS
+
+# Keeps projects.centroid on the outline, whichever path writes it, and
+# backfills the projects written before the trigger existed.
+PROJECT_CENTROID_TRIGGER = """
+CREATE OR REPLACE FUNCTION projects_centroid() RETURNS trigger AS $$
+BEGIN
+    NEW.centroid := ST_Centroid(NEW.outline);
+    RETURN NEW;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS projects_centroid ON projects;
+CREATE TRIGGER projects_centroid BEFORE INSERT OR UPDATE OF outline ON projects
+    FOR EACH ROW EXECUTE FUNCTION projects_centroid();
+
+UPDATE projects SET centroid = ST_Centroid(outline)
+WHERE outline IS NOT NULL AND centroid IS NULL;
+"""
+
+STARTUP_DDL["projects_centroid"] = PROJECT_CENTROID_TRIGGER
+
+# Keeps project_info.text_searchable on the name and descriptions, weighted
+# in that order, and backfills the rows written before the trigger existed.
+# Older databases created textsearch_idx as a btree, which cannot serve
+# tsquery matches, so it is rebuilt as GIN.
+PROJECT_SEARCH_TRIGGER = """
+CREATE OR REPLACE FUNCTION project_info_search() RETURNS trigger AS $$
+BEGIN
+    NEW.text_searchable :=
+        setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce(NEW.short_description, '')), 'B')
+        || setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS project_info_search ON project_info;
+CREATE TRIGGER project_info_search
+    BEFORE INSERT OR UPDATE OF name, short_description, description
+    ON project_info
+    FOR EACH ROW EXECUTE FUNCTION project_info_search();
+
+UPDATE project_info SET name = name WHERE text_searchable IS NULL;
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_indexes
+        WHERE indexname = 'textsearch_idx'
+        AND position('USING gin' IN indexdef) = 0
+    ) THEN
+        DROP INDEX textsearch_idx;
+        CREATE INDEX textsearch_idx ON project_info USING gin (text_searchable);
+    END IF;
+END $$;
+"""
+
+STARTUP_DDL["project_info_search"] = PROJECT_SEARCH_TRIGGER
+
 # TODO: Add index on project geometry, tried to add in __table args__
 # Index("idx_geometry", DbProject.geometry, postgresql_using="gist")
 
@@ -713,6 +1135,8 @@ class DbFeatures(Base):
     task_id = Column(Integer, nullable=True)
     properties = Column(JSONB)
     geometry = Column(Geometry(geometry_type="GEOMETRY", srid=4326))
+    # Only rendered by the queries asking for it, with their geometry options
+    feature_geojson = query_expression()
 
     __table_args__ = (
         ForeignKeyConstraint(
@@ -723,6 +1147,183 @@ class DbFeatures(Base):
     )
 
 
+class DbSubmission(Base):
+    """Submissions synced from ODK Central, with their OSM tags and location."""
+
+    __tablename__ = "submissions"
+
+    # The instanceId of the submission in ODK Central
+    id = Column(String, primary_key=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), index=True)
+    project = relationship(DbProject, backref="submissions")
+
+    task_id = Column(Integer, nullable=True)
+    xml_form_id = Column(String)
+    submitted_by = Column(String)
+    submitted_at = Column(DateTime)
+    review_state = Column(String)
+    # The OSM tags converted from the submission
+    properties = Column(JSONB)
+    # The answers to the XForm, with groups flattened into "group-question" keys
+    data = Column(JSONB)
+    geometry = Column(Geometry(geometry_type="GEOMETRY", srid=4326))
+
+    __table_args__ = (
+        Index("idx_submissions_composite", "task_id", "project_id"),
+        {},
+    )
+
+
+class DbSubmissionSync(Base):
+    """How far the submissions of each task form have been ingested."""
+
+    __tablename__ = "submission_sync"
+
+    task_id = Column(Integer, primary_key=True)
+    project_id = Column(
+        Integer, ForeignKey("projects.id"), index=True, primary_key=True
+    )
+    xml_form_id = Column(String)
+    submission_count = Column(Integer, default=0, nullable=False)
+    # The newest submissionDate or updatedAt ingested, later syncs only ask
+    # for submissions received or edited after it
+    last_submission_at = Column(DateTime)
+    last_synced_at = Column(DateTime)
+    # The outcome of the last sync attempt, and the error if it failed
+    status = Column(Enum(BackgroundTaskStatus))
+    message = Column(String)
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            [task_id, project_id],
+            ["tasks.id", "tasks.project_id"],
+            name="fk_tasks",
+        ),
+        {},
+    )
+
+
+# create_all does not add columns to an existing table
+SUBMISSION_SYNC_COLUMNS = """
+ALTER TABLE submission_sync
+    ADD COLUMN IF NOT EXISTS status backgroundtaskstatus,
+    ADD COLUMN IF NOT EXISTS message varchar;
+"""
+
+STARTUP_DDL["submission_sync_columns"] = SUBMISSION_SYNC_COLUMNS
+
+
+class DbTileVersion(Base):
+    """
+    A SQLAlchemy model counting the writes to each vector tile layer of a project.
+
+    The tasks layer follows projects.version instead.
+
+    Attributes:
+        project_id (Integer): The ID of the project.
+        layer (String): The tile layer, "features" or "submissions".
+        version (Integer): Bumped by the tile_versions triggers on every write to the layer.
+    """
+
+    __tablename__ = "tile_versions"
+
+    project_id = Column(
+        Integer, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True
+    )
+    layer = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, server_default="1")
+
+
+TILE_VERSION_TRIGGERS = """
+CREATE OR REPLACE FUNCTION tile_versions() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO tile_versions AS v (project_id, layer)
+        SELECT DISTINCT r.project_id, TG_ARGV[0] FROM old_rows r
+        JOIN projects p ON p.id = r.project_id
+        ON CONFLICT (project_id, layer) DO UPDATE SET version = v.version + 1;
+    ELSE
+        INSERT INTO tile_versions AS v (project_id, layer)
+        SELECT DISTINCT r.project_id, TG_ARGV[0] FROM new_rows r
+        JOIN projects p ON p.id = r.project_id
+        ON CONFLICT (project_id, layer) DO UPDATE SET version = v.version + 1;
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tile_versions_insert ON features;
+CREATE TRIGGER tile_versions_insert AFTER INSERT ON features
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION tile_versions('features');
+
+DROP TRIGGER IF EXISTS tile_versions_update ON features;
+CREATE TRIGGER tile_versions_update AFTER UPDATE ON features
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION tile_versions('features');
+
+DROP TRIGGER IF EXISTS tile_versions_delete ON features;
+CREATE TRIGGER tile_versions_delete AFTER DELETE ON features
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION tile_versions('features');
+
+DROP TRIGGER IF EXISTS tile_versions_insert ON submissions;
+CREATE TRIGGER tile_versions_insert AFTER INSERT ON submissions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION tile_versions('submissions');
+
+DROP TRIGGER IF EXISTS tile_versions_update ON submissions;
+CREATE TRIGGER tile_versions_update AFTER UPDATE ON submissions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION tile_versions('submissions');
+
+DROP TRIGGER IF EXISTS tile_versions_delete ON submissions;
+CREATE TRIGGER tile_versions_delete AFTER DELETE ON submissions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION tile_versions('submissions');
+"""
+
+STARTUP_DDL["tile_versions"] = TILE_VERSION_TRIGGERS
+
+# Notifies the workers on the fmtm_cache channel of what their read cache
+# must drop: the ID of a project when its version changes, "<ID>:<layer>" when
+# the version of one of its tile layers changes, and "forms" when the XLSForms
+# change. Writes to tasks, project info, features and submissions all bump one
+# of them.
+CACHE_NOTIFY_TRIGGERS = """
+CREATE OR REPLACE FUNCTION cache_notify_project() RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'tile_versions' THEN
+        PERFORM pg_notify('fmtm_cache', NEW.project_id || ':' || NEW.layer);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('fmtm_cache', OLD.id::text);
+    ELSE
+        PERFORM pg_notify('fmtm_cache', NEW.id::text);
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION cache_notify_forms() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('fmtm_cache', 'forms');
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS cache_notify ON projects;
+CREATE TRIGGER cache_notify AFTER UPDATE OR DELETE ON projects
+    FOR EACH ROW EXECUTE FUNCTION cache_notify_project();
+
+DROP TRIGGER IF EXISTS cache_notify ON tile_versions;
+CREATE TRIGGER cache_notify AFTER INSERT OR UPDATE ON tile_versions
+    FOR EACH ROW EXECUTE FUNCTION cache_notify_project();
+
+DROP TRIGGER IF EXISTS cache_notify ON xlsforms;
+CREATE TRIGGER cache_notify AFTER INSERT OR UPDATE OR DELETE ON xlsforms
+    FOR EACH STATEMENT EXECUTE FUNCTION cache_notify_forms();
+"""
+
+STARTUP_DDL["cache_notify"] = CACHE_NOTIFY_TRIGGERS
+
+
 class BackgroundTasks(Base):
     """
     A SQLAlchemy model representing a background task.
@@ -844,3 +1445,58 @@ class DbTilesPath(Base):
     tile_source = Column(String)
     background_task_id = Column(String)
     created_at = Column(DateTime, default=timestamp)
+
+
+class DbSchemaDdl(Base):
+    """
+    Records the startup DDL blocks applied to the database.
+
+    Attributes:
+        name (String): The name of the block in STARTUP_DDL.
+        checksum (String): The SHA-1 of the SQL of the block when it was applied.
+        applied_at (DateTime): When the block was applied.
+    """
+
+    __tablename__ = "schema_ddl"
+
+    name = Column(String, primary_key=True)
+    checksum = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=timestamp)
+
+
+def apply_startup_ddl(target, connection, **kw):
+    """
+    Apply the STARTUP_DDL blocks that are new or changed since the last start.
+
+    Runs after create_all, in its transaction, while holding SCHEMA_LOCK, so
+    workers starting together apply each block once, one after the other.
+    A block is skipped while its SQL matches the checksum recorded in
+    schema_ddl, so triggers are not dropped and backfills do not run again
+    on every start.
+
+    Args:
+        target (MetaData): The metadata being created.
+        connection (Connection): The connection create_all runs on.
+        **kw: The other arguments of the after_create event.
+    """
+    connection.execute(
+        text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK}
+    )
+    applied = dict(connection.execute(text("SELECT name, checksum FROM schema_ddl")))
+    for name, sql in STARTUP_DDL.items():
+        checksum = hashlib.sha1(sql.encode()).hexdigest()
+        if applied.get(name) == checksum:
+            continue
+        connection.execute(DDL(sql))
+        connection.execute(
+            text(
+                "INSERT INTO schema_ddl (name, checksum, applied_at) "
+                "VALUES (:name, :checksum, now()) "
+                "ON CONFLICT (name) DO UPDATE "
+                "SET checksum = EXCLUDED.checksum, applied_at = EXCLUDED.applied_at"
+            ),
+            {"name": name, "checksum": checksum},
+        )
+
+
+event.listen(FmtmMetadata, "after_create", apply_startup_ddl)
@@ -17,11 +17,94 @@
 #
 
 import datetime
+from typing import NamedTuple, Optional
 
-from geoalchemy2 import Geometry
-from geoalchemy2.shape import to_shape
-from geojson_pydantic import Feature
-from shapely.geometry import mapping
+from fastapi import Query
+from sqlalchemy import Numeric, Text, case, cast, func, type_coerce
+from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.types import TypeDecorator
+
+from ..responses.responses import RawJSON
+
+# Decimal places of the coordinates sent to clients unless they ask for
+# others. 7 places are about a centimetre, finer than any GPS in the field.
+DEFAULT_PRECISION = 7
+# What ST_AsGeoJSON writes when not told otherwise
+FULL_PRECISION = 9
+MAX_PRECISION = 15
+MAX_ZOOM = 22
+
+
+class GeometryOptions(NamedTuple):
+    """
+    How the geometries of a response are rendered.
+
+    Attributes:
+        precision (int): The decimal places of the coordinates.
+        tolerance (float): The simplification tolerance in degrees, if any.
+    """
+
+    precision: int = DEFAULT_PRECISION
+    tolerance: Optional[float] = None
+
+
+def zoom_tolerance(zoom: int) -> float:
+    """
+    Get the size of a pixel of a 256 pixels web map tile, in degrees.
+
+    Details smaller than this can not be seen at the zoom level, so it is the
+    simplification tolerance of a map drawn at that zoom.
+
+    Args:
+        zoom (int): The zoom level.
+
+    Returns:
+        float: The tolerance in degrees.
+    """
+    return 360 / (256 * 2**zoom)
+
+
+def geometry_options(precision: int = DEFAULT_PRECISION, zoom: int = None):
+    """
+    Build a FastAPI dependency reading the geometry options of a request.
+
+    The endpoint gets the precision, simplify_tolerance and zoom query
+    parameters, with its own defaults.
+
+    Args:
+        precision (int, optional): The default decimal places of the coordinates. Defaults to 7.
+        zoom (int, optional): The default zoom level the geometries are simplified for. Defaults to None, no simplification.
+
+    Returns:
+        Callable: The dependency, returning GeometryOptions.
+    """
+    default_precision = precision
+    default_zoom = zoom
+
+    def dependency(
+        precision: int = Query(
+            default_precision,
+            ge=0,
+            le=MAX_PRECISION,
+            description="Decimal places of the coordinates",
+        ),
+        simplify_tolerance: float = Query(
+            None,
+            ge=0,
+            description="Simplification tolerance in degrees, overrides zoom",
+        ),
+        zoom: int = Query(
+            default_zoom,
+            ge=0,
+            le=MAX_ZOOM,
+            description="Simplify the geometries for a map at this zoom level",
+        ),
+    ) -> GeometryOptions:
+        if simplify_tolerance is None and zoom is not None:
+            simplify_tolerance = zoom_tolerance(zoom)
+        return GeometryOptions(precision, simplify_tolerance or None)
+
+    return dependency
 
 
 def timestamp():
@@ -34,47 +117,110 @@ def timestamp():
     return datetime.datetime.utcnow()
 
 
-def geometry_to_geojson(geometry: Geometry, properties: str = {}, id: int = None):
+def simplify_geometry(geometry, options: GeometryOptions = GeometryOptions()):
+    """
+    Build the SQL expression simplifying a geometry for a response.
+
+    The geometry is simplified with ST_SimplifyPreserveTopology, then snapped
+    to the grid of the precision with ST_ReducePrecision, so that it stays
+    valid once its coordinates are rounded.
+
+    Args:
+        geometry (Column): The geometry column.
+        options (GeometryOptions, optional): The precision and simplification tolerance. Defaults to GeometryOptions().
+
+    Returns:
+        A SQL expression for the geometry, unchanged when no tolerance is set.
+    """
+    if not options.tolerance:
+        return geometry
+    geometry = func.ST_SimplifyPreserveTopology(geometry, options.tolerance)
+    return func.ST_ReducePrecision(geometry, 10**-options.precision)
+
+
+class GeoJSONText(TypeDecorator):
+    """A JSON document selected as text, loaded as RawJSON without decoding it."""
+
+    impl = Text
+    cache_ok = True
+
+    def process_result_value(self, value, dialect):
+        """Wrap the text of a row in RawJSON."""
+        if value is None:
+            return None
+        return RawJSON(value)
+
+
+def geometry_to_geojson(
+    geometry, properties=None, id=None, options: GeometryOptions = None
+):
     """
-    Convert a geometry object to a GeoJSON Feature.
+    Build the SQL expression rendering a geometry column as a GeoJSON Feature.
+
+    The Feature is serialised by PostGIS in the query and selected as text,
+    which FastJSONResponse splices into the response as it is, so neither the
+    driver nor the response decodes and encodes the geometry again.
 
     Args:
-        geometry (Geometry): The geometry object to convert.
-        properties (str, optional): A dictionary of properties to include in the GeoJSON Feature. Defaults to an empty dictionary.
-        id (int, optional): The ID of the GeoJSON Feature. Defaults to None.
+        geometry (Column): The geometry column to convert.
+        properties (dict, optional): The properties of the Feature, as a mapping of names to columns, or a JSON column. Defaults to None, no properties.
+        id (Column, optional): The column holding the ID of the Feature. Defaults to None.
+        options (GeometryOptions, optional): The precision and simplification tolerance. Defaults to None, full precision.
 
     Returns:
-        A GeoJSON Feature representing the input geometry.
+        A SQL expression for the GeoJSON Feature as RawJSON, NULL when the geometry is NULL.
     """
-    if geometry:
-        shape = to_shape(geometry)
-        geojson = {
-            "type": "Feature",
-            "geometry": mapping(shape),
-            "properties": properties,
-            "id": id,
-            "bbox":shape.bounds
-        }
-        return Feature(**geojson)
-
-
-def get_centroid(geometry: Geometry, properties: str = {}):
+    if properties is None:
+        properties = {}
+    if isinstance(properties, dict):
+        properties = json_object(properties)
+
+    if options:
+        rendered = simplify_geometry(geometry, options)
+        coordinates = func.ST_AsGeoJSON(rendered, options.precision)
+
+        def bound(value):
+            return func.round(cast(value, Numeric), options.precision)
+
+    else:
+        coordinates = func.ST_AsGeoJSON(geometry)
+
+        def bound(value):
+            return value
+
+    feature = case(
+        (
+            geometry.isnot(None),
+            json_object(
+                {
+                    "type": "Feature",
+                    "id": id,
+                    "geometry": cast(coordinates, JSON),
+                    "properties": properties,
+                    "bbox": func.json_build_array(
+                        bound(func.ST_XMin(geometry)),
+                        bound(func.ST_YMin(geometry)),
+                        bound(func.ST_XMax(geometry)),
+                        bound(func.ST_YMax(geometry)),
+                    ),
+                }
+            ),
+        ),
+    )
+    return type_coerce(cast(feature, Text), GeoJSONText)
+
+
+def json_object(values: dict):
     """
-    Get the centroid of a geometry object as a GeoJSON Feature.
+    Build a json_build_object SQL expression.
 
     Args:
-        geometry (Geometry): The geometry object to get the centroid of.
-        properties (str, optional): A dictionary of properties to include in the GeoJSON Feature. Defaults to an empty dictionary.
+        values (dict): A mapping of keys to values or SQL expressions.
 
     Returns:
-        A GeoJSON Feature representing the centroid of the input geometry.
+        A SQL expression returning a JSON object.
     """
-    if geometry:
-        shape = to_shape(geometry)
-        point = shape.centroid
-        geojson = {
-            "type": "Feature",
-            "geometry": mapping(point),
-            "properties": properties,
-        }
-        return Feature(**geojson)
+    args = []
+    for key, value in values.items():
+        args.extend((key, value))
+    return func.json_build_object(*args, type_=JSON)
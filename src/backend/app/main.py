@@ -18,6 +18,7 @@
 
 """Entrypoint for FastAPI app."""
 
+import asyncio
 import logging
 import os
 import sys
@@ -29,16 +30,19 @@ from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse, RedirectResponse
 from osm_fieldwork.xlsforms import xlsforms_path
+from sqlalchemy import text
 
 from .__version__ import __version__
 from .auth import auth_routes
+from .cache import cache
 from .central import central_routes
 from .config import settings
 from .db.database import Base, engine, get_db
+from .db.db_models import SCHEMA_LOCK
 from .organization import organization_routes
 from .projects import project_routes
 from .projects.project_crud import read_xlsforms
-from .submission import submission_routes
+from .submission import submission_crud, submission_routes
 from .tasks import tasks_routes
 from .users import user_routes
 
@@ -84,6 +88,7 @@ def get_application() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["ETag", "X-Next-Cursor", "X-Prev-Cursor", "X-Total-Count"],
     )
 
     _app.include_router(user_routes.router)
@@ -125,16 +130,33 @@ async def startup_event():
     """Commands to run on server startup."""
     logger.debug("Starting up FastAPI server.")
     logger.debug("Connecting to DB with SQLAlchemy")
-    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        # One worker at a time creates the tables and applies the startup DDL
+        connection.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK}
+        )
+        Base.metadata.create_all(bind=connection)
 
     # Read in XLSForms
     read_xlsforms(next(get_db()), xlsforms_path)
 
+    # Every worker schedules the sync, only the one holding its lock runs it
+    if settings.SUBMISSION_SYNC_INTERVAL:
+        api.state.submission_sync = asyncio.create_task(
+            submission_crud.sync_submissions_forever()
+        )
+
+    # Drop cached reads when another worker writes
+    cache.start_listener()
+
 
 @api.on_event("shutdown")
 async def shutdown_event():
     """Commands to run on server shutdown."""
     logger.debug("Shutting down FastAPI server.")
+    if getattr(api.state, "submission_sync", None):
+        api.state.submission_sync.cancel()
+    cache.stop_listener()
 
 
 @api.get("/")
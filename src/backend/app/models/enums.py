@@ -257,4 +257,28 @@ class BackgroundTaskStatus(IntEnum, Enum):
     SUCCESS = 4
 
 
+class ReviewState(StrEnum, Enum):
+    """Enum describing the review states ODK Central submissions can be set to."""
+
+    APPROVED = "approved"
+    HAS_ISSUES = "hasIssues"
+    REJECTED = "rejected"
+
+
+class ConflationStatus(StrEnum, Enum):
+    """Enum describing how a submission compares with the data extract."""
+
+    NEW = "new"
+    MODIFIED = "modified"
+    DUPLICATE = "duplicate"
+
+
+class TileLayer(StrEnum, Enum):
+    """Enum describing the vector tile layers of a project."""
+
+    TASKS = "tasks"
+    FEATURES = "features"
+    SUBMISSIONS = "submissions"
+
+
 TILES_SOURCE = ["esri", "bing", "google", "topo"]
@@ -25,6 +25,7 @@ import re
 from sqlalchemy.orm import Session
 
 from ..db import db_models
+from ..pagination.pagination import keyset_paginate
 
 IMAGEDIR = "app/images/"
 
@@ -35,18 +36,30 @@ IMAGEDIR = "app/images/"
 
 def get_organisations(
     db: Session,
+    limit: int = 100,
+    cursor: str = None,
+    count: bool = False,
 ):
     """
     Retrieve a list of organisations from the database.
 
     Args:
         db (Session): SQLAlchemy database session.
+        limit (int, optional): The maximum number of organisations to return. Defaults to 100.
+        cursor (str, optional): The cursor of the page to return. Defaults to None.
+        count (bool, optional): Whether to estimate the total number of organisations. Defaults to False.
 
     Returns:
-        List[DbOrganisation]: A list of organisation records from the database.
+        Page: A page of DbOrganisation records from the database.
     """
-    db_organisation = db.query(db_models.DbOrganisation).all()
-    return db_organisation
+    return keyset_paginate(
+        db,
+        db.query(db_models.DbOrganisation),
+        [db_models.DbOrganisation.id],
+        cursor,
+        limit,
+        count=count,
+    )
 
 def generate_slug(text: str) -> str:
     """
@@ -24,12 +24,14 @@ from fastapi import (
     File,
     Form,
     HTTPException,
+    Response,
     UploadFile,
 )
 from fastapi.logger import logger as logger
 from sqlalchemy.orm import Session
 
 from ..db import database
+from ..pagination.pagination import set_page_headers
 from . import organization_crud
 
 router = APIRouter(
@@ -42,21 +44,33 @@ router = APIRouter(
 
 @router.get("/")
 def get_organisations(
+    response: Response,
+    limit: int = 100,
+    cursor: str = None,
+    count: bool = False,
     db: Session = Depends(database.get_db),
 
 ):
     """
     Get the list of organizations.
 
+    The cursors of the next and previous pages are returned in the
+    X-Next-Cursor and X-Prev-Cursor headers.
+
     Args:
+        response (Response): The response, to add the page headers to.
+        limit (int, optional): The maximum number of organizations to return. Defaults to 100.
+        cursor (str, optional): The cursor of the page to return. Defaults to None.
+        count (bool, optional): Whether to send an estimate of the total in X-Total-Count. Defaults to False.
         db (Session): SQLAlchemy database session.
 
     Returns:
         List[DbOrganisation]: A list of organization records from the database.
     """
     
-    organizations = organization_crud.get_organisations(db)
-    return organizations
+    page = organization_crud.get_organisations(db, limit, cursor, count)
+    set_page_headers(response, page)
+    return page.items
 
 
 @router.post("/")
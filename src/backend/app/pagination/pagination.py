@@ -1,5 +1,12 @@
+import base64
+import json
 import math
-from typing import List
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql.elements import ColumnElement
 
 def get_pages_nav(total_pages: int, current_page: int) -> tuple[int, int]:
     """
@@ -43,3 +50,180 @@ def paginate_data(data: List[dict], page_no: int, page_size: int, total_content:
         "results": data,
     }
 
+
+class Page(NamedTuple):
+    """
+    One page of a keyset paginated list.
+
+    Attributes:
+        items (list): The items of the page.
+        next_cursor (str): The cursor of the following page, if there is one.
+        prev_cursor (str): The cursor of the preceding page, if there is one.
+        total (int): An estimate of the number of items in the list, if requested.
+    """
+
+    items: list
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
+def encode_cursor(direction: str, values: list) -> str:
+    """
+    Encode a position in a list as an opaque cursor.
+
+    Args:
+        direction (str): "next" to read the items after the position, "prev" for the items before it.
+        values (list): The sort key values of the item at the position.
+
+    Returns:
+        str: The cursor.
+    """
+    data = json.dumps({"d": direction, "k": values}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, list]:
+    """
+    Decode a cursor created by encode_cursor.
+
+    Args:
+        cursor (str): The cursor.
+
+    Raises:
+        HTTPException: If the cursor is not valid.
+
+    Returns:
+        Tuple[str, list]: The direction and the sort key values.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+        direction, values = data["d"], data["k"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor") from None
+    if direction not in ("next", "prev") or not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return direction, values
+
+
+def estimate_count(db: Session, query: Query) -> int:
+    """
+    Estimate the number of rows a query returns from the query planner.
+
+    Much cheaper than counting, but only as accurate as the table statistics.
+
+    Args:
+        db (Session): The database session.
+        query (Query): The query to estimate.
+
+    Returns:
+        int: The estimated number of rows.
+    """
+    connection = db.connection()
+    compiled = query.statement.compile(dialect=connection.dialect)
+    plan = connection.exec_driver_sql(
+        f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def keyset_paginate(
+    db: Session,
+    query: Query,
+    keys: List[ColumnElement],
+    cursor: str = None,
+    limit: int = None,
+    skip: int = 0,
+    count: bool = False,
+    key_of: Callable = None,
+    descending: bool = False,
+) -> Page:
+    """
+    Get one page of a query, positioned by its sort keys instead of an offset.
+
+    Every page costs the same index range scan, however deep it is. The keys
+    must be unique together, ending with the primary key makes sure of that.
+
+    Args:
+        db (Session): The database session.
+        query (Query): The query to paginate, without ordering.
+        keys (List[ColumnElement]): The columns to sort by.
+        cursor (str, optional): A cursor from a previous page. Defaults to None.
+        limit (int, optional): The maximum number of items in the page. Defaults to None, for all items.
+        skip (int, optional): The number of items to skip when no cursor is given. Defaults to 0.
+        count (bool, optional): Whether to estimate the number of items in the list. Defaults to False.
+        key_of (Callable, optional): Gets the sort key values of a row. Defaults to reading the key attributes.
+        descending (bool, optional): Whether to sort from the largest keys, such as the newest first. Defaults to False.
+
+    Returns:
+        Page: The rows of the page, in sort order, and the cursors around it.
+
+    Raises:
+        HTTPException: If the limit is not positive, or the cursor is not valid.
+    """
+    if limit is not None and limit <= 0:
+        raise HTTPException(status_code=422, detail="limit must be greater than 0")
+    key_of = key_of or (lambda row: [getattr(row, key.key) for key in keys])
+    total = estimate_count(db, query) if count else None
+
+    direction, values = decode_cursor(cursor) if cursor else ("next", None)
+    # Whether the rows are read in increasing key order
+    ascending = (direction == "next") != descending
+    if values is not None:
+        if len(values) != len(keys):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        position = tuple_(*keys), tuple_(*values)
+        if ascending:
+            query = query.filter(position[0] > position[1])
+        else:
+            query = query.filter(position[0] < position[1])
+
+    if ascending:
+        query = query.order_by(*(key.asc() for key in keys))
+    else:
+        query = query.order_by(*(key.desc() for key in keys))
+    if values is None and skip:
+        query = query.offset(skip)
+
+    # One extra row tells whether there is another page
+    if limit is None:
+        rows = query.all()
+    else:
+        rows = query.limit(limit + 1).all()
+    more = limit is not None and len(rows) > limit
+    rows = rows[:limit] if limit is not None else rows
+    if direction == "prev":
+        rows.reverse()
+    if not rows:
+        return Page(rows, total=total)
+
+    first, last = key_of(rows[0]), key_of(rows[-1])
+    if direction == "next":
+        next_cursor = encode_cursor("next", last) if more else None
+        prev_cursor = encode_cursor("prev", first) if values or skip else None
+    else:
+        next_cursor = encode_cursor("next", last)
+        prev_cursor = encode_cursor("prev", first) if more else None
+    return Page(rows, next_cursor, prev_cursor, total)
+
+
+def set_page_headers(response: Response, page: Page):
+    """
+    Add the cursors and total of a page to the response headers.
+
+    List bodies stay plain arrays, the navigation is sent in X-Next-Cursor,
+    X-Prev-Cursor and X-Total-Count.
+
+    Args:
+        response (Response): The response to send the page in.
+        page (Page): The page.
+    """
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    if page.prev_cursor:
+        response.headers["X-Prev-Cursor"] = page.prev_cursor
+    if page.total is not None:
+        response.headers["X-Total-Count"] = str(page.total)
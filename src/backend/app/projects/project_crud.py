@@ -17,13 +17,12 @@
 #
 
 
-import base64
 import io
 import json
 import logging
 import os
+import re
 import uuid
-from base64 import b64encode
 from json import dumps, loads
 from typing import List
 from zipfile import ZipFile
@@ -38,23 +37,24 @@ import sqlalchemy
 from fastapi import HTTPException, UploadFile, File
 from fastapi.responses import FileResponse
 from fastapi.logger import logger as logger
+from geoalchemy2 import Geography
 from geoalchemy2.shape import from_shape
 from geojson import dump
 from osm_fieldwork.make_data_extract import PostgresClient
 from osm_fieldwork.OdkCentral import OdkAppUser
 from osm_fieldwork.xlsforms import xlsforms_path
-from shapely import wkt, wkb
+from shapely import set_precision, wkt, wkb
 from shapely.geometry import MultiPolygon, Polygon, mapping, shape
 from sqlalchemy import (
+    cast,
     column,
     inspect,
     select,
     table,
     func,
-    and_
 )
 from sqlalchemy.dialects.postgresql import insert
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Load, Session, selectinload, with_expression
 from sqlalchemy.sql import text
 from osm_fieldwork.filter_data import FilterData
 from osm_fieldwork import basemapper
@@ -62,9 +62,19 @@ from osm_fieldwork import basemapper
 from ..central import central_crud
 from ..config import settings
 from ..db import db_models
-from ..db.postgis_utils import geometry_to_geojson, timestamp
+from ..pagination.pagination import keyset_paginate
+from ..db.postgis_utils import (
+    DEFAULT_PRECISION,
+    FULL_PRECISION,
+    GeometryOptions,
+    geometry_to_geojson,
+    simplify_geometry,
+    timestamp,
+)
+from ..models.enums import ProjectPriority, ProjectStatus
 from ..tasks import tasks_crud
 from ..users import user_crud
+from ..workspace.workspace import Workspace, WorkspaceFull, job_log, workspace
 
 from . import project_schemas
 
@@ -80,11 +90,13 @@ from io import BytesIO
 
 QR_CODES_DIR = "QR_codes/"
 TASK_GEOJSON_DIR = "geojson/"
+# Grid the generated task outlines are snapped to
+TASK_GRID_SIZE = 10**-DEFAULT_PRECISION
 
 
 def get_projects(
     db: Session, user_id: int, skip: int = 0, limit: int = 100, db_objects: bool = False,
-    hashtags: List[str] = None
+    hashtags: List[str] = None, cursor: str = None
 ):
     """
     Gets a list of projects.
@@ -92,10 +104,11 @@ def get_projects(
     Args:
         db (Session): A database session.
         user_id (int): The ID of the user. Only projects created by this user are returned.
-        skip (int, optional): The number of projects to skip. Defaults to 0.
+        skip (int, optional): The number of projects to skip, when no cursor is given. Defaults to 0.
         limit (int, optional): The maximum number of projects to return. Defaults to 100.
         db_objects (bool, optional): If True, returns database objects instead of app projects. Defaults to False.
         hashtags (List[str], optional): A list of hashtags to filter projects by. Only projects with these hashtags are returned. Defaults to None.
+        cursor (str, optional): The cursor of the page to return. Defaults to None.
 
     Returns:
         Any: A list of projects.
@@ -106,59 +119,247 @@ def get_projects(
         
     if hashtags:
         filters.append(db_models.DbProject.hashtags.op('&&')(hashtags))
-        
-    if len(filters) > 0:
-        db_projects = (
-            db.query(db_models.DbProject)
-            .filter(and_(*filters))
-            .order_by(db_models.DbProject.id.asc())
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
-    
-    else:
-        db_projects = (
-            db.query(db_models.DbProject)
-            .order_by(db_models.DbProject.id.asc())
-            .offset(skip).limit(limit).all()
-        )
+
+    page = keyset_paginate(
+        db,
+        db.query(db_models.DbProject).filter(*filters),
+        [db_models.DbProject.id],
+        cursor,
+        limit,
+        skip,
+    )
+    db_projects = page.items
     if db_objects:
         return db_projects
     return convert_to_app_projects(db_projects)
 
 
-def get_project_summaries(db: Session, user_id: int, skip: int = 0, limit: int = 100, hashtags: str = None):
+def get_project_summaries(
+    db: Session,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    hashtags: str = None,
+    cursor: str = None,
+    count: bool = False,
+):
     """
     Gets a list of project summaries.
 
     Args:
         db (Session): A database session.
         user_id (int): The ID of the user. Only summaries for projects created by this user are returned.
-        skip (int, optional): The number of project summaries to skip. Defaults to 0.
+        skip (int, optional): The number of project summaries to skip, when no cursor is given. Defaults to 0.
         limit (int, optional): The maximum number of project summaries to return. Defaults to 100.
         hashtags (str, optional): A list of hashtags to filter project summaries by. Only summaries for projects with these hashtags are returned. Defaults to None.
+        cursor (str, optional): The cursor of the page to return. Defaults to None.
+        count (bool, optional): Whether to estimate the total number of projects. Defaults to False.
 
     Returns:
-        Any: A list of project summaries.
-    """
-    # TODO: Just get summaries, something like:
-    #     db_projects = db.query(db_models.DbProject).with_entities(
-    #         db_models.DbProject.id,
-    #         db_models.DbProject.priority,
-    #         db_models.DbProject.total_tasks,
-    #         db_models.DbProject.tasks_mapped,
-    #         db_models.DbProject.tasks_validated,
-    #         db_models.DbProject.tasks_bad_imagery,
-    #     ).join(db_models.DbProject.project_info) \
-    #         .with_entities(
-    #             db_models.DbProjectInfo.name,
-    #             db_models.DbProjectInfo.short_description) \
-    #         .filter(
-    #         db_models.DbProject.author_id == user_id).offset(skip).limit(limit).all()
-
-    db_projects = get_projects(db, user_id, skip, limit, True, hashtags)
-    return convert_to_project_summaries(db_projects)
+        Page: A page of project_schemas.ProjectSummary.
+    """
+    project = db_models.DbProject
+
+    filters = []
+    if user_id:
+        filters.append(project.author_id == user_id)
+    if hashtags:
+        filters.append(project.hashtags.op("&&")(hashtags))
+
+    page = keyset_paginate(
+        db,
+        project_summary_query(db).filter(*filters),
+        [project.id],
+        cursor,
+        limit,
+        skip,
+        count,
+        key_of=lambda row: [row[0].id],
+    )
+    return page._replace(items=[to_project_summary(*row) for row in page.items])
+
+
+def get_projects_near(
+    db: Session,
+    lat: float,
+    long: float,
+    limit: int = 10,
+    hashtags: List[str] = None,
+    status: ProjectStatus = ProjectStatus.PUBLISHED,
+):
+    """
+    Gets the projects nearest to a location.
+
+    The projects are ordered with the KNN operator on the indexed centroid,
+    so only the returned rows are read; the distance is then computed on the
+    spheroid for those rows.
+
+    Args:
+        db (Session): A database session.
+        lat (float): The latitude of the location.
+        long (float): The longitude of the location.
+        limit (int, optional): The number of projects to return. Defaults to 10.
+        hashtags (List[str], optional): Only return projects with one of these hashtags. Defaults to None.
+        status (ProjectStatus, optional): Only return projects with this status, or any status if None. Defaults to ProjectStatus.PUBLISHED.
+
+    Returns:
+        List[project_schemas.ProjectNearby]: The project summaries, nearest first, with their distance in meters.
+    """
+    project = db_models.DbProject
+    point = func.ST_SetSRID(func.ST_MakePoint(long, lat), 4326)
+
+    filters = [project.centroid.isnot(None)]
+    if status is not None:
+        filters.append(project.status == status)
+    if hashtags:
+        filters.append(project.hashtags.op("&&")(hashtags))
+
+    rows = (
+        project_summary_query(
+            db,
+            func.ST_Distance(
+                cast(project.centroid, Geography(srid=4326)),
+                cast(point, Geography(srid=4326)),
+            ),
+        )
+        .filter(*filters)
+        .order_by(project.centroid.op("<->")(point))
+        .limit(limit)
+        .all()
+    )
+    return [
+        to_project_summary(
+            *row[:-1], schema=project_schemas.ProjectNearby, distance=row[-1]
+        )
+        for row in rows
+    ]
+
+
+def search_projects(
+    db: Session,
+    search: str,
+    hashtags: List[str] = None,
+    organisation_id: int = None,
+    skip: int = 0,
+    limit: int = 20,
+):
+    """
+    Searches projects by name and description, best matches first.
+
+    Every word of the search is matched as a prefix against the
+    text_searchable column of project_info, which is kept current by a
+    trigger and GIN indexed. Matches in the name rank above matches in the
+    descriptions.
+
+    Args:
+        db (Session): A database session.
+        search (str): The words to search for.
+        hashtags (List[str], optional): Only return projects with one of these hashtags. Defaults to None.
+        organisation_id (int, optional): Only return projects of this organisation. Defaults to None.
+        skip (int, optional): The number of projects to skip. Defaults to 0.
+        limit (int, optional): The maximum number of projects to return. Defaults to 20.
+
+    Returns:
+        List[project_schemas.ProjectSummary]: The matching project summaries.
+    """
+    words = re.findall(r"\w+", search or "")
+    if not words:
+        return []
+
+    project = db_models.DbProject
+    info = db_models.DbProjectInfo
+    query = func.to_tsquery("simple", " & ".join(f"{word}:*" for word in words))
+    rank = func.ts_rank(info.text_searchable, query)
+
+    filters = [info.text_searchable.op("@@")(query)]
+    if hashtags:
+        filters.append(project.hashtags.op("&&")(hashtags))
+    if organisation_id:
+        filters.append(project.organisation_id == organisation_id)
+
+    rows = (
+        project_summary_query(db)
+        .join(info, info.project_id == project.id)
+        .filter(*filters)
+        .order_by(rank.desc(), project.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+    return [to_project_summary(*row) for row in rows]
+
+
+def project_summary_query(db: Session, *columns):
+    """
+    Builds the query of project summaries read by to_project_summary.
+
+    Names and counters come from the trigger-maintained project_summaries
+    table, so the query reads only primary key joins.
+
+    Args:
+        db (Session): A database session.
+        *columns: Extra columns to select after the summary columns.
+
+    Returns:
+        Query: The query, selecting the project, its summary and its bbox.
+    """
+    project = db_models.DbProject
+    summary = db_models.DbProjectSummary
+    return (
+        db.query(
+            project,
+            summary,
+            func.ST_XMin(project.outline),
+            func.ST_YMin(project.outline),
+            func.ST_XMax(project.outline),
+            func.ST_YMax(project.outline),
+            *columns,
+        )
+        .options(
+            Load(project).load_only(
+                project.id, project.priority, project.location_str, project.hashtags
+            )
+        )
+        .outerjoin(summary, summary.project_id == project.id)
+    )
+
+
+def to_project_summary(
+    db_project: db_models.DbProject,
+    db_summary: db_models.DbProjectSummary,
+    *bbox: float,
+    schema=project_schemas.ProjectSummary,
+    **extra,
+):
+    """
+    Converts a row of project_summary_query to a project summary.
+
+    Args:
+        db_project (db_models.DbProject): The project.
+        db_summary (db_models.DbProjectSummary): Its summary, or None if it has none yet.
+        *bbox (float): The bbox of the project outline, as minx, miny, maxx, maxy.
+        schema (Type[ProjectSummary], optional): The schema to build. Defaults to project_schemas.ProjectSummary.
+        **extra: Values of the fields the schema adds to ProjectSummary.
+
+    Returns:
+        project_schemas.ProjectSummary: The project summary.
+    """
+    db_summary = db_summary or db_models.DbProjectSummary()
+    return schema(
+        id=db_project.id,
+        priority=db_project.priority or ProjectPriority.MEDIUM,
+        title=db_summary.name,
+        location_str=db_project.location_str,
+        description=db_summary.short_description,
+        num_contributors=db_summary.num_contributors or 0,
+        total_tasks=db_summary.total_tasks or 0,
+        tasks_mapped=db_summary.tasks_mapped or 0,
+        tasks_validated=db_summary.tasks_validated or 0,
+        tasks_bad=db_summary.tasks_bad or 0,
+        hashtags=db_project.hashtags,
+        bbox=list(bbox) if bbox[0] is not None else None,
+        **extra,
+    )
 
 
 def get_project_by_id_w_all_tasks(db: Session, project_id: int):
@@ -200,27 +401,72 @@ def get_project(db: Session, project_id: int):
     return db_project
 
 
-def get_project_by_id(db: Session, project_id: int):
+def get_project_by_id(
+    db: Session, project_id: int, options: GeometryOptions = GeometryOptions()
+):
     """
     Gets a project by its ID.
 
     Args:
         db (Session): A database session.
         project_id (int): The ID of the project.
+        options (GeometryOptions, optional): How to render the project and task outlines. Defaults to the stored task GeoJSON.
 
     Returns:
         Any: A database object representing the specified project.
     """
+    project = db_models.DbProject
+    query = db.query(project).options(
+        with_expression(
+            project.outline_geojson,
+            geometry_to_geojson(
+                project.outline, {"id": project.id}, project.id, options
+            ),
+        )
+    )
+    if options != GeometryOptions():
+        query = query.options(
+            selectinload(project.tasks).with_expression(
+                db_models.DbTask.rendered_geojson,
+                tasks_crud.task_outline_geojson(options),
+            ),
+        )
 
     db_project = (
-        db.query(db_models.DbProject)
+        query
         .filter(db_models.DbProject.id == project_id)
         .order_by(db_models.DbProject.id)
+        # Render the outline even if the project was loaded before
+        .populate_existing()
         .first()
     )
     return convert_to_app_project(db_project)
 
 
+def get_project_version(db: Session, project_id: int):
+    """
+    Gets the version of a project, bumped on every write to the project or its tasks.
+
+    Args:
+        db (Session): A database session.
+        project_id (int): The ID of the project.
+
+    Raises:
+        HTTPException: If the project does not exist.
+
+    Returns:
+        int: The version of the project.
+    """
+    version = (
+        db.query(db_models.DbProject.version)
+        .filter(db_models.DbProject.id == project_id)
+        .scalar()
+    )
+    if version is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return version
+
+
 def get_project_info_by_id(db: Session, project_id: int):
     """
     Gets project information by its ID.
@@ -306,9 +552,8 @@ def partial_update_project_info(
         db_project_info.short_description = project_metadata.short_description
 
     db.commit()
-    db.refresh(db_project)
 
-    return convert_to_app_project(db_project)
+    return get_project_by_id(db, project_id)
 
 
 def update_project_info(
@@ -364,9 +609,8 @@ def update_project_info(
     db_project_info.description = project_info_1.description
 
     db.commit()
-    db.refresh(db_project)
 
-    return convert_to_app_project(db_project)
+    return get_project_by_id(db, project_id)
 
 
 def create_project_with_project_info(
@@ -638,9 +882,12 @@ async def preview_tasks(boundary: str, dimension: int):
                 ]
             )
 
-            if boundary.intersection(poly):
+            # Snap the cell to the precision of the stored task outlines,
+            # instead of the 15+ decimal places of the linspace math
+            cell = set_precision(boundary.intersection(poly), TASK_GRID_SIZE)
+            if not cell.is_empty:
                 feature = geojson.Feature(
-                    geometry=boundary.intersection(poly), properties={"id": str(id)}
+                    geometry=cell, properties={"id": str(id)}
                 )
                 id += 1
 
@@ -735,7 +982,6 @@ def get_osm_extracts(boundary: str):
     # result.content
     fp = BytesIO(result.content)
     zfp = zipfile.ZipFile(fp, "r")
-    zfp.extract("Export.geojson", "/tmp/")
     data = json.loads(zfp.read("Export.geojson"))
 
     for feature in data['features']:
@@ -983,7 +1229,7 @@ def update_project_boundary(
         db_models.DbTask.project_id == project_id
     ).delete()
 
-    tasks = eval(result)
+    tasks = json.loads(result)
     for poly in tasks["features"]:
         logger.debug(poly)
         task_name = str(poly["properties"]["id"])
@@ -995,7 +1241,6 @@ def update_project_boundary(
             # qr_code_id=db_qr.id,
             # project_task_index=feature["properties"]["fid"],
             project_task_index=1,
-            # geometry_geojson=geojson.dumps(task_geojson),
             # initial_feature_count=len(task_geojson["features"]),
         )
         db.add(db_task)
@@ -1145,7 +1390,6 @@ def update_project_with_zip(
                     qr_code=db_qr,
                     qr_code_id=db_qr.id,
                     outline=task_outline_shape.wkt,
-                    # geometry_geojson=json.dumps(task_geojson),
                     initial_feature_count=len(task_geojson["features"]),
                 )
                 db.add(task)
@@ -1323,7 +1567,8 @@ def generate_task_files(
         task_id: int,
         xlsform: str,
         form_type: str,
-        odk_credentials: project_schemas.ODKCentral
+        odk_credentials: project_schemas.ODKCentral,
+        ws: Workspace,
 ):
     """
     Generates task files for a specified project.
@@ -1335,6 +1580,7 @@ def generate_task_files(
         xlsform (str): The XLSForm data to use when generating the task files.
         form_type (str): The type of form to use when generating the task files.
         odk_credentials (project_schemas.ODKCentral): The ODK credentials to use when generating the task files.
+        ws (Workspace): The workspace of the job, the task files are written to it.
 
     Returns:
         bool: True if the task files were successfully generated, False otherwise.
@@ -1367,8 +1613,8 @@ def generate_task_files(
     db.refresh(task)
 
     # This file will store xml contents of an xls form.
-    xform = f"/tmp/{name}.xml"
-    extracts = f"/tmp/{name}.geojson"  # This file will store osm extracts
+    xform = ws.file(f"{name}.xml")
+    extracts = ws.file(f"{name}.geojson")  # This file will store osm extracts
 
     # xform_id_format
     xform_id = f"{name}".split("_")[2]
@@ -1482,150 +1728,143 @@ def generate_appuser_files(
     
 
     try:
-        ## Logging ##
-        # create file handler
-        handler = logging.FileHandler(f"/tmp/{project_id}_generate.log")
-        handler.setLevel(logging.DEBUG)
-
-        # create formatter
-        formatter = logging.Formatter(
-            "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-        )
-        handler.setFormatter(formatter)
-
-        # add handler to logger
-        logger.addHandler(handler)
-        logger.info(
-            f"Starting generate_appuser_files for project {project_id}")
-
-        # Get the project table contents.
-        project = table(
-            "projects",
-            column("project_name_prefix"),
-            column("xform_title"),
-            column("id"),
-            column("odk_central_url"),
-            column("odk_central_user"),
-            column("odk_central_password"),
-            column("outline")
-        )
+        with job_log(logger, background_task_id), workspace(
+            f"generate_{project_id}"
+        ) as ws:
+            logger.info(
+                f"Starting generate_appuser_files for project {project_id}")
+
+            # Get the project table contents.
+            project = table(
+                "projects",
+                column("project_name_prefix"),
+                column("xform_title"),
+                column("id"),
+                column("odk_central_url"),
+                column("odk_central_user"),
+                column("odk_central_password"),
+                column("outline")
+            )
 
-        where = f"id={project_id}"
-        sql = select(
-            project.c.project_name_prefix,
-            project.c.xform_title,
-            project.c.id,
-            project.c.odk_central_url,
-            project.c.odk_central_user,
-            project.c.odk_central_password,
-
-            geoalchemy2.functions.ST_AsGeoJSON(
-                project.c.outline).label("outline"),
-        ).where(text(where))
-        result = db.execute(sql)
+            where = f"id={project_id}"
+            sql = select(
+                project.c.project_name_prefix,
+                project.c.xform_title,
+                project.c.id,
+                project.c.odk_central_url,
+                project.c.odk_central_user,
+                project.c.odk_central_password,
+
+                geoalchemy2.functions.ST_AsGeoJSON(
+                    project.c.outline).label("outline"),
+            ).where(text(where))
+            result = db.execute(sql)
+
+            # There should only be one match
+            if result.rowcount != 1:
+                logger.warning(str(sql))
+                if result.rowcount < 1:
+                    raise HTTPException(
+                        status_code=400, detail="Project not found")
+                else:
+                    raise HTTPException(
+                        status_code=400, detail="Multiple projects found")
 
-        # There should only be one match
-        if result.rowcount != 1:
-            logger.warning(str(sql))
-            if result.rowcount < 1:
-                raise HTTPException(
-                    status_code=400, detail="Project not found")
-            else:
-                raise HTTPException(
-                    status_code=400, detail="Multiple projects found")
+            one = result.first()
 
-        one = result.first()
+            if one:
+                prefix = one.project_name_prefix
 
-        if one:
-            prefix = one.project_name_prefix
+                # Get odk credentials from project.
+                odk_credentials = {
+                    "odk_central_url": one.odk_central_url,
+                    "odk_central_user": one.odk_central_user,
+                    "odk_central_password": one.odk_central_password,
+                }
 
-            # Get odk credentials from project.
-            odk_credentials = {
-                "odk_central_url": one.odk_central_url,
-                "odk_central_user": one.odk_central_user,
-                "odk_central_password": one.odk_central_password,
-            }
+                odk_credentials = project_schemas.ODKCentral(**odk_credentials)
 
-            odk_credentials = project_schemas.ODKCentral(**odk_credentials)
+                xform_title = one.xform_title if one.xform_title else None
 
-            xform_title = one.xform_title if one.xform_title else None
+                if upload:
+                    xlsform = ws.file(f"custom_form.{form_type}")
+                    contents = upload
+                    with open(xlsform, "wb") as f:
+                        f.write(contents)
+                else:
+                    xlsform = f"{xlsforms_path}/{xform_title}.xls"
 
-            if upload:
-                xlsform = f"/tmp/custom_form.{form_type}"
-                contents = upload
-                with open(xlsform, "wb") as f:
-                    f.write(contents)
-            else:
-                xlsform = f"{xlsforms_path}/{xform_title}.xls"
+                category = xform_title
 
-            category = xform_title
+                # Data Extracts
+                if extracts_contents is not None:
+                    upload_custom_data_extracts(db, project_id, extracts_contents)
 
-            # Data Extracts
-            if extracts_contents is not None:
-                upload_custom_data_extracts(db, project_id, extracts_contents)
+                else:
 
-            else:
+                    # OSM Extracts for whole project
+                    pg = PostgresClient(
+                        'https://raw-data-api0.hotosm.org/v1', "underpass")
+                    # This file will store osm extracts
+                    outfile = ws.file(f"{prefix}_{xform_title}.geojson")
 
-                # OSM Extracts for whole project
-                pg = PostgresClient(
-                    'https://raw-data-api0.hotosm.org/v1', "underpass")
-                # This file will store osm extracts
-                outfile = f"/tmp/{prefix}_{xform_title}.geojson"
+                    outline = json.loads(one.outline)
+                    outline_geojson = pg.getFeatures(boundary=outline,
+                                                        filespec=outfile,
+                                                        polygon=extract_polygon,
+                                                        xlsfile=f'{category}.xls',
+                                                        category=category
+                                                        )
 
-                outline = json.loads(one.outline)
-                outline_geojson = pg.getFeatures(boundary=outline,
-                                                    filespec=outfile,
-                                                    polygon=extract_polygon,
-                                                    xlsfile=f'{category}.xls',
-                                                    category=category
-                                                    )
+                    updated_outline_geojson = {
+                        "type": "FeatureCollection",
+                        "features": []}
 
-                updated_outline_geojson = {
-                    "type": "FeatureCollection",
-                    "features": []}
+                    # Collect feature mappings for bulk insert
+                    feature_mappings = []
 
-                # Collect feature mappings for bulk insert
-                feature_mappings = []
+                    for feature in outline_geojson["features"]:
 
-                for feature in outline_geojson["features"]:
+                        # If the osm extracts contents do not have a title, provide an empty text for that.
+                        feature["properties"]["title"] = ""
 
-                    # If the osm extracts contents do not have a title, provide an empty text for that.
-                    feature["properties"]["title"] = ""
+                        feature_shape = shape(feature['geometry'])
 
-                    feature_shape = shape(feature['geometry'])
+                        # If the centroid of the Polygon is not inside the outline, skip the feature.
+                        if extract_polygon and (not shape(outline).contains(shape(feature_shape.centroid))):
+                            continue
 
-                    # If the centroid of the Polygon is not inside the outline, skip the feature.
-                    if extract_polygon and (not shape(outline).contains(shape(feature_shape.centroid))):
+                        wkb_element = from_shape(feature_shape, srid=4326)
+                        feature_mapping = {
+                            'project_id': project_id,
+                            'category_title': category,
+                            'geometry': wkb_element,
+                            'properties': feature["properties"],
+                        }
+                        updated_outline_geojson['features'].append(feature)
+                        feature_mappings.append(feature_mapping)
+
+                    # Bulk insert the osm extracts into the db.
+                    db.bulk_insert_mappings(db_models.DbFeatures, feature_mappings)
+
+                # Generating QR Code, XForm and uploading OSM Extracts to the form.
+                # Creating app users and updating the role of that user.
+                tasks_list = tasks_crud.get_task_lists(db, project_id)
+
+                for task in tasks_list:
+                    try:
+                        generate_task_files(db, project_id, task,
+                                            xlsform, form_type, odk_credentials, ws)
+                    except WorkspaceFull:
+                        # Out of workspace space, the other tasks would fail too
+                        raise
+                    except Exception as e:
+                        logger.warning(str(e))
                         continue
-
-                    wkb_element = from_shape(feature_shape, srid=4326)
-                    feature_mapping = {
-                        'project_id': project_id,
-                        'category_title': category,
-                        'geometry': wkb_element,
-                        'properties': feature["properties"],
-                    }
-                    updated_outline_geojson['features'].append(feature)
-                    feature_mappings.append(feature_mapping)
-
-                # Bulk insert the osm extracts into the db.
-                db.bulk_insert_mappings(db_models.DbFeatures, feature_mappings)
-
-            # Generating QR Code, XForm and uploading OSM Extracts to the form.
-            # Creating app users and updating the role of that user.
-            tasks_list = tasks_crud.get_task_lists(db, project_id)
-
-            for task in tasks_list:
-                try:
-                    generate_task_files(db, project_id, task,
-                                        xlsform, form_type, odk_credentials)
-                except Exception as e:
-                    logger.warning(str(e))
-                    continue
-        # Update background task status to COMPLETED
-        update_background_task_status_in_database(
-            db, background_task_id, 4
-        )  # 4 is COMPLETED
+            # Update background task status to COMPLETED
+            update_background_task_status_in_database(
+                db, background_task_id, 4
+            )  # 4 is COMPLETED
 
     except Exception as e:
         logger.warning(str(e))
@@ -1661,11 +1900,11 @@ def create_qrcode(
         project_id, token, project_name, odk_central_url
     )
     qrcode = segno.make(qrcode, micro=False)
-    image_name = f"/tmp/{project_name}_qr.png"
-    with open(image_name, "rb") as f:
-        base64_data = b64encode(f.read()).decode()
-    qr_code_text = base64.b64decode(base64_data)
-    qrdb = db_models.DbQrCode(image=qr_code_text, filename=image_name)
+    image_name = f"{project_name}_qr.png"
+    # Render the PNG in memory, concurrent jobs would share a file name
+    image = BytesIO()
+    qrcode.save(image, kind="png", scale=5)
+    qrdb = db_models.DbQrCode(image=image.getvalue(), filename=image_name)
     db.add(qrdb)
     db.commit()
     codes = table("qr_code", column("id"))
@@ -1676,40 +1915,41 @@ def create_qrcode(
 
 
 def get_project_geometry(db: Session,
-                         project_id: int):
+                         project_id: int,
+                         options: GeometryOptions = GeometryOptions(FULL_PRECISION)):
     """
     Retrieves the geometry of a project.
 
     Args:
         db (Session): The database session.
         project_id (int): The ID of the project.
+        options (GeometryOptions, optional): The precision and simplification tolerance. Defaults to full precision.
 
     Returns:
         str: A geojson of the project outline.
     """
-
-    projects = table("projects", column("outline"), column("id"))
-    where = f"projects.id={project_id}"
-    sql = select(geoalchemy2.functions.ST_AsGeoJSON(projects.c.outline)).where(
-        text(where)
+    outline = simplify_geometry(db_models.DbProject.outline, options)
+    row = (
+        db.query(geoalchemy2.functions.ST_AsGeoJSON(outline, options.precision))
+        .filter(db_models.DbProject.id == project_id)
+        .first()
     )
-    result = db.execute(sql)
-    # There should only be one match
-    if result.rowcount != 1:
-        logger.warning(str(sql))
+    if not row:
+        logger.warning(f"No outline found for project {project_id}")
         return False
-    row = eval(result.first()[0])
-    return json.dumps(row)
+    return row[0]
 
 
 def get_task_geometry(db: Session,
-                      project_id: int):
+                      project_id: int,
+                      options: GeometryOptions = GeometryOptions(FULL_PRECISION)):
     """
     Retrieves the geometry of tasks associated with a project.
 
     Args:
         db (Session): The database session.
         project_id (int): The ID of the project.
+        options (GeometryOptions, optional): The precision and simplification tolerance. Defaults to full precision.
 
     Returns:
         str: A geojson of the task boundaries
@@ -1718,9 +1958,10 @@ def get_task_geometry(db: Session,
     tasks = table("tasks", column("outline"),
                   column("project_id"), column("id"))
     where = f"project_id={project_id}"
-    sql = select(geoalchemy2.functions.ST_AsGeoJSON(tasks.c.outline)).where(
-        text(where)
-    )
+    outline = simplify_geometry(tasks.c.outline, options)
+    sql = select(
+        geoalchemy2.functions.ST_AsGeoJSON(outline, options.precision)
+    ).where(text(where))
     result = db.execute(sql)
 
     features = []
@@ -1799,9 +2040,12 @@ def create_task_grid(db: Session, project_id: int, delta: int):
                     ]
                 )
 
-                if boundary.intersection(poly):
+                # Snap the cell to the precision of the stored task outlines,
+                # instead of the 15+ decimal places of the linspace math
+                cell = set_precision(boundary.intersection(poly), TASK_GRID_SIZE)
+                if not cell.is_empty:
                     feature = geojson.Feature(
-                        geometry=boundary.intersection(poly), properties={"id": str(id)}
+                        geometry=cell, properties={"id": str(id)}
                     )
 
                     geom = shape(feature["geometry"])
@@ -1977,10 +2221,6 @@ def convert_to_app_project(db_project: db_models.DbProject):
     if db_project:
         app_project: project_schemas.Project = db_project
 
-        if db_project.outline:
-            app_project.outline_geojson = geometry_to_geojson(
-                db_project.outline, {"id": db_project.id}, db_project.id)
-
         app_project.project_tasks = tasks_crud.convert_to_app_tasks(
             db_project.tasks)
 
@@ -2091,15 +2331,13 @@ def convert_to_project_feature(db_project_feature: db_models.DbFeatures):
         Any: A project feature object representing the specified database feature.
     """
     if db_project_feature:
-        app_project_feature: project_schemas.Feature = db_project_feature
-
-        if db_project_feature.geometry:
-            app_project_feature.geometry = geometry_to_geojson(
-                db_project_feature.geometry,
-                    db_project_feature.properties, db_project_feature.id
-            )
-
-        return app_project_feature
+        # Not validated, so the GeoJSON stays as the database encoded it
+        return project_schemas.Feature.construct(
+            id=db_project_feature.id,
+            project_id=db_project_feature.project_id,
+            task_id=db_project_feature.task_id,
+            geometry=db_project_feature.feature_geojson,
+        )
     else:
         return None
 
@@ -2125,7 +2363,12 @@ def convert_to_project_features(db_project_features: List[db_models.DbFeatures])
         return []
 
 
-def get_project_features(db: Session, project_id: int, task_id: int = None):
+def get_project_features(
+    db: Session,
+    project_id: int,
+    task_id: int = None,
+    options: GeometryOptions = GeometryOptions(),
+):
     """
     Gets the features for a specified project and task.
 
@@ -2133,20 +2376,30 @@ def get_project_features(db: Session, project_id: int, task_id: int = None):
         db (Session): A database session.
         project_id (int): The ID of the project.
         task_id (int, optional): The ID of the task. If not specified, all features for the specified project are returned. Defaults to None.
+        options (GeometryOptions, optional): The precision and simplification tolerance. Defaults to GeometryOptions().
 
     Returns:
         List[Any]: A list of feature objects representing the features for the specified project and task.
     """
+    feature = db_models.DbFeatures
+    query = db.query(feature).options(
+        with_expression(
+            feature.feature_geojson,
+            geometry_to_geojson(
+                feature.geometry, feature.properties, feature.id, options
+            ),
+        )
+    )
     if task_id:
         features = (
-            db.query(db_models.DbFeatures)
+            query
             .filter(db_models.DbFeatures.project_id == project_id)
             .filter(db_models.DbFeatures.task_id == task_id)
             .all()
         )
     else:
         features = (
-            db.query(db_models.DbFeatures)
+            query
             .filter(db_models.DbFeatures.project_id == project_id)
             .all()
         )
@@ -2188,6 +2441,8 @@ async def get_background_task_status(task_id: uuid.UUID, db: Session):
         .filter(db_models.BackgroundTasks.id == str(task_id))
         .first()
     )
+    if not task:
+        raise HTTPException(status_code=404, detail="Background task not found")
     return task.status, task.message
 
 
@@ -2318,146 +2573,147 @@ async def update_project_form(
         )
 
 
-    if form:
-        xlsform = f"/tmp/custom_form.{form_type}"
-        contents = await form.read()
-        with open(xlsform, "wb") as f:
-            f.write(contents)
-    else:
-        xlsform = f"{xlsforms_path}/{category}.xls"
+    with workspace(f"form_{project_id}") as ws:
+        if form:
+            xlsform = ws.file(f"custom_form.{form_type}")
+            contents = await form.read()
+            with open(xlsform, "wb") as f:
+                f.write(contents)
+        else:
+            xlsform = f"{xlsforms_path}/{category}.xls"
 
-    db.query(db_models.DbFeatures).filter(db_models.DbFeatures.project_id == project_id).delete()
-    db.commit()
+        db.query(db_models.DbFeatures).filter(db_models.DbFeatures.project_id == project_id).delete()
+        db.commit()
 
-    # OSM Extracts for whole project
-    pg = PostgresClient('https://raw-data-api0.hotosm.org/v1', "underpass")
-    outfile = f"/tmp/{project_title}_{category}.geojson"  # This file will store osm extracts
+        # OSM Extracts for whole project
+        pg = PostgresClient('https://raw-data-api0.hotosm.org/v1', "underpass")
+        outfile = ws.file(f"{project_title}_{category}.geojson")  # This file will store osm extracts
 
-    extract_polygon = True if project.data_extract_type == 'polygon' else False
+        extract_polygon = True if project.data_extract_type == 'polygon' else False
 
-    project = table(
-        "projects", 
-        column("outline")
-    )
+        project = table(
+            "projects", 
+            column("outline")
+        )
 
-    # where = f"id={project_id}
-    sql = select(
-                geoalchemy2.functions.ST_AsGeoJSON(project.c.outline).label("outline"),
-                ).where(text(f"id={project_id}"))
-    result = db.execute(sql)
-    project_outline = result.first()
+        # where = f"id={project_id}
+        sql = select(
+                    geoalchemy2.functions.ST_AsGeoJSON(project.c.outline).label("outline"),
+                    ).where(text(f"id={project_id}"))
+        result = db.execute(sql)
+        project_outline = result.first()
 
-    final_outline = json.loads(project_outline.outline)
+        final_outline = json.loads(project_outline.outline)
 
-    outline_geojson = pg.getFeatures(boundary = final_outline, 
-                                        filespec = outfile,
-                                        polygon = extract_polygon,
-                                        xlsfile = f'{category}.xls',
-                                        category = category
-                                        )
+        outline_geojson = pg.getFeatures(boundary = final_outline, 
+                                            filespec = outfile,
+                                            polygon = extract_polygon,
+                                            xlsfile = f'{category}.xls',
+                                            category = category
+                                            )
 
 
-    updated_outline_geojson = {
-        "type": "FeatureCollection",
-        "features": []}
+        updated_outline_geojson = {
+            "type": "FeatureCollection",
+            "features": []}
 
-    # Collect feature mappings for bulk insert
-    feature_mappings = []
+        # Collect feature mappings for bulk insert
+        feature_mappings = []
 
-    for feature in outline_geojson["features"]:
+        for feature in outline_geojson["features"]:
 
-        # If the osm extracts contents do not have a title, provide an empty text for that.
-        feature["properties"]["title"] = ""
+            # If the osm extracts contents do not have a title, provide an empty text for that.
+            feature["properties"]["title"] = ""
 
-        feature_shape = shape(feature['geometry'])
+            feature_shape = shape(feature['geometry'])
 
-        # # If the centroid of the Polygon is not inside the outline, skip the feature.
-        # if extract_polygon and (not shape(outline).contains(shape(feature_shape.centroid))):
-        #     continue
+            # # If the centroid of the Polygon is not inside the outline, skip the feature.
+            # if extract_polygon and (not shape(outline).contains(shape(feature_shape.centroid))):
+            #     continue
 
-        wkb_element = from_shape(feature_shape, srid=4326)
-        feature_mapping = {
-            'project_id': project_id,
-            'category_title': category,
-            'geometry': wkb_element,
-            'properties': feature["properties"],
-        }
-        updated_outline_geojson['features'].append(feature)
-        feature_mappings.append(feature_mapping)
+            wkb_element = from_shape(feature_shape, srid=4326)
+            feature_mapping = {
+                'project_id': project_id,
+                'category_title': category,
+                'geometry': wkb_element,
+                'properties': feature["properties"],
+            }
+            updated_outline_geojson['features'].append(feature)
+            feature_mappings.append(feature_mapping)
 
-        # Insert features into db
-        db_feature = db_models.DbFeatures(
-            project_id=project_id,
-            category_title = category,
-            geometry=wkb_element,
-            properties=feature["properties"]
-        )
-        db.add(db_feature)
-        db.commit()
+            # Insert features into db
+            db_feature = db_models.DbFeatures(
+                project_id=project_id,
+                category_title = category,
+                geometry=wkb_element,
+                properties=feature["properties"]
+            )
+            db.add(db_feature)
+            db.commit()
 
-    tasks_list = tasks_crud.get_task_lists(db, project_id)
+        tasks_list = tasks_crud.get_task_lists(db, project_id)
 
-    for task in tasks_list:
+        for task in tasks_list:
 
-        task_obj = tasks_crud.get_task(db, task)
+            task_obj = tasks_crud.get_task(db, task)
 
-        # Get the features for this task.
-        # Postgis query to filter task inside this task outline and of this project
-        # Update those features and set task_id
-        query = f'''UPDATE features
-                    SET task_id={task}
-                    WHERE id in (
+            # Get the features for this task.
+            # Postgis query to filter task inside this task outline and of this project
+            # Update those features and set task_id
+            query = f'''UPDATE features
+                        SET task_id={task}
+                        WHERE id in (
                     
-                    SELECT id
-                    FROM features
-                    WHERE project_id={project_id} and ST_Intersects(geometry, '{task_obj.outline}'::Geometry)
-
-                    )'''
-
-        result = db.execute(query)
-
-        # Get the geojson of those features for this task.
-        query = f'''SELECT jsonb_build_object(
-                    'type', 'FeatureCollection',
-                    'features', jsonb_agg(feature)
-                    )
-                    FROM (
-                    SELECT jsonb_build_object(
-                        'type', 'Feature',
-                        'id', id,
-                        'geometry', ST_AsGeoJSON(geometry)::jsonb,
-                        'properties', properties
-                    ) AS feature
-                    FROM features
-                    WHERE project_id={project_id} and task_id={task}
-                    ) features;'''
-
-
-        result = db.execute(query)
-        features = result.fetchone()[0]
-
-        xform = f"/tmp/{project_title}_{category}_{task}.xml"  # This file will store xml contents of an xls form.
-        extracts = f"/tmp/{project_title}_{category}_{task}.geojson"  # This file will store osm extracts
-
-        # Update outfile containing osm extracts with the new geojson contents containing title in the properties.
-        with open(extracts, "w") as jsonfile:
-            jsonfile.truncate(0)  # clear the contents of the file
-            dump(features, jsonfile)
-
-
-        outfile = central_crud.generate_updated_xform(
-            xlsform, xform, form_type)
-
-        # Create an odk xform
-        result = central_crud.create_odk_xform(
-            odk_id,
-            task, 
-            xform, 
-            odk_credentials, 
-            True, 
-            True, 
-            False
-        )
+                        SELECT id
+                        FROM features
+                        WHERE project_id={project_id} and ST_Intersects(geometry, '{task_obj.outline}'::Geometry)
+
+                        )'''
+
+            result = db.execute(query)
+
+            # Get the geojson of those features for this task.
+            query = f'''SELECT jsonb_build_object(
+                        'type', 'FeatureCollection',
+                        'features', jsonb_agg(feature)
+                        )
+                        FROM (
+                        SELECT jsonb_build_object(
+                            'type', 'Feature',
+                            'id', id,
+                            'geometry', ST_AsGeoJSON(geometry)::jsonb,
+                            'properties', properties
+                        ) AS feature
+                        FROM features
+                        WHERE project_id={project_id} and task_id={task}
+                        ) features;'''
+
+
+            result = db.execute(query)
+            features = result.fetchone()[0]
+
+            xform = ws.file(f"{project_title}_{category}_{task}.xml")  # This file will store xml contents of an xls form.
+            extracts = ws.file(f"{project_title}_{category}_{task}.geojson")  # This file will store osm extracts
+
+            # Update outfile containing osm extracts with the new geojson contents containing title in the properties.
+            with open(extracts, "w") as jsonfile:
+                jsonfile.truncate(0)  # clear the contents of the file
+                dump(features, jsonfile)
+
+
+            outfile = central_crud.generate_updated_xform(
+                xlsform, xform, form_type)
+
+            # Create an odk xform
+            result = central_crud.create_odk_xform(
+                odk_id,
+                task, 
+                xform, 
+                odk_credentials, 
+                True, 
+                True, 
+                False
+            )
 
     return True
 
@@ -2581,15 +2837,14 @@ async def get_project_tiles(db: Session,
         result = db.execute(query)
         features = result.fetchone()[0]
 
-        # Boundary
-        boundary_file = f"/tmp/{project_id}_boundary.geojson"
+        with workspace(f"tiles_{project_id}") as ws:
+            # Boundary
+            boundary_file = ws.file("boundary.geojson")
 
-        # Update outfile containing osm extracts with the new geojson contents containing title in the properties.
-        with open(boundary_file, "w") as jsonfile:
-            jsonfile.truncate(0)
-            dump(features, jsonfile)
+            with open(boundary_file, "w") as jsonfile:
+                dump(features, jsonfile)
 
-        basemap = basemapper.BaseMapper(boundary_file, base, source)
+            basemap = basemapper.BaseMapper(boundary_file, base, source)
         outf = basemapper.DataFile(outfile, basemap.getFormat())
         suffix = os.path.splitext(outfile)[1]
         if suffix == ".mbtiles":
@@ -27,6 +27,7 @@ from fastapi import (
     Depends,
     File,
     Form,
+    Header,
     HTTPException,
     UploadFile,
     Response,
@@ -40,12 +41,23 @@ from sqlalchemy.orm import Session
 
 import json
 
+from ..cache import cache
 from ..central import central_crud
 from ..db import database, db_models
+from ..db.postgis_utils import FULL_PRECISION, GeometryOptions, geometry_options
+from ..pagination.pagination import set_page_headers
+from ..responses.responses import (
+    FastJSONResponse,
+    fast_response,
+    make_etag,
+    not_modified,
+)
 from . import project_crud, project_schemas
 from ..tasks import tasks_crud
 from . import utils
-from ..models.enums import TILES_SOURCE
+from ..models.enums import TILES_SOURCE, ProjectStatus, TileLayer
+from ..tiles import tiles
+from ..workspace.workspace import job_log_path
 
 router = APIRouter(
     prefix="/projects",
@@ -55,61 +67,96 @@ router = APIRouter(
 )
 
 
-@router.get("/", response_model=List[project_schemas.ProjectOut])
+@router.get("/", response_model=List[project_schemas.ProjectSummary])
 async def read_projects(
+    response: Response,
     user_id: int = None,
     skip: int = 0,
     limit: int = 100,
+    cursor: str = None,
+    count: bool = False,
     db: Session = Depends(database.get_db),
 ):
     """
     Get a list of projects.
 
+    Only a summary of each project is returned, use /projects/{project_id}
+    to get a project with its tasks. The cursors of the next and previous
+    pages are returned in the X-Next-Cursor and X-Prev-Cursor headers.
+
     Args:
+        response (Response): The response, to add the page headers to.
         user_id (int, optional): The ID of the user to filter projects by. Defaults to None.
-        skip (int, optional): The number of projects to skip. Defaults to 0.
+        skip (int, optional): The number of projects to skip, when no cursor is given. Defaults to 0.
         limit (int, optional): The maximum number of projects to return. Defaults to 100.
+        cursor (str, optional): The cursor of the page to return. Defaults to None.
+        count (bool, optional): Whether to send an estimate of the total in X-Total-Count. Defaults to False.
         db (Session, optional): The database session. Injected by FastAPI.
 
     Returns:
-        List[project_schemas.ProjectOut]: A list of projects.
+        List[project_schemas.ProjectSummary]: A list of project summaries.
     """
-    projects = project_crud.get_projects(db, user_id, skip, limit)
-    return projects
+    page = project_crud.get_project_summaries(
+        db, user_id, skip, limit, cursor=cursor, count=count
+    )
+    set_page_headers(response, page)
+    return page.items
 
 
-@router.post("/near_me", response_model=project_schemas.ProjectSummary)
-def get_task(lat: float, long: float, user_id: int = None):
+@router.post("/near_me", response_model=List[project_schemas.ProjectNearby])
+def get_projects_near_me(
+    lat: float,
+    long: float,
+    limit: int = 10,
+    hashtags: str = None,
+    status: ProjectStatus = ProjectStatus.PUBLISHED,
+    db: Session = Depends(database.get_db),
+):
     """
-    Get a task near the specified location.
+    Get the projects nearest to the specified location.
 
     Args:
         lat (float): The latitude of the location.
         long (float): The longitude of the location.
-        user_id (int, optional): The ID of the user. Defaults to None.
+        limit (int, optional): The number of projects to return. Defaults to 10.
+        hashtags (str, optional): A comma-separated list of hashtags to filter projects by. Defaults to None.
+        status (ProjectStatus, optional): The status of the projects to return. Defaults to PUBLISHED.
+        db (Session, optional): The database session. Injected by FastAPI.
 
     Returns:
-        project_schemas.ProjectSummary: A summary of the project.
+        List[project_schemas.ProjectNearby]: The project summaries, nearest first, with their distance in meters.
     """
-    return "Coming..."
+    if hashtags:
+        hashtags = [tag for tag in hashtags.split(",") if tag.startswith("#")]
+
+    return project_crud.get_projects_near(db, lat, long, limit, hashtags, status)
 
 
 @router.get("/summaries", response_model=List[project_schemas.ProjectSummary])
 async def read_project_summaries(
+    response: Response,
     user_id: int = None,
     hashtags: str = None,
     skip: int = 0,
     limit: int = 100,
+    cursor: str = None,
+    count: bool = False,
     db: Session = Depends(database.get_db),
 ):
     """
     Get a list of project summaries.
 
+    The cursors of the next and previous pages are returned in the
+    X-Next-Cursor and X-Prev-Cursor headers.
+
     Args:
+        response (Response): The response, to add the page headers to.
         user_id (int, optional): The ID of the user to filter projects by. Defaults to None.
         hashtags (str, optional): A comma-separated list of hashtags to filter projects by. Defaults to None.
-        skip (int, optional): The number of projects to skip. Defaults to 0.
+        skip (int, optional): The number of projects to skip, when no cursor is given. Defaults to 0.
         limit (int, optional): The maximum number of projects to return. Defaults to 100.
+        cursor (str, optional): The cursor of the page to return. Defaults to None.
+        count (bool, optional): Whether to send an estimate of the total in X-Total-Count. Defaults to False.
         db (Session, optional): The database session. Injected by FastAPI.
 
     Returns:
@@ -119,17 +166,65 @@ async def read_project_summaries(
         hashtags = hashtags.split(',') # create list of hashtags
         hashtags = list(filter(lambda hashtag: hashtag.startswith('#'), hashtags))  # filter hashtags that do start with #
     
-    projects = project_crud.get_project_summaries(db, user_id, skip, limit, hashtags)
-    return projects
+    page = project_crud.get_project_summaries(
+        db, user_id, skip, limit, hashtags, cursor, count
+    )
+    set_page_headers(response, page)
+    return page.items
+
+
+@router.get("/search", response_model=List[project_schemas.ProjectSummary])
+async def search_projects(
+    search: str,
+    hashtags: str = None,
+    organisation_id: int = None,
+    skip: int = 0,
+    limit: int = 20,
+    db: Session = Depends(database.get_db),
+):
+    """
+    Search projects by name and description.
+
+    Each word is matched as a prefix, so "hosp kath" finds "Kathmandu
+    hospitals". Projects matching in their name come first.
+
+    Args:
+        search (str): The words to search for.
+        hashtags (str, optional): A comma-separated list of hashtags to filter projects by. Defaults to None.
+        organisation_id (int, optional): The ID of the organisation to filter projects by. Defaults to None.
+        skip (int, optional): The number of projects to skip. Defaults to 0.
+        limit (int, optional): The maximum number of projects to return. Defaults to 20.
+        db (Session, optional): The database session. Injected by FastAPI.
+
+    Returns:
+        List[project_schemas.ProjectSummary]: The matching project summaries, best matches first.
+    """
+    if hashtags:
+        hashtags = [tag for tag in hashtags.split(",") if tag.startswith("#")]
+
+    return project_crud.search_projects(
+        db, search, hashtags, organisation_id, skip, limit
+    )
 
 
 @router.get("/{project_id}", response_model=project_schemas.ProjectOut)
-async def read_project(project_id: int, db: Session = Depends(database.get_db)):
+async def read_project(
+    project_id: int,
+    if_none_match: Optional[str] = Header(None),
+    geometry: GeometryOptions = Depends(geometry_options()),
+    db: Session = Depends(database.get_db),
+):
     """
     Get a project by its ID.
 
+    The response has an ETag; send it back in If-None-Match to get a 304
+    while the project and its tasks are unchanged. Responses are cached
+    until the project or its tasks change.
+
     Args:
         project_id (int): The ID of the project.
+        if_none_match (str, optional): The ETag of the copy the client has.
+        geometry (GeometryOptions): The precision, simplify_tolerance and zoom query parameters. Outlines have 7 decimal places by default.
         db (Session, optional): The database session. Injected by FastAPI.
 
     Returns:
@@ -139,11 +234,23 @@ async def read_project(project_id: int, db: Session = Depends(database.get_db)):
         HTTPException: If the project is not found.
         
     """
-    project = project_crud.get_project_by_id(db, project_id)
-    if project:
-        return project
-    else:
-        raise HTTPException(status_code=404, detail="Project not found")
+    version = cache.get_versions(db, project_id).project
+    etag = make_etag("project", project_id, version, *geometry)
+    cached = not_modified(etag, if_none_match)
+    if cached:
+        return cached
+
+    def build():
+        project = project_crud.get_project_by_id(db, project_id, geometry)
+        if project:
+            return fast_response(
+                project_schemas.ProjectOut, project, headers={"ETag": etag}
+            )
+        else:
+            raise HTTPException(status_code=404, detail="Project not found")
+
+    key = ("project", project_id, version, *geometry)
+    return cache.response_cache.read_through(key, build)
 
 
 @router.delete("/delete/{project_id}")
@@ -739,21 +846,33 @@ async def update_project_form(
 def get_project_features(
     project_id: int,
     task_id: int = None,
+    geometry: GeometryOptions = Depends(geometry_options()),
     db: Session = Depends(database.get_db),
 ):
     """
     Get all the features of a project.
 
+    Responses are cached until the features of the project change.
+
     Args:
         project_id (int): The project's ID.
         task_id (int, optional): The task ID. Defaults to None.
+        geometry (GeometryOptions): The precision, simplify_tolerance and zoom query parameters. Geometries have 7 decimal places by default.
         db (Session, optional): The database session. Defaults to Depends(database.get_db).
 
     Returns:
         List[project_schemas.Feature]: A list of project features.
     """
-    features = project_crud.get_project_features(db, project_id, task_id)
-    return features
+    version = cache.get_versions(db, project_id).features
+
+    def build():
+        features = project_crud.get_project_features(
+            db, project_id, task_id, geometry
+        )
+        return fast_response(project_schemas.Feature, features)
+
+    key = ("features", project_id, version, task_id, *geometry)
+    return cache.response_cache.read_through(key, build)
 
 
 @router.get("/generate-log/")
@@ -789,7 +908,7 @@ async def generate_log(
             project_id, db
         )
 
-        with open(f"/tmp/{project_id}_generate.log", "r") as f:
+        with open(job_log_path(uuid), "r") as f:
             lines = f.readlines()
             last_100_lines = lines[-50:]
             logs = "".join(last_100_lines)
@@ -809,14 +928,16 @@ async def get_categories():
     """
     Get all the categories from osm_fieldwork.
 
+    They ship with osm_fieldwork, so they are read once per worker.
+
     Returns:
         A list of categories and their respective forms.
         
     """
-    categories = (
-        getChoices()
-    )  # categories are fetched from osm_fieldwork.make_data_extracts.getChoices()
-    return categories
+    # categories are fetched from osm_fieldwork.make_data_extracts.getChoices()
+    return cache.response_cache.read_through(
+        ("categories", "categories"), lambda: FastJSONResponse(getChoices())
+    )
 
 
 @router.post("/preview_tasks/")
@@ -1014,6 +1135,8 @@ async def download_template(category: str, db: Session = Depends(database.get_db
 @router.get("/{project_id}/download")
 async def download_project_boundary(
     project_id: int,
+    if_none_match: Optional[str] = Header(None),
+    geometry: GeometryOptions = Depends(geometry_options(FULL_PRECISION)),
     db: Session = Depends(database.get_db),
 ):
     """
@@ -1021,15 +1144,23 @@ async def download_project_boundary(
 
     Args:
         project_id (int): The id of the project.
+        if_none_match (str, optional): The ETag of the copy the client has.
+        geometry (GeometryOptions): The precision, simplify_tolerance and zoom query parameters. Full precision by default.
 
     Returns:
-        Response: The HTTP response object containing the downloaded file.
+        Response: The HTTP response object containing the downloaded file, or a 304 if the client copy is current.
     """
+    version = project_crud.get_project_version(db, project_id)
+    etag = make_etag("project_outline", project_id, version, *geometry)
+    cached = not_modified(etag, if_none_match)
+    if cached:
+        return cached
 
-    out = project_crud.get_project_geometry(db, project_id)
+    out = project_crud.get_project_geometry(db, project_id, geometry)
     headers = {
         "Content-Disposition": "attachment; filename=project_outline.geojson",
         "Content-Type": "application/media",
+        "ETag": etag,
     }
 
     return Response(content = out, headers=headers)
@@ -1038,6 +1169,8 @@ async def download_project_boundary(
 @router.get("/{project_id}/download_tasks")
 async def download_task_boundaries(
     project_id: int,
+    if_none_match: Optional[str] = Header(None),
+    geometry: GeometryOptions = Depends(geometry_options(FULL_PRECISION)),
     db: Session = Depends(database.get_db),
     ):
     """
@@ -1045,21 +1178,67 @@ async def download_task_boundaries(
 
     Args:
         project_id (int): The id of the project.
+        if_none_match (str, optional): The ETag of the copy the client has.
+        geometry (GeometryOptions): The precision, simplify_tolerance and zoom query parameters. Full precision by default.
 
     Returns:
-        Response: The HTTP response object containing the downloaded file.
+        Response: The HTTP response object containing the downloaded file, or a 304 if the client copy is current.
     """
+    version = project_crud.get_project_version(db, project_id)
+    etag = make_etag("task_outlines", project_id, version, *geometry)
+    cached = not_modified(etag, if_none_match)
+    if cached:
+        return cached
 
-    out = project_crud.get_task_geometry(db, project_id)
+    out = project_crud.get_task_geometry(db, project_id, geometry)
 
     headers = {
         "Content-Disposition": "attachment; filename=project_outline.geojson",
         "Content-Type": "application/media",
+        "ETag": etag,
     }
 
     return Response(content = out, headers=headers)
 
 
+@router.get("/{project_id}/tiles/{layer}/{z}/{x}/{y}.mvt")
+def get_vector_tile(
+    project_id: int,
+    layer: TileLayer,
+    z: int,
+    x: int,
+    y: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(database.get_db),
+):
+    """
+    Returns a Mapbox Vector Tile of the tasks, features or submissions of a project.
+
+    Args:
+        project_id (int): The id of the project.
+        layer (TileLayer): "tasks", "features" or "submissions".
+        z (int): The zoom level.
+        x (int): The column of the tile.
+        y (int): The row of the tile.
+        if_none_match (str, optional): The ETag of the copy the client has.
+
+    Returns:
+        Response: The tile, empty if nothing is in it, or a 304 if the client copy is current.
+    """
+    version = tiles.get_layer_version(db, layer, project_id)
+    etag = make_etag("tile", layer.value, project_id, version, z, x, y)
+    cached = not_modified(etag, if_none_match)
+    if cached:
+        return cached
+
+    tile = tiles.get_tile(db, layer, project_id, z, x, y, version)
+    return Response(
+        content=tile,
+        media_type="application/vnd.mapbox-vector-tile",
+        headers={"ETag": etag},
+    )
+
+
 @router.get("/tiles/{project_id}")
 async def get_project_tiles(
     background_tasks: BackgroundTasks,
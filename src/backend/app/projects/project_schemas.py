@@ -18,7 +18,6 @@
 
 from typing import List, Union
 
-from geojson_pydantic import Feature
 from pydantic import BaseModel
 
 from ..models.enums import ProjectPriority, ProjectStatus
@@ -115,6 +114,7 @@ class ProjectSummary(BaseModel):
         tasks_validated (int): Number of validated tasks.
         tasks_bad (int): Number of problematic tasks.
         hashtags (List[str]): List of project hashtags.
+        bbox (List[float]): Bounding box of the project outline, as [minx, miny, maxx, maxy].
 
     """
     id: int = -1
@@ -129,11 +129,23 @@ class ProjectSummary(BaseModel):
     tasks_validated: int = None
     tasks_bad: int = None
     hashtags: List[str] = None
+    bbox: List[float] = None
 
     class Config:
         orm_mode = True
 
 
+class ProjectNearby(ProjectSummary):
+    """
+    Summary of a project near a location.
+
+    Attributes:
+        distance (float): Distance from the location to the project centroid, in meters.
+
+    """
+    distance: float
+
+
 class ProjectBase(BaseModel):
     """
     Base structure of a project.
@@ -144,7 +156,7 @@ class ProjectBase(BaseModel):
         author (User): The author of the project.
         project_info (List[ProjectInfo]): List of project information.
         status (ProjectStatus): The status of the project.
-        outline_geojson (Feature): Outline geometry of the project.
+        outline_geojson (dict): GeoJSON Feature of the project outline, rendered by PostGIS.
         project_tasks (List[tasks_schemas.Task]): List of project tasks.
         xform_title (str): Title of the XForm.
         hashtags (List[str]): List of project hashtags.
@@ -156,7 +168,7 @@ class ProjectBase(BaseModel):
     project_info: List[ProjectInfo]
     status: ProjectStatus
     # location_str: str
-    outline_geojson: Feature = None
+    outline_geojson: dict = None
     project_tasks: List[tasks_schemas.Task] = None
     xform_title: str = None
     hashtags: List[str] = None
@@ -184,13 +196,13 @@ class Feature(BaseModel):
         id (int): The feature's ID.
         project_id (int): The project's ID.
         task_id (int, optional): The task's ID.
-        geometry (Feature): The feature's geometry.
+        geometry (dict): GeoJSON Feature of the feature's geometry, rendered by PostGIS.
 
     """
     id: int
     project_id: int
     task_id: int = None
-    geometry: Feature
+    geometry: dict
 
     class Config:
         orm_mode = True
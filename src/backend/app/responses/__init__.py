@@ -0,0 +1 @@
+"""Fast JSON responses."""
@@ -0,0 +1,224 @@
+# Copyright (c) 2022, 2023 Humanitarian OpenStreetMap Team
+#
+# This file is part of FMTM.
+#
+#     FMTM is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     FMTM is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with FMTM.  If not, see <https:#www.gnu.org/licenses/>.
+#
+"""Fast JSON responses for the large read endpoints.
+
+FastAPI validates what a route returns against its response_model, then walks
+the result again with jsonable_encoder before json.dumps. For a project with
+thousands of tasks that costs more than the query. A route can opt out by
+returning fast_response(model, result): the result is read into plain dicts
+shaped like the model, without validation, and encoded with orjson when it is
+installed. The route keeps its response_model, which is then only used for the
+OpenAPI schema.
+"""
+import hashlib
+import json
+from collections.abc import Mapping
+from datetime import date, datetime
+from enum import Enum
+from functools import lru_cache
+from inspect import isclass
+from typing import Any, Dict, Optional, Tuple, Type
+from uuid import UUID
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class RawJSON(Mapping):
+    """
+    A JSON document encoded by the database, spliced as is into a FastJSONResponse.
+
+    It is only decoded if something reads it as a mapping, such as the
+    validation of a response_model or jsonable_encoder.
+    """
+
+    __slots__ = ("text", "_value")
+
+    def __init__(self, text: str):
+        self.text = text
+        self._value = None
+
+    def _decoded(self) -> dict:
+        if self._value is None:
+            self._value = json.loads(self.text)
+        return self._value
+
+    def __getitem__(self, key):
+        return self._decoded()[key]
+
+    def __iter__(self):
+        return iter(self._decoded())
+
+    def __len__(self):
+        return len(self._decoded())
+
+
+@lru_cache(maxsize=None)
+def model_fields(model: Type[BaseModel]) -> Tuple[Tuple[str, Any, Any], ...]:
+    """
+    Get the fields of a model, with their nested model if they have one.
+
+    Args:
+        model (Type[BaseModel]): The response model.
+
+    Returns:
+        tuple: (name, default, nested model or None) for each field.
+    """
+    fields = []
+    for name, field in model.__fields__.items():
+        nested = field.type_
+        if not (isclass(nested) and issubclass(nested, BaseModel)):
+            nested = None
+        fields.append((name, field.default, nested))
+    return tuple(fields)
+
+
+def to_dict(model: Type[BaseModel], obj: Any) -> Dict[str, Any]:
+    """
+    Read an object into a dict shaped like a model, without validating it.
+
+    Args:
+        model (Type[BaseModel]): The response model.
+        obj (Any): A database object, or anything with the model's fields as attributes.
+
+    Returns:
+        dict: The fields of the model, read from the object.
+    """
+    if obj is None:
+        return None
+
+    values = {}
+    for name, default, nested in model_fields(model):
+        value = getattr(obj, name, default)
+        if nested is not None and value is not None:
+            if isinstance(value, (list, tuple)):
+                value = [to_dict(nested, item) for item in value]
+            else:
+                value = to_dict(nested, value)
+        values[name] = value
+    return values
+
+
+def default(obj: Any) -> Any:
+    """
+    Encode the values orjson, or json when orjson is missing, does not handle natively.
+
+    Args:
+        obj (Any): The value to encode.
+
+    Raises:
+        TypeError: If the value cannot be encoded.
+
+    Returns:
+        Any: A value orjson can encode.
+    """
+    if isinstance(obj, RawJSON):
+        if orjson is None:
+            return obj._decoded()
+        return orjson.Fragment(obj.text)
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    """A JSON response encoded with orjson, falling back to json."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        """
+        Encode the content of the response.
+
+        Args:
+            content (Any): The content of the response.
+
+        Returns:
+            bytes: The JSON document.
+        """
+        if orjson is None:
+            return json.dumps(
+                content, default=default, ensure_ascii=False, separators=(",", ":")
+            ).encode("utf-8")
+        return orjson.dumps(content, default=default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def fast_response(model: Type[BaseModel], content: Any, **kwargs) -> FastJSONResponse:
+    """
+    Build a response from an object or a list of objects, shaped like a model.
+
+    Args:
+        model (Type[BaseModel]): The response model, or the model of the list items.
+        content (Any): The object, or list of objects, to return.
+        **kwargs: Passed on to FastJSONResponse, such as status_code or headers.
+
+    Returns:
+        FastJSONResponse: The encoded response.
+    """
+    if isinstance(content, (list, tuple)):
+        content = [to_dict(model, item) for item in content]
+    else:
+        content = to_dict(model, content)
+    return FastJSONResponse(content, **kwargs)
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Build a strong ETag from the values a response depends on.
+
+    Args:
+        *parts (Any): The values, such as the endpoint, the project version and the query parameters.
+
+    Returns:
+        str: The quoted ETag.
+    """
+    key = "\x1f".join(str(part) for part in parts)
+    return f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+
+def not_modified(etag: str, if_none_match: Optional[str]) -> Optional[Response]:
+    """
+    Answer a conditional GET whose If-None-Match header matches the ETag.
+
+    Args:
+        etag (str): The current ETag of the resource.
+        if_none_match (str, optional): The If-None-Match header of the request.
+
+    Returns:
+        Response: A 304 response if the client copy is current, otherwise None.
+    """
+    if not if_none_match:
+        return None
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in tags or etag in (tag.removeprefix("W/") for tag in tags):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
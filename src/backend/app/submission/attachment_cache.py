@@ -0,0 +1,208 @@
+# Copyright (c) 2022, 2023 Humanitarian OpenStreetMap Team
+#
+# This file is part of FMTM.
+#
+#     FMTM is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     FMTM is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with FMTM.  If not, see <https:#www.gnu.org/licenses/>.
+#
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from fastapi.logger import logger as logger
+
+from ..config import settings
+
+MANIFEST = "manifest.json"
+# Submissions used more recently than this, in seconds, are never evicted, as
+# a download in another worker process may still be reading them
+EVICT_MIN_AGE = 10 * 60
+
+
+class AttachmentCache:
+    """Submission attachments stored on disk between downloads.
+
+    Attachments are kept under one directory per submission, keyed by the
+    Central server, form and instance ID. A manifest records the attachments
+    of the submission as of its last update, so unchanged submissions are
+    served without asking Central again. Once the cache grows past its size
+    limit, the least recently used submissions are evicted. Submissions a
+    download is still reading are pinned and left alone.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pins_lock = threading.Lock()
+        self._pinned = Counter()
+
+    def entry(self, form_url: str, instance_id: str) -> Path:
+        """
+        Get the directory holding the attachments of a submission.
+
+        Args:
+            form_url (str): The API URL of the form on the Central server.
+            instance_id (str): The instance ID of the submission.
+
+        Returns:
+            Path: The directory, which may not exist yet.
+        """
+        key = hashlib.sha1(f"{form_url}/{instance_id}".encode()).hexdigest()
+        return self.root / key[:2] / key
+
+    def pin(self, entry: Path):
+        """
+        Keep a submission from being evicted until it is unpinned.
+
+        Pin the entry before looking it up, so the paths returned by get stay
+        valid while they are read.
+
+        Args:
+            entry (Path): The directory of the submission.
+        """
+        with self._pins_lock:
+            self._pinned[entry] += 1
+
+    def unpin(self, entry: Path):
+        """
+        Release a pin taken with pin.
+
+        Args:
+            entry (Path): The directory of the submission.
+        """
+        with self._pins_lock:
+            self._pinned[entry] -= 1
+            if self._pinned[entry] <= 0:
+                del self._pinned[entry]
+
+    def get(self, entry: Path, version: str):
+        """
+        Look up the attachments of a submission.
+
+        Args:
+            entry (Path): The directory of the submission.
+            version (str): When the submission was last updated.
+
+        Returns:
+            list: The paths of the attachments, or None if they are not
+                cached or the submission changed since they were.
+        """
+        try:
+            manifest = json.loads((entry / MANIFEST).read_text())
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != version:
+            return None
+
+        paths = [entry / name for name in manifest["attachments"]]
+        if not all(path.is_file() for path in paths):
+            return None
+        # Mark the submission as recently used
+        os.utime(entry / MANIFEST)
+        return paths
+
+    def put(self, entry: Path, name: str, chunks) -> Path:
+        """
+        Store one attachment of a submission.
+
+        Args:
+            entry (Path): The directory of the submission.
+            name (str): The file name of the attachment.
+            chunks (Iterable[bytes]): The content of the attachment.
+
+        Returns:
+            Path: The path of the stored attachment.
+        """
+        entry.mkdir(parents=True, exist_ok=True)
+        path = entry / Path(name).name
+        # Write next to the target, so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=entry, prefix=".")
+        try:
+            with os.fdopen(fd, "wb") as dest:
+                for chunk in chunks:
+                    dest.write(chunk)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return path
+
+    def commit(self, entry: Path, version: str, names: list):
+        """
+        Record the complete set of attachments of a submission.
+
+        Args:
+            entry (Path): The directory of the submission.
+            version (str): When the submission was last updated.
+            names (list): The file names of the attachments.
+        """
+        entry.mkdir(parents=True, exist_ok=True)
+        manifest = {"version": version, "attachments": [Path(n).name for n in names]}
+        fd, tmp = tempfile.mkstemp(dir=entry, prefix=".")
+        with os.fdopen(fd, "w") as dest:
+            json.dump(manifest, dest)
+        os.replace(tmp, entry / MANIFEST)
+
+    def evict(self):
+        """Remove the least recently used submissions until under the size limit."""
+        if not self._lock.acquire(blocking=False):
+            # Another download is already evicting
+            return
+        try:
+            entries = []
+            total = 0
+            for shard in self.root.glob("*"):
+                for entry in shard.glob("*"):
+                    size = sum(f.stat().st_size for f in entry.iterdir() if f.is_file())
+                    try:
+                        used = (entry / MANIFEST).stat().st_mtime
+                    except OSError:
+                        # Still being written
+                        continue
+                    entries.append((used, size, entry))
+                    total += size
+
+            cutoff = time.time() - EVICT_MIN_AGE
+            for used, size, entry in sorted(entries):
+                if total <= self.max_bytes or used > cutoff:
+                    break
+                # Hold the pins while deleting, so the entry cannot be pinned
+                # and read half way through
+                with self._pins_lock:
+                    if entry in self._pinned:
+                        continue
+                    try:
+                        for f in entry.iterdir():
+                            f.unlink(missing_ok=True)
+                        entry.rmdir()
+                    except OSError:
+                        # Written to again while evicting, keep it
+                        continue
+                total -= size
+                logger.debug(f"Evicted cached attachments {entry.name}")
+        except OSError as e:
+            logger.warning(f"Could not evict cached attachments: {e}")
+        finally:
+            self._lock.release()
+
+
+attachment_cache = AttachmentCache(
+    settings.ATTACHMENT_CACHE_DIR, settings.ATTACHMENT_CACHE_MB * 1024 * 1024
+)
@@ -16,29 +16,75 @@
 #     along with FMTM.  If not, see <https:#www.gnu.org/licenses/>.
 #
 
-import os
-import zipfile
+import asyncio
 import concurrent.futures
-import logging
+import tempfile
 import threading
-import csv
-import io
-import os
+import uuid
 import zipfile
 import json
-from datetime import datetime
-import logging
+import re
+import requests
+from requests.adapters import HTTPAdapter
+from collections import deque
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional
 from fastapi import HTTPException, Response
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
+from sqlalchemy.sql import literal_column, text
 
 from ..central.central_crud import get_odk_form, get_odk_project
+from ..config import settings
+from ..db import database, db_models
 from ..tasks import tasks_crud
+from .attachment_cache import attachment_cache
 from ..projects import project_crud, project_schemas
+from ..models.enums import BackgroundTaskStatus
+from . import submission_schemas
+from osgeo import ogr, osr
+from osm_fieldwork.CSVDump import CSVDump
 from osm_fieldwork.json2osm import JsonDump
+from shapely import force_2d
+from shapely.geometry import LineString, Point, Polygon, shape
 from pathlib import Path
+from urllib.parse import quote
+from xml.sax.saxutils import quoteattr
 from fastapi.logger import logger as logger
 
+# Number of submissions requested per OData page
+SUBMISSION_PAGE_SIZE = 1000
+# Number of task archives downloaded from ODK Central at the same time
+SUBMISSION_DOWNLOAD_WORKERS = 4
+# Number of submissions whose attachments are fetched at the same time
+ATTACHMENT_DOWNLOAD_WORKERS = 4
+# Size of the reads when copying submission archives
+ZIP_STREAM_CHUNK_SIZE = 64 * 1024
+# Task archives larger than this spill from memory to a temporary file
+SUBMISSION_SPOOL_SIZE = 32 * 1024 * 1024
+# Advisory lock held by the one worker running the scheduled submission sync
+SUBMISSION_SYNC_LOCK = 7264001
+# Distance in meters a submission may be from the feature it updates
+CONFLATION_TOLERANCE = 10
+METERS_PER_DEGREE = 111320
+# Number of review state updates sent to ODK Central at the same time
+REVIEW_WORKERS = 8
+# Number of review state updates between progress reports
+REVIEW_BATCH_SIZE = 100
+# Export formats, as the GDAL driver, file extension and layer options
+EXPORT_FORMATS = {
+    "fgb": ("FlatGeobuf", ".fgb", ["SPATIAL_INDEX=YES"]),
+    "gpkg": ("GPKG", ".gpkg", ["SPATIAL_INDEX=YES"]),
+    "parquet": ("Parquet", ".parquet", ["COMPRESSION=ZSTD"]),
+}
+# GeoJSON geometries the geo question types are returned as
+GEOMETRY_TYPES = ("Point", "LineString", "Polygon")
+# One "lat lon altitude accuracy" point of a value, altitude and accuracy optional
+ODK_POINT_PATTERN = re.compile(r"-?\d+(\.\d+)?(\s+-?\d+(\.\d+)?){1,3}")
+
 
 def get_submission_of_project(db: Session, project_id: int, task_id: int = None):
     """
@@ -174,129 +220,309 @@ def create_zip_file(files, output_file_path):
     return output_file_path
 
 
-async def convert_json_to_osm_xml(file_path):
+def iter_form_submissions(
+    xform, odkid: int, xml_form_id: str, since: datetime = None
+):
     """
-    Converts a JSON file to an OSM XML file.
+    Iterates over the submissions of a form, one OData page at a time.
 
     Args:
-        file_path (str): The path to the JSON file to be converted.
-
-    Returns:
-        str: The path to the created OSM XML file.
+        xform (OdkForm): An ODK form object with the project credentials.
+        odkid (int): The ID of the ODK project.
+        xml_form_id (str): The XML form ID of the task.
+        since (datetime, optional): Only return submissions received or
+            edited after this UTC time. Defaults to None.
+
+    Yields:
+        dict: The JSON of each submission.
     """
+    url = f"{xform.base}projects/{odkid}/forms/{xml_form_id}.svc/Submissions"
+    skip = 0
+    while True:
+        params = {"$top": SUBMISSION_PAGE_SIZE, "$skip": skip}
+        if since:
+            timestamp = since.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
+            params["$filter"] = (
+                f"__system/submissionDate gt {timestamp}Z"
+                f" or __system/updatedAt gt {timestamp}Z"
+            )
+        response = xform.session.get(
+            url, params=params, auth=xform.auth, verify=xform.verify
+        )
+        if response.status_code == 404:
+            logger.error(f"Submissions for {odkid}, Form {xml_form_id} doesn't exist")
+            return
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=502,
+                detail=f"ODK Central returned {response.status_code} "
+                f"for the submissions of form {xml_form_id}",
+            )
+        page = response.json().get("value", [])
+        yield from page
+        if len(page) < SUBMISSION_PAGE_SIZE:
+            return
+        skip += SUBMISSION_PAGE_SIZE
+
+
+def count_form_submissions(xform, odkid: int, xml_form_id: str) -> int:
+    """
+    Counts the submissions of a form in ODK Central, without listing them.
 
-    jsonin = JsonDump()
-    infile = Path(file_path)
+    Args:
+        xform (OdkForm): An ODK form object with the project credentials.
+        odkid (int): The ID of the ODK project.
+        xml_form_id (str): The XML form ID of the task.
 
-    base = os.path.splitext(infile.name)[0]
+    Returns:
+        int: The number of submissions, 0 if the form does not exist.
+    """
+    url = f"{xform.base}projects/{odkid}/forms/{xml_form_id}.svc/Submissions"
+    response = xform.session.get(
+        url,
+        params={"$top": 0, "$count": "true"},
+        auth=xform.auth,
+        verify=xform.verify,
+    )
+    if response.status_code == 404:
+        return 0
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=502,
+            detail=f"ODK Central returned {response.status_code} "
+            f"for the submissions of form {xml_form_id}",
+        )
+    return response.json().get("@odata.count", 0)
 
-    osmoutfile = f"/tmp/{base}.osm"
-    jsonin.createOSM(osmoutfile)
 
-    data = jsonin.parse(infile.as_posix())
+def iter_project_submissions(xform, odkid: int, xml_form_ids: list):
+    """
+    Iterates over the submissions of several forms of a project.
 
-    for entry in data:
-        feature = jsonin.createEntry(entry)
-        # Sometimes bad entries, usually from debugging XForm design, sneak in
-        if len(feature) == 0:
-            continue
-        if len(feature) > 0:
-            if "lat" not in feature["attrs"]:
-                if 'geometry' in feature['tags']:
-                    if type(feature['tags']['geometry']) == str:
-                        coords = list(feature['tags']['geometry'])
-                    else:
-                        coords = feature['tags']['geometry']['coordinates']
-                    feature['attrs'] = {'lat': coords[1], 'lon': coords[0]}
-                else:
-                    logger.warning("Bad record! %r" % feature)
-                    continue
-            jsonin.writeOSM(feature)
+    Args:
+        xform (OdkForm): An ODK form object with the project credentials.
+        odkid (int): The ID of the ODK project.
+        xml_form_ids (list): The XML form IDs of the tasks.
 
-    jsonin.finishOSM()
-    logger.info("Wrote OSM XML file: %r" % osmoutfile)
-    return osmoutfile
+    Yields:
+        dict: The JSON of each submission.
+    """
+    for xml_form_id in xml_form_ids:
+        yield from iter_form_submissions(xform, odkid, xml_form_id)
 
 
-async def convert_json_to_osm(file_path):
+def get_submission_stream(db: Session, project_id: int, task_id: int = None):
     """
-    Converts a JSON file to an OSM XML file and a GeoJSON file.
+    Looks up a project and returns a lazy stream of its submissions.
 
     Args:
-        file_path (str): The path to the JSON file to be converted.
+        db (Session): A database session.
+        project_id (int): The ID of the project.
+        task_id (int, optional): The ID of the task. If provided, only submissions for this task are streamed. Defaults to None.
 
     Returns:
-        Tuple[str, str]: A tuple containing the paths to the created OSM XML and GeoJSON files.
+        Tuple[DbProject, Iterator[dict]]: The project and its submissions.
     """
+    project_info = project_crud.get_project(db, project_id)
 
-    jsonin = JsonDump()
-    infile = Path(file_path)
+    # Return exception if project is not found
+    if not project_info:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    project_name = project_info.project_name_prefix
+    form_category = project_info.xform_title
+
+    # ODK Credentials
+    odk_credentials = project_schemas.ODKCentral(
+        odk_central_url=project_info.odk_central_url,
+        odk_central_user=project_info.odk_central_user,
+        odk_central_password=project_info.odk_central_password,
+    )
+
+    # Get ODK Form with odk credentials from the project.
+    xform = get_odk_form(odk_credentials)
 
-    base = os.path.splitext(infile.name)[0]
+    task_ids = [task_id] if task_id else tasks_crud.get_task_lists(db, project_id)
+    xml_form_ids = [
+        f"{project_name}_{form_category}_{id}".split("_")[2] for id in task_ids
+    ]
+    return project_info, iter_project_submissions(
+        xform, project_info.odkid, xml_form_ids
+    )
 
-    osmoutfile = f"/tmp/{base}.osm"
-    jsonin.createOSM(osmoutfile)
 
-    jsonoutfile = f"/tmp/{base}.geojson"
-    jsonin.createGeoJson(jsonoutfile)
+def submission_to_feature(jsonin: JsonDump, submission: dict):
+    """
+    Converts a submission to an OSM feature.
 
-    data = jsonin.parse(infile.as_posix())
+    Args:
+        jsonin (JsonDump): The converter holding the OSM tag mappings.
+        submission (dict): The JSON of the submission from ODK Central.
 
-    for entry in data:
+    Returns:
+        dict: A feature with "attrs", "tags" and optionally "private" entries,
+            or None if the submission has no location.
+    """
+    for entry in jsonin.parse(data=[submission]):
         feature = jsonin.createEntry(entry)
         # Sometimes bad entries, usually from debugging XForm design, sneak in
         if len(feature) == 0:
             continue
-        if len(feature) > 0:
-            if "lat" not in feature["attrs"]:
-                if 'geometry' in feature['tags']:
-                    if type(feature['tags']['geometry']) == str:
-                        coords = list(feature['tags']['geometry'])
-                        # del feature['tags']['geometry']
-                    else:
-                        coords = feature['tags']['geometry']['coordinates']
-                        # del feature['tags']['geometry']
-                    feature['attrs'] = {'lat': coords[1], 'lon': coords[0]}
-                else:
-                    logger.warning("Bad record! %r" % feature)
-                    continue
-            jsonin.writeOSM(feature)
-            jsonin.writeGeoJson(feature)
+        attrs = feature["attrs"]
+        if attrs.get("lat") is None or attrs.get("lon") is None:
+            geometry = feature["tags"].get("geometry")
+            if isinstance(geometry, str):
+                # ODK geopoints are "lat lon altitude accuracy"
+                coords = geometry.split(" ")
+                attrs["lat"], attrs["lon"] = coords[0], coords[1]
+            elif isinstance(geometry, dict):
+                coords = geometry["coordinates"]
+                attrs["lat"], attrs["lon"] = coords[1], coords[0]
+            else:
+                logger.warning("Bad record! %r" % feature)
+                continue
+        feature["tags"].pop("geometry", None)
+        return feature
+    return None
+
+
+def iter_submission_features(submissions):
+    """
+    Converts submissions to OSM features one at a time.
 
-    jsonin.finishOSM()
-    jsonin.finishGeoJson()
-    logger.info("Wrote OSM XML file: %r" % osmoutfile)
-    logger.info("Wrote GeoJson file: %r" % jsonoutfile)
-    return osmoutfile, jsonoutfile
+    Args:
+        submissions (Iterable[dict]): The JSON of the submissions from ODK Central.
 
+    Yields:
+        dict: A feature with "attrs", "tags" and optionally "private" entries.
+    """
+    jsonin = JsonDump()
 
-async def convert_to_osm_for_task(odk_id: int, form_id: int, xform: any):
+    for submission in submissions:
+        feature = submission_to_feature(jsonin, submission)
+        if feature:
+            yield feature
+
+
+def osm_xml_node(feature: dict, osm_id: int):
     """
-    Converts submission data from ODK Central to OSM XML and GeoJSON files.
+    Creates the OSM XML element of a feature.
 
     Args:
-        odk_id (int): The ID of the ODK project.
-        form_id (int): The ID of the ODK form.
-        xform (any): An instance of an ODK form object.
+        feature (dict): A feature created by iter_submission_features.
+        osm_id (int): The ID to use when the feature has none.
 
     Returns:
-        Tuple[str, str]: A tuple containing the paths to the created OSM XML and GeoJSON files.
+        str: The <node> element, with escaped attribute values.
+    """
+    tags = feature["tags"]
+    attrs = {
+        "action": "modify",
+        "id": feature["attrs"].get("id", tags.get("id", osm_id)),
+        "version": int(feature["attrs"].get("version", 0)) + 1,
+        "lat": feature["attrs"]["lat"],
+        "lon": feature["attrs"]["lon"],
+        "timestamp": datetime.now().strftime("%Y-%m-%dT%TZ"),
+    }
+    for key in ("uid", "user"):
+        value = feature["attrs"].get(key, tags.get(key))
+        if value is not None:
+            attrs[key] = value
+
+    line = " ".join(f"{key}={quoteattr(str(value))}" for key, value in attrs.items())
+    osm = f"  <node {line}>\n"
+    for key, value in tags.items():
+        if not value or key in attrs:
+            continue
+        osm += f"    <tag k={quoteattr(str(key))} v={quoteattr(str(value))}/>\n"
+    osm += '    <tag k="note" v="Do not upload this without validation!"/>\n'
+    osm += "  </node>\n"
+    return osm
+
+
+def geojson_feature(feature: dict):
+    """
+    Creates the GeoJSON of a feature.
+
+    Args:
+        feature (dict): A feature created by iter_submission_features.
+
+    Returns:
+        str: The GeoJSON Feature as a JSON string.
+    """
+    properties = {**feature["tags"], **feature.get("private", {})}
+    geometry = {
+        "type": "Point",
+        "coordinates": [float(feature["attrs"]["lon"]), float(feature["attrs"]["lat"])],
+    }
+    return json.dumps(
+        {"type": "Feature", "geometry": geometry, "properties": properties},
+        default=str,
+    )
+
+
+def stream_osm_xml(features):
     """
+    Writes features as an OSM XML document.
 
-    # This file stores the submission data.
-    file_path = f"/tmp/{odk_id}_{form_id}.json"
+    The document is always closed exactly once, after the last feature.
 
-    # Get the submission data from ODK Central
-    file = xform.getSubmissions(odk_id, form_id, None, False, True)
+    Args:
+        features (Iterable[dict]): Features created by iter_submission_features.
 
-    if file is None:
-        return None, None
+    Yields:
+        str: Parts of the OSM XML document.
+    """
+    yield "<?xml version='1.0' encoding='UTF-8'?>\n"
+    yield '<osm version="0.6" generator="osm-fieldwork 0.3">\n'
+    for osm_id, feature in enumerate(features, start=1):
+        yield osm_xml_node(feature, -osm_id)
+    yield "</osm>\n"
 
-    with open(file_path, "wb") as f:
-        f.write(file)
 
-    osmoutfile, jsonoutfile = await convert_json_to_osm(file_path)
-    return osmoutfile, jsonoutfile
+def stream_osm_zip(features, base: str):
+    """
+    Writes features to a zip of an OSM XML and a GeoJSON file.
+
+    The GeoJSON is collected in a spooled buffer while the OSM XML streams
+    out, so the features are only produced once.
+
+    Args:
+        features (Iterable[dict]): Features created by iter_submission_features.
+        base (str): The name of the files in the zip, without extension.
+
+    Yields:
+        bytes: Chunks of the zip file.
+    """
+    buffer = ZipStreamBuffer()
+    with zipfile.ZipFile(
+        buffer, mode="w", compression=zipfile.ZIP_DEFLATED, allowZip64=True
+    ) as final_zip, tempfile.SpooledTemporaryFile(
+        max_size=SUBMISSION_SPOOL_SIZE, mode="w+"
+    ) as geojson:
+
+        def tee(features):
+            for feature in features:
+                separator = ",\n" if geojson.tell() else "\n"
+                geojson.write(separator + geojson_feature(feature))
+                yield feature
+
+        with final_zip.open(f"{base}.osm", mode="w", force_zip64=True) as dest:
+            for part in stream_osm_xml(tee(features)):
+                dest.write(part.encode())
+                if data := buffer.drain():
+                    yield data
+
+        geojson.seek(0)
+        with final_zip.open(f"{base}.geojson", mode="w", force_zip64=True) as dest:
+            dest.write(b'{"type": "FeatureCollection", "features": [')
+            while chunk := geojson.read(ZIP_STREAM_CHUNK_SIZE):
+                dest.write(chunk.encode())
+                if data := buffer.drain():
+                    yield data
+            dest.write(b"\n]}\n")
+
+    yield buffer.drain()
 
 
 async def convert_to_osm(db: Session, project_id: int, task_id: int):
@@ -309,9 +535,323 @@ async def convert_to_osm(db: Session, project_id: int, task_id: int):
         task_id (int): The ID of the task.
 
     Returns:
-        FileResponse: A FileResponse object containing the ZIP file with the converted OSM XML and GeoJSON files.
+        StreamingResponse: The ZIP file with the converted OSM XML and GeoJSON files, streamed as submissions are converted.
+    """
+    project_info, submissions = get_submission_stream(db, project_id, task_id)
+
+    base = f"{project_info.project_name_prefix}_{project_info.xform_title}"
+    features = iter_submission_features(submissions)
+
+    headers = {"Content-Disposition": f"attachment; filename={base}_osm.zip"}
+    return StreamingResponse(
+        stream_osm_zip(features, base), media_type="application/zip", headers=headers
+    )
+
+
+def parse_odk_geometry(value):
+    """
+    Parses the value of a geopoint, geotrace or geoshape question.
+
+    Args:
+        value (Union[dict, str]): A GeoJSON geometry, as returned by the OData
+            API, or an ODK string of "lat lon altitude accuracy" points
+            separated by ";".
+
+    Returns:
+        BaseGeometry: The 2D geometry, or None if the value is not a location.
+    """
+    if isinstance(value, dict):
+        if value.get("type") not in GEOMETRY_TYPES or not value.get("coordinates"):
+            return None
+        try:
+            return force_2d(shape(value))
+        except Exception:
+            return None
+
+    if not isinstance(value, str):
+        return None
+    points = []
+    for point in value.strip().strip(";").split(";"):
+        point = point.strip()
+        if not ODK_POINT_PATTERN.fullmatch(point):
+            return None
+        lat, lon = point.split()[:2]
+        points.append((float(lon), float(lat)))
+    try:
+        if len(points) == 1:
+            return Point(points[0])
+        if len(points) >= 4 and points[0] == points[-1]:
+            return Polygon(points)
+        return LineString(points)
+    except ValueError:
+        return None
+
+
+def submission_geometry(submission: dict):
+    """
+    Finds the location of a submission in its geo questions.
+
+    Groups are searched in form order and the last location found wins, like
+    JsonDump does. A GPS warmup point is only used when nothing else is found.
+
+    Args:
+        submission (dict): The JSON of the submission from ODK Central.
+
+    Returns:
+        BaseGeometry: The location, or None if the submission has none.
+    """
+    found = []
+
+    def walk(data: dict):
+        for key, value in data.items():
+            if key.startswith("__"):
+                continue
+            geometry = parse_odk_geometry(value)
+            if geometry is not None:
+                found.append((key, geometry))
+            elif isinstance(value, dict):
+                walk(value)
+
+    walk(submission)
+    located = [geometry for key, geometry in found if "warmup" not in key.lower()]
+    if located:
+        return located[-1]
+    return found[-1][1] if found else None
+
+
+def flatten_submission(submission: dict, prefix: str = ""):
+    """
+    Flattens the answers of a submission into a single level.
+
+    Keys of grouped questions are joined with "-", as in the CSV export of
+    ODK Central. Geo answers are left out, they are stored as the geometry.
+
+    Args:
+        submission (dict): The JSON of the submission from ODK Central.
+        prefix (str, optional): The key of the enclosing group. Defaults to "".
+
+    Returns:
+        dict: The answers, with lists stored as JSON strings.
+    """
+    flat = {}
+    for key, value in submission.items():
+        if key.startswith("__") or parse_odk_geometry(value) is not None:
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_submission(value, f"{name}-"))
+        elif isinstance(value, list):
+            flat[name] = json.dumps(value)
+        else:
+            flat[name] = value
+    return flat
+
+
+def parse_odata_timestamp(value: str) -> Optional[datetime]:
+    """
+    Parses a timestamp of the OData API, as naive UTC like the other timestamps.
+
+    Args:
+        value (str): The timestamp, such as "2023-06-01T10:00:00.000Z".
+
+    Returns:
+        datetime: The timestamp, or None if there is none.
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def submission_row(
+    jsonin: JsonDump, project_id: int, task_id: int, xml_form_id: str, submission: dict
+):
+    """
+    Creates the submissions table row of a submission.
+
+    Args:
+        jsonin (JsonDump): The converter holding the OSM tag mappings.
+        project_id (int): The ID of the project.
+        task_id (int): The ID of the task the submission was made for.
+        xml_form_id (str): The XML form ID of the task.
+        submission (dict): The JSON of the submission from ODK Central.
+
+    Returns:
+        dict: The column values of the row.
+    """
+    system = submission.get("__system", {})
+    submitted_at = parse_odata_timestamp(system.get("submissionDate"))
+
+    feature = submission_to_feature(jsonin, submission)
+    geometry = submission_geometry(submission)
+    if geometry is None and feature:
+        geometry = Point(float(feature["attrs"]["lon"]), float(feature["attrs"]["lat"]))
+
+    return {
+        "id": submission["__id"],
+        "project_id": project_id,
+        "task_id": task_id,
+        "xml_form_id": xml_form_id,
+        "submitted_by": system.get("submitterName"),
+        "submitted_at": submitted_at,
+        "review_state": system.get("reviewState"),
+        "properties": feature["tags"] if feature else {},
+        "data": flatten_submission(submission),
+        "geometry": f"SRID=4326;{geometry.wkt}" if geometry is not None else None,
+    }
+
+
+def upsert_submissions(db: Session, rows: list):
+    """
+    Inserts submissions, replacing the ones already stored.
+
+    Args:
+        db (Session): A database session.
+        rows (list): Rows created by submission_row.
+
+    Returns:
+        int: The number of submissions that were not stored yet.
+    """
+    if not rows:
+        return 0
+    stmt = insert(db_models.DbSubmission).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["id"],
+        set_={key: stmt.excluded[key] for key in rows[0] if key != "id"},
+    )
+    # xmax is only zero for rows the statement inserted
+    stmt = stmt.returning(literal_column("xmax = 0"))
+    return sum(1 for (inserted,) in db.execute(stmt) if inserted)
+
+
+def sync_task_submissions(
+    db: Session,
+    xform,
+    jsonin: JsonDump,
+    odkid: int,
+    project_id: int,
+    task_id: int,
+    xml_form_id: str,
+    full: bool = False,
+):
+    """
+    Copies the submissions of a task to the submissions table.
+
+    Args:
+        db (Session): A database session.
+        xform (OdkForm): An ODK form object with the project credentials.
+        jsonin (JsonDump): The converter holding the OSM tag mappings.
+        odkid (int): The ID of the ODK project.
+        project_id (int): The ID of the project.
+        task_id (int): The ID of the task.
+        xml_form_id (str): The XML form ID of the task.
+        full (bool, optional): Fetch every submission instead of only the
+            ones received or edited since the last sync. Defaults to False.
+
+    Returns:
+        int: The number of new submissions.
     """
+    # A manual sync may run at the same time as the scheduled one
+    db.execute(
+        insert(db_models.DbSubmissionSync)
+        .values(
+            task_id=task_id,
+            project_id=project_id,
+            xml_form_id=xml_form_id,
+            submission_count=0,
+        )
+        .on_conflict_do_nothing()
+    )
+    sync = db.query(db_models.DbSubmissionSync).get((task_id, project_id))
+
+    since = None if full else sync.last_submission_at
+    latest = sync.last_submission_at
+    inserted = 0
+    # Keyed by ID, as pages can overlap when submissions arrive while paging
+    rows = {}
+
+    def flush():
+        nonlocal inserted
+        inserted += upsert_submissions(db, list(rows.values()))
+        rows.clear()
+
+    for submission in iter_form_submissions(xform, odkid, xml_form_id, since):
+        row = submission_row(jsonin, project_id, task_id, xml_form_id, submission)
+        # Edits keep the submissionDate but bump updatedAt, so both move the mark
+        updated_at = parse_odata_timestamp(
+            submission.get("__system", {}).get("updatedAt")
+        )
+        for changed_at in (row["submitted_at"], updated_at):
+            if changed_at and (latest is None or changed_at > latest):
+                latest = changed_at
+        rows[row["id"]] = row
+        if len(rows) >= SUBMISSION_PAGE_SIZE:
+            flush()
+    flush()
+
+    if full:
+        sync.submission_count = (
+            db.query(db_models.DbSubmission)
+            .filter_by(project_id=project_id, task_id=task_id)
+            .count()
+        )
+    else:
+        sync.submission_count += inserted
+    sync.last_submission_at = latest
+    sync.last_synced_at = datetime.utcnow()
+    sync.status = BackgroundTaskStatus.SUCCESS
+    sync.message = None
+    return inserted
 
+
+def record_sync_failure(
+    db: Session, project_id: int, task_id: int, xml_form_id: str, message: str
+):
+    """
+    Records that the submissions of a task could not be synced.
+
+    Args:
+        db (Session): A database session.
+        project_id (int): The ID of the project.
+        task_id (int): The ID of the task.
+        xml_form_id (str): The XML form ID of the task.
+        message (str): The error.
+    """
+    values = {"status": BackgroundTaskStatus.FAILED, "message": message}
+    db.execute(
+        insert(db_models.DbSubmissionSync)
+        .values(
+            task_id=task_id,
+            project_id=project_id,
+            xml_form_id=xml_form_id,
+            submission_count=0,
+            **values,
+        )
+        .on_conflict_do_update(
+            index_elements=["task_id", "project_id"], set_=values
+        )
+    )
+
+
+def sync_project_submissions(
+    db: Session, project_id: int, task_id: int = None, full: bool = True
+):
+    """
+    Copies the submissions of a project from ODK Central to the submissions table.
+
+    Each task is synced in its own savepoint. A task that fails is rolled back
+    and marked as failed in submission_sync, and the other tasks still sync.
+
+    Args:
+        db (Session): A database session.
+        project_id (int): The ID of the project.
+        task_id (int, optional): Only sync the submissions of this task. Defaults to None.
+        full (bool, optional): Fetch every submission instead of only the
+            ones received or edited since the last sync. Defaults to True.
+
+    Returns:
+        int: The number of new submissions.
+    """
     project_info = project_crud.get_project(db, project_id)
 
     # Return exception if project is not found
@@ -329,60 +869,801 @@ async def convert_to_osm(db: Session, project_id: int, task_id: int):
         odk_central_password=project_info.odk_central_password,
     )
 
-    # Get ODK Form with odk credentials from the project.
     xform = get_odk_form(odk_credentials)
+    jsonin = JsonDump()
+
+    task_ids = [task_id] if task_id else tasks_crud.get_task_lists(db, project_id)
+    count = 0
+    for task_id in task_ids:
+        xml_form_id = f"{project_name}_{form_category}_{task_id}".split("_")[2]
+        try:
+            with db.begin_nested():
+                count += sync_task_submissions(
+                    db, xform, jsonin, odkid, project_id, task_id, xml_form_id, full
+                )
+        except Exception as e:
+            logger.error(
+                f"Could not sync submissions for task {task_id} "
+                f"of project {project_id}: {e}"
+            )
+            message = e.detail if isinstance(e, HTTPException) else str(e)
+            record_sync_failure(db, project_id, task_id, xml_form_id, message)
+
+    db.commit()
+    logger.info(f"Synced {count} new submissions for project {project_id}")
+    return count
+
+
+def sync_all_projects():
+    """
+    Pulls the new submissions of every project linked to ODK Central.
+
+    Returns:
+        int: The number of new submissions.
+    """
+    db = database.SessionLocal()
+    count = 0
+    try:
+        project_ids = [
+            project_id
+            for (project_id,) in db.query(db_models.DbProject.id).filter(
+                db_models.DbProject.odkid.isnot(None)
+            )
+        ]
+        for project_id in project_ids:
+            try:
+                count += sync_project_submissions(db, project_id, full=False)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Could not sync submissions for project {project_id}: {e}")
+    finally:
+        db.close()
+    return count
+
+
+def lead_submission_sync(conn=None):
+    """
+    Takes, or checks this worker still holds, the submission sync lock.
+
+    The lock is a session level advisory lock, held by one connection for as
+    long as the worker runs. Only the worker holding it syncs, so the other
+    workers do not pull the same submissions again. If the leader exits or
+    loses its connection, the lock is released and another worker takes over.
+
+    Args:
+        conn (Connection, optional): The connection holding the lock, if this
+            worker leads already. Defaults to None.
+
+    Returns:
+        Connection: The connection holding the lock, or None if another
+            worker leads.
+    """
+    if conn is not None:
+        try:
+            conn.execute(text("SELECT 1"))
+            return conn
+        except Exception:
+            # The connection dropped, and the lock with it
+            conn.invalidate()
+            conn.close()
+
+    conn = database.engine.connect()
+    locked = conn.execute(
+        text("SELECT pg_try_advisory_lock(:key)"), {"key": SUBMISSION_SYNC_LOCK}
+    ).scalar()
+    if locked:
+        logger.info("Leading the scheduled submission sync")
+        return conn
+    conn.close()
+    return None
+
+
+def release_submission_sync(conn):
+    """
+    Releases the lock taken by lead_submission_sync.
+
+    Args:
+        conn (Connection): The connection holding the lock.
+    """
+    try:
+        conn.execute(
+            text("SELECT pg_advisory_unlock(:key)"), {"key": SUBMISSION_SYNC_LOCK}
+        )
+    finally:
+        conn.close()
+
 
-    # Create a new ZIP file for the extracted files
-    final_zip_file_path = f"/tmp/{project_name}_{form_category}_osm.zip"
+async def sync_submissions_forever():
+    """Pulls new submissions every SUBMISSION_SYNC_INTERVAL seconds, in one worker."""
+    leader = None
+    try:
+        while True:
+            await asyncio.sleep(settings.SUBMISSION_SYNC_INTERVAL)
+            try:
+                leader = await run_in_threadpool(lead_submission_sync, leader)
+                if leader is None:
+                    continue
+                await run_in_threadpool(sync_all_projects)
+            except Exception as e:
+                logger.error(f"Submission sync failed: {e}")
+    finally:
+        if leader is not None:
+            await run_in_threadpool(release_submission_sync, leader)
 
-    # Remove the ZIP file if it already exists
-    if os.path.exists(final_zip_file_path):
-        os.remove(final_zip_file_path)
 
-    # Submission JSON
+@lru_cache(maxsize=None)
+def conflation_ignored_tags() -> tuple:
+    """Gets the ODK metadata tags conflation does not compare, lowercased."""
+    return tuple(sorted({key.lower() for key in CSVDump().ignore}))
+
+
+def conflate_submissions(
+    db: Session,
+    project_id: int,
+    after: str = None,
+    limit: int = 1000,
+    tolerance: float = CONFLATION_TOLERANCE,
+):
+    """
+    Conflates the stored submissions of a project against its data extract.
+
+    Each submission is matched to the feature it falls inside, or else to the
+    nearest feature within the tolerance, and its tags are compared with the
+    tags of that feature. ODK metadata such as start, end, deviceid and
+    instanceID is not an OSM tag, so it is left out of the comparison.
+    Distances are measured on the spheroid, after a bounding box search that
+    uses the spatial index of features.
+
+    Args:
+        db (Session): A database session.
+        project_id (int): The ID of the project.
+        after (str, optional): Only return submissions with an ID after this one. Defaults to None.
+        limit (int, optional): The maximum number of submissions to return. Defaults to 1000.
+        tolerance (float, optional): The match distance in meters. Defaults to CONFLATION_TOLERANCE.
+
+    Returns:
+        dict: A GeoJSON FeatureCollection. Each feature has a status of "new",
+            "modified" or "duplicate", the submitted tags, the changed tags with
+            their old and new values, and "next" holds the ID to pass as after
+            for the next page.
+    """
+    query = text(
+        f"""
+        WITH page AS (
+            SELECT id, task_id, properties, geometry,
+                -- The tolerance in degrees of longitude at the latitude of
+                -- the submission, an upper bound for the bounding box search
+                :tolerance / (:meters_per_degree * GREATEST(
+                    cos(radians(GREATEST(abs(ST_YMin(geometry)), abs(ST_YMax(geometry))))),
+                    0.01
+                )) AS reach
+            FROM submissions
+            WHERE project_id = :project_id
+            AND geometry IS NOT NULL
+            {"AND id > :after" if after else ""}
+            ORDER BY id
+            LIMIT :limit
+        )
+        SELECT jsonb_build_object(
+            'type', 'Feature',
+            'id', page.id,
+            'geometry', ST_AsGeoJSON(COALESCE(match.geometry, page.geometry))::jsonb,
+            'properties', jsonb_build_object(
+                'submission_id', page.id,
+                'task_id', page.task_id,
+                'feature_id', match.id,
+                'osm_id', match.properties->'osm_id',
+                'status', CASE
+                    WHEN match.id IS NULL THEN 'new'
+                    WHEN match.changes = '{{}}'::jsonb THEN 'duplicate'
+                    ELSE 'modified'
+                END,
+                'tags', page.properties,
+                'changes', match.changes
+            )
+        )
+        FROM page
+        LEFT JOIN LATERAL (
+            SELECT f.id, f.properties, f.geometry,
+                COALESCE((
+                    SELECT jsonb_object_agg(
+                        tag.key,
+                        jsonb_build_object('old', f.properties->tag.key, 'new', tag.value)
+                    )
+                    FROM jsonb_each(page.properties) AS tag
+                    WHERE f.properties->tag.key IS DISTINCT FROM tag.value
+                    AND lower(tag.key) <> ALL(:ignored)
+                ), '{{}}'::jsonb) AS changes
+            FROM features f
+            WHERE f.project_id = :project_id
+            AND f.geometry && ST_Expand(page.geometry, page.reach)
+            AND ST_DWithin(f.geometry::geography, page.geometry::geography, :tolerance)
+            ORDER BY ST_Intersects(f.geometry, page.geometry) DESC,
+                f.geometry::geography <-> page.geometry::geography
+            LIMIT 1
+        ) match ON true
+        ORDER BY page.id
+        """
+    )
+    result = db.execute(
+        query,
+        {
+            "project_id": project_id,
+            "after": after,
+            "limit": limit,
+            "tolerance": tolerance,
+            "meters_per_degree": METERS_PER_DEGREE,
+            "ignored": list(conflation_ignored_tags()),
+        },
+    )
+    features = [row[0] for row in result]
+
+    return {
+        "type": "FeatureCollection",
+        "features": features,
+        "next": features[-1]["id"] if len(features) == limit else None,
+    }
+
+
+def utc_naive(value: datetime):
+    """Converts a datetime to naive UTC, as timestamps are stored."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def select_review_submissions(
+    db: Session, project_id: int, update: submission_schemas.ReviewStateUpdate
+):
+    """
+    Finds the submissions a review state update applies to.
+
+    Submissions already in the requested state are left out, so running an
+    interrupted update again only sends what is left.
+
+    Args:
+        db (Session): A database session.
+        project_id (int): The ID of the project.
+        update (ReviewStateUpdate): The review state and the filter.
+
+    Returns:
+        list: The ID and XML form ID of each submission.
+    """
+    filters = [
+        "project_id = :project_id",
+        "review_state IS DISTINCT FROM :review_state",
+    ]
+    params = {
+        "project_id": project_id,
+        "review_state": update.review_state.value,
+    }
+    if update.task_id:
+        filters.append("task_id = :task_id")
+        params["task_id"] = update.task_id
+    if update.submitted_after:
+        filters.append("submitted_at >= :submitted_after")
+        params["submitted_after"] = utc_naive(update.submitted_after)
+    if update.submitted_before:
+        filters.append("submitted_at < :submitted_before")
+        params["submitted_before"] = utc_naive(update.submitted_before)
+
+    result = db.execute(
+        text(
+            f"""SELECT id, xml_form_id FROM submissions
+            WHERE {" AND ".join(filters)}
+            ORDER BY id"""
+        ),
+        params,
+    )
+    submissions = result.fetchall()
+
+    if update.conflation:
+        matching = set()
+        after = None
+        while True:
+            page = conflate_submissions(
+                db,
+                project_id,
+                after,
+                tolerance=update.tolerance or CONFLATION_TOLERANCE,
+            )
+            matching.update(
+                feature["id"]
+                for feature in page["features"]
+                if feature["properties"]["status"] == update.conflation.value
+            )
+            after = page["next"]
+            if not after:
+                break
+        submissions = [s for s in submissions if s.id in matching]
+
+    return submissions
+
+
+def update_review_states(
+    db: Session,
+    project_id: int,
+    update: submission_schemas.ReviewStateUpdate,
+    background_task_id: uuid.UUID,
+):
+    """
+    Sets the review state of the submissions matching a filter in ODK Central.
+
+    Runs as a background task. Updates are sent by REVIEW_WORKERS threads
+    sharing one connection pool, and the submissions table and the task
+    progress are updated after every REVIEW_BATCH_SIZE of them.
+
+    Args:
+        db (Session): A database session.
+        project_id (int): The ID of the project.
+        update (ReviewStateUpdate): The review state and the filter.
+        background_task_id (uuid.UUID): The ID of the background task.
+    """
+    try:
+        project_info = project_crud.get_project(db, project_id)
+
+        # ODK Credentials
+        odk_credentials = project_schemas.ODKCentral(
+            odk_central_url=project_info.odk_central_url,
+            odk_central_user=project_info.odk_central_user,
+            odk_central_password=project_info.odk_central_password,
+        )
+        xform = get_odk_form(odk_credentials)
+        # Keep a connection open for each worker
+        xform.session.mount(
+            xform.base, HTTPAdapter(pool_connections=1, pool_maxsize=REVIEW_WORKERS)
+        )
+
+        submissions = select_review_submissions(db, project_id, update)
+        total = len(submissions)
+        review_state = update.review_state.value
+        logger.info(f"Setting {total} submissions to {review_state}")
+
+        def send(submission):
+            url = (
+                f"{xform.base}projects/{project_info.odkid}/forms/"
+                f"{submission.xml_form_id}/submissions/{quote(submission.id)}"
+            )
+            response = xform.session.patch(
+                url,
+                json={"reviewState": review_state},
+                auth=xform.auth,
+                verify=xform.verify,
+            )
+            response.raise_for_status()
+            return submission.id
+
+        done = []
+        updated = failed = 0
+
+        def record():
+            nonlocal updated
+            if done:
+                db.query(db_models.DbSubmission).filter(
+                    db_models.DbSubmission.id.in_(done)
+                ).update(
+                    {db_models.DbSubmission.review_state: review_state},
+                    synchronize_session=False,
+                )
+                updated += len(done)
+                done.clear()
+            project_crud.update_background_task_status_in_database(
+                db,
+                background_task_id,
+                BackgroundTaskStatus.PENDING.value,
+                f"{updated} of {total} submissions updated, {failed} failed",
+            )
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=REVIEW_WORKERS
+        ) as executor:
+            futures = [executor.submit(send, s) for s in submissions]
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    done.append(future.result())
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Could not update review state: {e}")
+                if len(done) >= REVIEW_BATCH_SIZE:
+                    record()
+        record()
+
+        if failed:
+            project_crud.update_background_task_status_in_database(
+                db,
+                background_task_id,
+                BackgroundTaskStatus.FAILED.value,
+                f"{failed} of {total} submissions could not be updated, "
+                "send the same update again to retry them",
+            )
+        else:
+            project_crud.update_background_task_status_in_database(
+                db,
+                background_task_id,
+                BackgroundTaskStatus.SUCCESS.value,
+                f"{total} submissions updated",
+            )
+
+    except Exception as e:
+        logger.error(f"Review state update failed: {e}")
+        db.rollback()
+        project_crud.update_background_task_status_in_database(
+            db, background_task_id, BackgroundTaskStatus.FAILED.value, str(e)
+        )
+
+
+def export_submissions(
+    db: Session,
+    project_id: int,
+    export_format: str,
+    outfile: str,
+    task_id: int = None,
+):
+    """
+    Writes the stored submissions of a project to a GIS file.
+
+    Rows are read through a server-side cursor and written as they arrive,
+    with one column per question of the XForm.
+
+    Args:
+        db (Session): A database session.
+        project_id (int): The ID of the project.
+        export_format (str): One of the keys of EXPORT_FORMATS.
+        outfile (str): The path of the file to write, without extension.
+        task_id (int, optional): The ID of the task. If provided, only submissions for this task are exported. Defaults to None.
+
+    Returns:
+        str: The path of the written file.
+    """
+    driver_name, extension, options = EXPORT_FORMATS[export_format]
+    driver = ogr.GetDriverByName(driver_name)
+    if driver is None:
+        raise HTTPException(
+            status_code=501,
+            detail=f"{export_format} export is not supported by this server",
+        )
+
+    filters = "project_id = :project_id"
+    params = {"project_id": project_id}
     if task_id:
-        submission = xform.getSubmissions(odkid, task_id, None, False, True)
-        submission = (json.loads(submission))['value']
-    else:
-        submission = await get_all_submissions(db, project_id)
+        filters += " AND task_id = :task_id"
+        params["task_id"] = task_id
+
+    columns = sorted(
+        row[0]
+        for row in db.execute(
+            text(
+                f"""SELECT DISTINCT jsonb_object_keys(data)
+                FROM submissions WHERE {filters}"""
+            ),
+            params,
+        )
+    )
+
+    outfile = f"{outfile}{extension}"
+    dataset = driver.CreateDataSource(outfile)
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    layer = dataset.CreateLayer("submissions", srs, ogr.wkbUnknown, options)
+
+    layer.CreateField(ogr.FieldDefn("instance_id", ogr.OFTString))
+    layer.CreateField(ogr.FieldDefn("task_id", ogr.OFTInteger))
+    layer.CreateField(ogr.FieldDefn("submitted_by", ogr.OFTString))
+    layer.CreateField(ogr.FieldDefn("submitted_at", ogr.OFTDateTime))
+    layer.CreateField(ogr.FieldDefn("review_state", ogr.OFTString))
+    for column in columns:
+        layer.CreateField(ogr.FieldDefn(column, ogr.OFTString))
+    definition = layer.GetLayerDefn()
+
+    result = db.execute(
+        text(
+            f"""SELECT id, task_id, submitted_by, submitted_at, review_state, data,
+                ST_AsBinary(geometry) AS geometry
+            FROM submissions WHERE {filters}
+            ORDER BY id"""
+        ).execution_options(stream_results=True),
+        params,
+    )
+
+    layer.StartTransaction()
+    for rows in result.partitions(SUBMISSION_PAGE_SIZE):
+        for row in rows:
+            feature = ogr.Feature(definition)
+            feature.SetField("instance_id", row.id)
+            if row.task_id is not None:
+                feature.SetField("task_id", row.task_id)
+            feature.SetField("submitted_by", row.submitted_by)
+            if row.submitted_at:
+                feature.SetField("submitted_at", row.submitted_at.isoformat())
+            feature.SetField("review_state", row.review_state)
+            for key, value in (row.data or {}).items():
+                if value is not None:
+                    feature.SetField(key, str(value))
+            if row.geometry:
+                feature.SetGeometry(ogr.CreateGeometryFromWkb(bytes(row.geometry)))
+            layer.CreateFeature(feature)
+        layer.CommitTransaction()
+        layer.StartTransaction()
+    layer.CommitTransaction()
+
+    # Closing the dataset writes the spatial index
+    dataset = None
+    return outfile
+
+
+def stream_file_zip(path: str):
+    """
+    Compresses a file into a zip as it is streamed.
+
+    Args:
+        path (str): The file to compress.
+
+    Yields:
+        bytes: Chunks of the zip file.
+    """
+    buffer = ZipStreamBuffer()
+    with zipfile.ZipFile(
+        buffer, mode="w", compression=zipfile.ZIP_DEFLATED, allowZip64=True
+    ) as final_zip, open(path, "rb") as src:
+        with final_zip.open(Path(path).name, mode="w", force_zip64=True) as dest:
+            while chunk := src.read(ZIP_STREAM_CHUNK_SIZE):
+                dest.write(chunk)
+                if data := buffer.drain():
+                    yield data
+    yield buffer.drain()
+
+
+def fetch_submission_attachments(
+    xform, form_url: str, submission: dict, entry: Path
+):
+    """
+    Gets the attachments of a submission, from the cache when possible.
+
+    Args:
+        xform (OdkForm): An ODK form object with the project credentials.
+        form_url (str): The API URL of the form.
+        submission (dict): The submission, as listed by the Central API.
+        entry (Path): The attachment cache entry of the submission, pinned
+            by the caller.
+
+    Returns:
+        list: The paths of the cached attachments.
+    """
+    instance_id = submission["instanceId"]
+    version = submission.get("updatedAt") or submission.get("createdAt")
+    paths = attachment_cache.get(entry, version)
+    if paths is not None:
+        return paths
+
+    url = f"{form_url}/submissions/{quote(instance_id)}/attachments"
+    response = xform.session.get(url, auth=xform.auth, verify=xform.verify)
+    response.raise_for_status()
+    names = [a["name"] for a in response.json() if a.get("exists")]
+
+    paths = []
+    for name in names:
+        with xform.session.get(
+            f"{url}/{quote(name)}", auth=xform.auth, verify=xform.verify, stream=True
+        ) as media:
+            media.raise_for_status()
+            paths.append(
+                attachment_cache.put(
+                    entry, name, media.iter_content(chunk_size=ZIP_STREAM_CHUNK_SIZE)
+                )
+            )
+    attachment_cache.commit(entry, version, names)
+    return paths
+
+
+def fetch_submission_media(
+    xform, odkid: int, xml_form_id: str, stop: threading.Event = None
+):
+    """
+    Builds the submissions.csv.zip archive of a form into a spooled buffer.
+
+    Only the CSV is downloaded from Central as an archive. The attachments
+    are added from the attachment cache, and only those of submissions that
+    are new or were edited since the last download are fetched, at most
+    ATTACHMENT_DOWNLOAD_WORKERS submissions at a time. The archive
+    stays in memory up to SUBMISSION_SPOOL_SIZE and only spills to a
+    temporary file beyond that.
+
+    Args:
+        xform (OdkForm): An ODK form object with the project credentials.
+        odkid (int): The ID of the ODK project.
+        xml_form_id (str): The XML form ID of the task.
+        stop (threading.Event, optional): Set to abandon the download. Defaults to None.
+
+    Returns:
+        SpooledTemporaryFile: The archive, rewound to the start.
+
+    Raises:
+        CancelledError: If stop was set before the archive was complete.
+    """
 
-    if not submission:
-        raise HTTPException(status_code=404, detail="Submission not found")
+    def check_stop():
+        if stop is not None and stop.is_set():
+            raise concurrent.futures.CancelledError()
+
+    form_url = f"{xform.base}projects/{odkid}/forms/{xml_form_id}"
+    spool = tempfile.SpooledTemporaryFile(max_size=SUBMISSION_SPOOL_SIZE)
+    try:
+        with xform.session.get(
+            f"{form_url}/submissions.csv.zip",
+            params={"attachments": "false"},
+            auth=xform.auth,
+            verify=xform.verify,
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=ZIP_STREAM_CHUNK_SIZE):
+                check_stop()
+                spool.write(chunk)
+
+        response = xform.session.get(
+            f"{form_url}/submissions", auth=xform.auth, verify=xform.verify
+        )
+        response.raise_for_status()
+
+        submissions = response.json()
+        entries = [
+            attachment_cache.entry(form_url, s["instanceId"]) for s in submissions
+        ]
+        for entry in entries:
+            attachment_cache.pin(entry)
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=ATTACHMENT_DOWNLOAD_WORKERS
+        )
+        try:
+            added = set()
+            with zipfile.ZipFile(spool, mode="a", allowZip64=True) as archive:
+                attachments = executor.map(
+                    lambda submission, entry: fetch_submission_attachments(
+                        xform, form_url, submission, entry
+                    ),
+                    submissions,
+                    entries,
+                )
+                for paths in attachments:
+                    check_stop()
+                    for path in paths:
+                        # Central stores all attachments of a form in one folder
+                        if path.name not in added:
+                            archive.write(path, f"media/{path.name}")
+                            added.add(path.name)
+        finally:
+            # Only waits for the submissions being fetched, not the queued ones
+            executor.shutdown(wait=True, cancel_futures=True)
+            for entry in entries:
+                attachment_cache.unpin(entry)
+        attachment_cache.evict()
+    except BaseException:
+        spool.close()
+        raise
+
+    spool.seek(0)
+    return spool
+
+
+class ZipStreamBuffer:
+    """A write-only file object collecting the bytes zipfile produces.
+
+    zipfile falls back to data descriptors when the target is not seekable,
+    so the archive can be handed to the client as soon as each part is written.
+    """
 
-    # JSON FILE PATH
-    jsoninfile = "/tmp/json_infile.json"
+    def __init__(self):
+        self._chunks = []
 
-    # Write the submission to a file
-    with open(jsoninfile, 'w') as f:
-        f.write(json.dumps(submission))
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
 
-    # Convert the submission to osm xml format
-    osmoutfile, jsonoutfile = await convert_json_to_osm(jsoninfile)
+    def flush(self):
+        pass
 
-    if osmoutfile and jsonoutfile:
+    def drain(self):
+        """Returns and clears everything written so far."""
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
 
-        #FIXME: Need to fix this when generating osm file
 
-        # Remove the extra closing </osm> tag from the end of the file
-        with open(osmoutfile, 'r') as f:
-            osmoutfile_data = f.read()
-            # Find the last index of the closing </osm> tag
-            last_osm_index = osmoutfile_data.rfind('</osm>')
-            # Remove the extra closing </osm> tag from the end
-            processed_xml_string = osmoutfile_data[:last_osm_index] + osmoutfile_data[last_osm_index + len('</osm>'):]
+def stream_submission_archives(xform, odkid: int, archives: dict):
+    """
+    Merges the per-task submission archives into a single streamed zip.
 
-        # Write the modified XML data back to the file
-        with open(osmoutfile, 'w') as f:
-            f.write(processed_xml_string)
+    Archives are downloaded concurrently, at most SUBMISSION_DOWNLOAD_WORKERS at
+    a time, and their entries are copied into the output zip in task order
+    without being extracted to disk. A task whose archive cannot be downloaded
+    gets an ERROR.txt entry instead, and is listed in a top-level ERRORS.txt,
+    so a partial download is never mistaken for a complete one.
 
+    Args:
+        xform (OdkForm): An ODK form object with the project credentials.
+        odkid (int): The ID of the ODK project.
+        archives (dict): Maps the XML form ID of each task to the folder name
+            its entries are stored under in the output zip.
 
-        # Add the files to the ZIP file
-        with zipfile.ZipFile(final_zip_file_path, mode="a") as final_zip_file:
-            final_zip_file.write(osmoutfile)
-            final_zip_file.write(jsonoutfile)
+    Yields:
+        bytes: Chunks of the merged zip file.
+    """
+    buffer = ZipStreamBuffer()
+    pending = deque()
+    failed = []
+    queue = iter(archives.items())
+    # Set when the client goes away, so the downloads still running stop early
+    stop = threading.Event()
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=SUBMISSION_DOWNLOAD_WORKERS
+    )
 
-    return FileResponse(final_zip_file_path)
+    def submit_next():
+        for xml_form_id, folder in queue:
+            future = executor.submit(
+                fetch_submission_media, xform, odkid, xml_form_id, stop
+            )
+            pending.append((folder, future))
+            return
+
+    try:
+        for _ in range(SUBMISSION_DOWNLOAD_WORKERS):
+            submit_next()
+
+        with zipfile.ZipFile(buffer, mode="w", allowZip64=True) as final_zip:
+            while pending:
+                folder, future = pending.popleft()
+                submit_next()
+                try:
+                    spool = future.result()
+                except Exception as e:
+                    # Record the failure in the archive itself, the response
+                    # status was already sent with the first chunk
+                    logger.error(f"Error downloading submissions for {folder}: {e}")
+                    final_zip.writestr(
+                        f"{folder}/ERROR.txt",
+                        f"The submissions of this task could not be downloaded: {e}\n",
+                    )
+                    failed.append(folder)
+                    yield buffer.drain()
+                    continue
 
+                with spool, zipfile.ZipFile(spool, "r") as task_zip:
+                    for info in task_zip.infolist():
+                        if info.is_dir():
+                            continue
+                        entry = zipfile.ZipInfo(
+                            f"{folder}/{info.filename}", date_time=info.date_time
+                        )
+                        entry.compress_type = info.compress_type
+                        with task_zip.open(info) as src, final_zip.open(
+                            entry, mode="w", force_zip64=True
+                        ) as dest:
+                            while chunk := src.read(ZIP_STREAM_CHUNK_SIZE):
+                                dest.write(chunk)
+                                if data := buffer.drain():
+                                    yield data
+                        if data := buffer.drain():
+                            yield data
+                logger.info(f"Streamed submissions for {folder}")
+
+            if failed:
+                final_zip.writestr(
+                    "ERRORS.txt",
+                    "The submissions of these tasks could not be downloaded:\n"
+                    + "".join(f"{folder}\n" for folder in failed),
+                )
+
+        # Central directory, written when the output zip is closed
+        yield buffer.drain()
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        # Archives downloaded but never streamed
+        for _, future in pending:
+            if not future.cancelled() and future.exception() is None:
+                future.result().close()
 
 
 def download_submission_for_project(db, project_id):
@@ -394,10 +1675,9 @@ def download_submission_for_project(db, project_id):
         project_id (int): The ID of the project.
 
     Returns:
-        None
+        StreamingResponse: The merged zip of all task submissions, streamed as
+            the task archives are downloaded from ODK Central.
     """
-    print('Download submission for a project')
-
     project_info = project_crud.get_project(db, project_id)
 
     # Return empty list if project is not found
@@ -419,78 +1699,22 @@ def download_submission_for_project(db, project_id):
     # Get ODK Form with odk credentials from the project.
     xform = get_odk_form(odk_credentials)
 
-    def download_submission_for_task(task_id):
-        """
-        Downloads submission data for a task.
-
-        Args:
-            task_id (int): The ID of the task.
-
-        Returns:
-            str: The path to the downloaded ZIP file containing the submission data.
-        """
-
-        logging.info(f"Thread {threading.current_thread().name} - Downloading submission for Task ID {task_id}")
-        xml_form_id = f"{project_name}_{form_category}_{task_id}".split("_")[2]
-        file = xform.getSubmissionMedia(odkid, xml_form_id)
-        file_path = f"{project_name}_{form_category}_submission_{task_id}.zip"
-        with open(file_path, "wb") as f:
-            f.write(file.content)
-        return file_path
-
-    def extract_files(zip_file_path):
-        """
-        Extracts files from a ZIP file.
-
-        Args:
-            zip_file_path (str): The path to the ZIP file to extract files from.
-
-        Returns:
-            List[str]: A list of paths to the extracted files.
-        """
-        logging.info(f"Thread {threading.current_thread().name} - Extracting files from {zip_file_path}")
-        with zipfile.ZipFile(zip_file_path, "r") as zip_file:
-            extract_dir = os.path.splitext(zip_file_path)[0]
-            zip_file.extractall(extract_dir)
-            return [os.path.join(extract_dir, f) for f in zip_file.namelist()]
-
-    # Set up logging configuration
-    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(threadName)s] %(message)s")
-
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        task_list = [x.id for x in project_tasks]
-
-        # Download submissions using thread pool
-        futures = {executor.submit(download_submission_for_task, task_id): task_id for task_id in task_list}
-
-        files = []
-        for future in concurrent.futures.as_completed(futures):
-            task_id = futures[future]
-            try:
-                file_path = future.result()
-                files.append(file_path)
-                logging.info(f"Thread {threading.current_thread().name} - Task {task_id} - Download completed.")
-            except Exception as e:
-                logging.error(f"Thread {threading.current_thread().name} - Error occurred while downloading submission for task {task_id}: {e}")
-
-        # Extract files using thread pool
-        extracted_files = []
-        futures = {executor.submit(extract_files, file_path): file_path for file_path in files}
-        for future in concurrent.futures.as_completed(futures):
-            file_path = futures[future]
-            try:
-                extracted_files.extend(future.result())
-                logging.info(f"Thread {threading.current_thread().name} - Extracted files from {file_path}")
-            except Exception as e:
-                logging.error(f"Thread {threading.current_thread().name} - Error occurred while extracting files from {file_path}: {e}")
-
-    # Create a new ZIP file for the extracted files
-    final_zip_file_path = f"{project_name}_{form_category}_submissions_final.zip"
-    with zipfile.ZipFile(final_zip_file_path, mode="w") as final_zip_file:
-        for file_path in extracted_files:
-            final_zip_file.write(file_path)
-
-    return final_zip_file_path
+    # XML Form Id is a combination or project_name, category and task_id
+    archives = {
+        f"{project_name}_{form_category}_{task.id}".split("_")[2]:
+            f"{project_name}_{form_category}_submission_{task.id}"
+        for task in project_tasks
+    }
+
+    headers = {
+        "Content-Disposition": "attachment; filename="
+        f"{project_name}_{form_category}_submissions_final.zip"
+    }
+    return StreamingResponse(
+        stream_submission_archives(xform, odkid, archives),
+        media_type="application/zip",
+        headers=headers,
+    )
 
 
 def get_all_submissions(db: Session, project_id):
@@ -582,7 +1806,7 @@ def download_submission(db: Session, project_id: int, task_id: int, export_json:
         export_json (bool): If True, the submission data is exported as a JSON file. If False, the submission data is exported as a ZIP file.
 
     Returns:
-        Union[FileResponse, Response]: A FileResponse object containing the downloaded submission data as a ZIP or JSON file.
+        Union[StreamingResponse, Response]: The submission data as a streamed ZIP file or a JSON file.
     """
 
     project_info = project_crud.get_project(db, project_id)
@@ -606,59 +1830,31 @@ def download_submission(db: Session, project_id: int, task_id: int, export_json:
     # Get ODK Form with odk credentials from the project.
     xform = get_odk_form(odk_credentials)
     if not export_json:
-        file_path = f"{project_id}_submissions.zip"
-
         # If task id is not provided, submission for all the task are listed
         if task_id is None:
-            task_list = []
-
-            task_list = [x.id for x in project_tasks]
-
-            # zip_file_path = f"{project_name}_{form_category}_submissions.zip"  # Create a new ZIP file for all submissions
-            files = []
+            return download_submission_for_project(db, project_id)
 
-            for id in task_list:
+        xml_form_id = f"{project_name}_{form_category}_{task_id}".split("_")[
+            2]
+        try:
+            spool = fetch_submission_media(xform, odkid, xml_form_id)
+        except requests.HTTPError as e:
+            raise HTTPException(
+                status_code=e.response.status_code,
+                detail="Could not download submissions from ODK Central",
+            ) from e
+
+        def iter_archive():
+            with spool:
+                while chunk := spool.read(ZIP_STREAM_CHUNK_SIZE):
+                    yield chunk
 
-                # XML Form Id is a combination or project_name, category and task_id
-                # FIXME: fix xml_form_id
-                xml_form_id = f"{project_name}_{form_category}_{id}".split("_")[
-                    2]
-                file = xform.getSubmissionMedia(odkid, xml_form_id)
-
-                # Create a new output file for each submission
-                file_path = f"{project_name}_{form_category}_submission_{id}.zip"
-                with open(file_path, "wb") as f:
-                    f.write(file.content)
-
-                files.append(
-                    file_path
-                )  # Add the output file path to the list of files for the final ZIP file
-
-            extracted_files = []
-            for file_path in files:
-                with zipfile.ZipFile(file_path, "r") as zip_file:
-                    zip_file.extractall(
-                        os.path.splitext(file_path)[0]
-                    )  # Extract the contents of the nested ZIP files to a directory with the same name as the ZIP file
-                    extracted_files += [
-                        os.path.join(os.path.splitext(file_path)[0], f)
-                        for f in zip_file.namelist()
-                    ]  # Add the extracted file paths to the list of extracted files
-
-            # Create a new ZIP file for the extracted files
-            final_zip_file_path = f"{project_name}_{form_category}_submissions_final.zip"
-            with zipfile.ZipFile(final_zip_file_path, mode="w") as final_zip_file:
-                for file_path in extracted_files:
-                    final_zip_file.write(file_path)
-
-            return FileResponse(final_zip_file_path)
-        else:
-            xml_form_id = f"{project_name}_{form_category}_{task_id}".split("_")[
-                2]
-            file = xform.getSubmissionMedia(odkid, xml_form_id)
-            with open(file_path, "wb") as f:
-                f.write(file.content)
-            return FileResponse(file_path)
+        headers = {
+            "Content-Disposition": f"attachment; filename={project_id}_submissions.zip"
+        }
+        return StreamingResponse(
+            iter_archive(), media_type="application/zip", headers=headers
+        )
     else:
         headers = {
             "Content-Disposition": "attachment; filename=submission_data.json",
@@ -693,78 +1889,135 @@ def download_submission(db: Session, project_id: int, task_id: int, export_json:
         return Response(content=response_content, headers=headers)
 
 
-def get_submission_points(db: Session, project_id: int, task_id: int = None):
+def get_submission_points(
+    db: Session,
+    project_id: int,
+    task_id: int = None,
+    bbox: str = None,
+    after: str = None,
+    limit: int = 1000,
+):
     """
     Gets the submission points of a project.
 
+    The locations are read from the submissions table, use
+    sync_project_submissions to copy new submissions from ODK Central.
+
     Args:
         db (Session): A database session.
         project_id (int): The ID of the project.
         task_id (int, optional): The ID of the task. If provided, only submission points for this task are returned. Defaults to None.
+        bbox (str, optional): Only return submissions intersecting "minx,miny,maxx,maxy". Defaults to None.
+        after (str, optional): Only return submissions with an ID after this one. Defaults to None.
+        limit (int, optional): The maximum number of submissions to return. Defaults to 1000.
 
     Returns:
-        Union[List[Dict[str, Any]], None]: A list of GeoJSON Feature objects representing the submission points for the specified project and task (if provided), or None if an error occurred.
+        dict: A GeoJSON FeatureCollection of the submission locations, where
+            "next" holds the ID to pass as after for the next page.
     """
-    project_info = project_crud.get_project_by_id(db, project_id)
+    filters = ["project_id = :project_id", "geometry IS NOT NULL"]
+    params = {"project_id": project_id, "limit": limit}
 
-    # Return empty list if project is not found
-    if not project_info:
-        raise HTTPException(status_code=404, detail="Project not found")
+    if task_id:
+        filters.append("task_id = :task_id")
+        params["task_id"] = task_id
+    if bbox:
+        try:
+            params["minx"], params["miny"], params["maxx"], params["maxy"] = (
+                float(x) for x in bbox.split(",")
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=400, detail="bbox must be minx,miny,maxx,maxy"
+            ) from e
+        filters.append(
+            "geometry && ST_MakeEnvelope(:minx, :miny, :maxx, :maxy, 4326)"
+        )
+    if after:
+        filters.append("id > :after")
+        params["after"] = after
+
+    query = text(
+        f"""
+        SELECT jsonb_build_object(
+            'type', 'Feature',
+            'id', id,
+            'geometry', ST_AsGeoJSON(geometry)::jsonb,
+            'properties', jsonb_build_object(
+                'task_id', task_id,
+                'submitted_by', submitted_by,
+                'submitted_at', submitted_at,
+                'review_state', review_state
+            )
+        )
+        FROM submissions
+        WHERE {" AND ".join(filters)}
+        ORDER BY id
+        LIMIT :limit
+        """
+    )
+    features = [row[0] for row in db.execute(query, params)]
 
-    odkid = project_info.odkid
-    project_name = project_info.project_name_prefix
-    form_category = project_info.xform_title
+    return {
+        "type": "FeatureCollection",
+        "features": features,
+        "next": features[-1]["id"] if len(features) == limit else None,
+    }
+
+
+def get_sync_status(db: Session, project_id: int):
+    """
+    Gets how far the submissions of each task of a project have been synced.
+
+    Args:
+        db (Session): A database session.
+        project_id (int): The ID of the project.
+
+    Returns:
+        list[DbSubmissionSync]: The sync state of each task synced at least once.
+    """
+    return (
+        db.query(db_models.DbSubmissionSync)
+        .filter(db_models.DbSubmissionSync.project_id == project_id)
+        .order_by(db_models.DbSubmissionSync.task_id)
+        .all()
+    )
+
+
+def get_live_submission_counts(
+    db: Session, project_id: int, task_ids: List[int]
+) -> Dict[int, int]:
+    """
+    Counts the submissions of tasks in ODK Central, for tasks not synced yet.
+
+    Args:
+        db (Session): A database session.
+        project_id (int): The ID of the project.
+        task_ids (List[int]): The IDs of the tasks.
+
+    Returns:
+        Dict[int, int]: The submission count of each task.
+    """
+    project_info = project_crud.get_project(db, project_id)
+    if not project_info or not project_info.odkid:
+        return {task_id: 0 for task_id in task_ids}
 
-    # ODK Credentials
     odk_credentials = project_schemas.ODKCentral(
         odk_central_url=project_info.odk_central_url,
         odk_central_user=project_info.odk_central_user,
         odk_central_password=project_info.odk_central_password,
     )
-
     xform = get_odk_form(odk_credentials)
 
-    if task_id:
-        xml_form_id = f"{project_name}_{form_category}_{task_id}".split("_")[
-            2
-        ]  # FIXME: fix xml_form_id
-        # file_path = f"{project_id}_submissions.zip"
-        response_file = xform.getSubmissionMedia(odkid, xml_form_id)
-
-        # Create a file-like object from the bytes object
-        response_file_obj = io.BytesIO(response_file.content)
-        try:
-            # Open the zipfile
-            with zipfile.ZipFile(response_file_obj, "r") as zip_ref:
-                # Find the CSV file in the zipfile (assuming it has a .csv extension)
-                csv_filename = [
-                    f for f in zip_ref.namelist() if f.endswith(".csv")][0]
-                # Open the CSV file
-                with zip_ref.open(csv_filename) as csv_file:
-                    # Read the CSV data
-                    csv_reader = csv.DictReader(io.TextIOWrapper(csv_file))
-                    geometry = []
-                    for row in csv_reader:
-                        # Check if the row contains the 'warmup-Latitude' and 'warmup-Longitude' columns
-                        # FIXME: fix the column names (they might not be same warmup-Latitude and warmup-Longitude)
-                        if "warmup-Latitude" in row and "warmup-Longitude" in row:
-                            point = (row["warmup-Latitude"],
-                                     row["warmup-Longitude"])
-
-                            # Create a GeoJSON Feature object
-                            geometry.append(
-                                {
-                                    "type": "Feature",
-                                    "geometry": {"type": "Point", "coordinates": point},
-                                }
-                            )
-                            # points.append(point)
-                return geometry
-        except zipfile.BadZipFile:
-            print("The file is not a valid zip file.")
-            return None
-    else:
-        return None
+    counts = {}
+    for task_id in task_ids:
+        xml_form_id = (
+            f"{project_info.project_name_prefix}_{project_info.xform_title}_{task_id}"
+        ).split("_")[2]
+        counts[task_id] = count_form_submissions(
+            xform, project_info.odkid, xml_form_id
+        )
+    return counts
 
 
 async def get_submission_count_of_a_project(db:Session, 
@@ -772,6 +2025,11 @@ async def get_submission_count_of_a_project(db:Session,
     """
     Gets the submission count for a project.
 
+    Synced tasks count the submissions stored by the last sync, so the count
+    lags ODK Central by up to SUBMISSION_SYNC_INTERVAL seconds. Tasks that
+    were never synced, for example when the scheduled sync is disabled, are
+    counted in ODK Central.
+
     Args:
         db (Session): A database session.
         project_id (int): The ID of the project.
@@ -786,35 +2044,24 @@ async def get_submission_count_of_a_project(db:Session,
     if not project_info:
         raise HTTPException(status_code=404, detail="Project not found")
 
-    odkid = project_info.odkid
-    project_name = project_info.project_name_prefix
-    form_category = project_info.xform_title
-    project_tasks = project_info.tasks
-
-    # ODK Credentials
-    odk_credentials = project_schemas.ODKCentral(
-        odk_central_url=project_info.odk_central_url,
-        odk_central_user=project_info.odk_central_user,
-        odk_central_password=project_info.odk_central_password,
+    synced = dict(
+        db.query(
+            db_models.DbSubmissionSync.task_id,
+            db_models.DbSubmissionSync.submission_count,
+        ).filter(
+            db_models.DbSubmissionSync.project_id == project_id,
+            db_models.DbSubmissionSync.last_synced_at.isnot(None),
+        )
     )
-
-    # Get ODK Form with odk credentials from the project.
-    xform = get_odk_form(odk_credentials)
-
-    files = []
-
-    task_list = [x.id for x in project_tasks]
-    for id in task_list:
-        xml_form_id = f"{project_name}_{form_category}_{id}".split("_")[
-            2]
-        file = xform.getSubmissions(
-            odkid, xml_form_id, None, False, True)
-        if not file:
-            json_data = None
-        else:
-            json_data = json.loads(file)
-            json_data_value = json_data.get('value')
-            if json_data_value:
-                files.extend(json_data_value)
-
-    return len(files)
+    unsynced = [
+        task_id
+        for task_id in tasks_crud.get_task_lists(db, project_id)
+        if task_id not in synced
+    ]
+    count = sum(synced.values())
+    if unsynced:
+        live = await run_in_threadpool(
+            get_live_submission_counts, db, project_id, unsynced
+        )
+        count += sum(live.values())
+    return count
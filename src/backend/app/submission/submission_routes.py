@@ -16,17 +16,18 @@
 #     along with FMTM.  If not, see <https:#www.gnu.org/licenses/>.
 #
 import os
-import json
-from fastapi import APIRouter, Depends, HTTPException, Response
+import uuid
+from typing import List
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from ..projects import project_crud, project_schemas
 from fastapi.logger import logger as logger
 from sqlalchemy.orm import Session
-from fastapi.responses import FileResponse
-from osm_fieldwork.odk_merge import OdkMerge
-from osm_fieldwork.osmfile import OsmFile
-from ..projects import project_crud
+from starlette.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from ..db import database
-from . import submission_crud
+from ..workspace.workspace import Workspace, get_workspace
+from . import submission_crud, submission_schemas
 
 router = APIRouter(
     prefix="/submission",
@@ -109,19 +110,25 @@ async def download_submission(
         db (Session, optional): A database session. Defaults to Depends(database.get_db).
 
     Returns:
-        Any: A FileResponse object containing the downloaded submission data as a ZIP or JSON file.
+        Any: A StreamingResponse with the submission data as a ZIP file, or a Response with the JSON file.
     """
     if not (task_id or export_json):
-        file = submission_crud.download_submission_for_project(db, project_id)
-        return FileResponse(file)
+        return submission_crud.download_submission_for_project(db, project_id)
 
-    return submission_crud.download_submission(db, project_id, task_id, export_json)
+    # Fetching the submissions and building the archive blocks, keep it off
+    # the event loop
+    return await run_in_threadpool(
+        submission_crud.download_submission, db, project_id, task_id, export_json
+    )
 
 
 @router.get("/submission-points")
 async def submission_points(
     project_id: int,
     task_id: int = None,
+    bbox: str = None,
+    after: str = None,
+    limit: int = 1000,
     db: Session = Depends(database.get_db),
 ):
     """
@@ -130,12 +137,201 @@ async def submission_points(
     Args:
         project_id (int): The ID of the project. This endpoint returns the submission points of this project.
         task_id (int, optional): The ID of the task. If provided, this endpoint returns the submission points made for this task. Defaults to None.
+        bbox (str, optional): Only return submissions intersecting "minx,miny,maxx,maxy". Defaults to None.
+        after (str, optional): The "next" value of the previous page. Defaults to None.
+        limit (int, optional): The number of submissions per page. Defaults to 1000.
         db (Session, optional): A database session. Defaults to Depends(database.get_db).
 
     Returns:
-        Any: The list of submission points.
+        Any: A GeoJSON FeatureCollection of the submission points.
+    """
+    return submission_crud.get_submission_points(
+        db, project_id, task_id, bbox, after, limit
+    )
+
+
+@router.post("/sync/{project_id}")
+async def sync_submissions(
+    project_id: int,
+    db: Session = Depends(database.get_db),
+):
     """
-    return submission_crud.get_submission_points(db, project_id, task_id)
+    Copies the submissions of a project from ODK Central to the database.
+
+    Args:
+        project_id (int): The ID of the project.
+        db (Session, optional): A database session. Defaults to Depends(database.get_db).
+
+    Returns:
+        dict: The number of submissions synced.
+    """
+    count = await run_in_threadpool(
+        submission_crud.sync_project_submissions, db, project_id
+    )
+    return {"synced": count}
+
+
+@router.get(
+    "/sync-status/{project_id}",
+    response_model=List[submission_schemas.SubmissionSyncOut],
+)
+async def sync_status(
+    project_id: int,
+    db: Session = Depends(database.get_db),
+):
+    """
+    Shows the outcome of the last submission sync of each task.
+
+    Args:
+        project_id (int): The ID of the project.
+        db (Session, optional): A database session. Defaults to Depends(database.get_db).
+
+    Returns:
+        list[SubmissionSyncOut]: The sync state of each task synced at least once.
+    """
+    return submission_crud.get_sync_status(db, project_id)
+
+
+@router.post("/ingest/{project_id}")
+async def ingest_submissions(
+    project_id: int,
+    task_id: int = None,
+    db: Session = Depends(database.get_db),
+):
+    """
+    Pulls the submissions received since the last sync from ODK Central.
+
+    Call it when new submissions are expected, instead of waiting for the
+    next scheduled sync.
+
+    Args:
+        project_id (int): The ID of the project.
+        task_id (int, optional): Only pull the submissions of this task. Defaults to None.
+        db (Session, optional): A database session. Defaults to Depends(database.get_db).
+
+    Returns:
+        dict: The number of new submissions.
+    """
+    count = await run_in_threadpool(
+        submission_crud.sync_project_submissions, db, project_id, task_id, False
+    )
+    return {"ingested": count}
+
+
+@router.post("/review/{project_id}")
+async def update_review_states(
+    project_id: int,
+    update: submission_schemas.ReviewStateUpdate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(database.get_db),
+):
+    """
+    Sets the review state of every submission matching a filter.
+
+    The submissions are selected from the synced submissions table and
+    updated in ODK Central in the background. Submissions already in the
+    requested state are skipped, so an interrupted update resumes where it
+    stopped when it is sent again.
+
+    Args:
+        project_id (int): The ID of the project.
+        update (ReviewStateUpdate): The review state to set, and the task, date range and conflation result to filter by.
+        background_tasks (BackgroundTasks): FastAPI background tasks.
+        db (Session, optional): A database session. Defaults to Depends(database.get_db).
+
+    Returns:
+        dict: The ID of the background task, to follow its progress.
+    """
+    project = project_crud.get_project(db, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    # generate a unique task ID using uuid
+    background_task_id = uuid.uuid4()
+
+    # insert task and task ID into database
+    await project_crud.insert_background_task_into_database(
+        db, task_id=background_task_id, name="review_state"
+    )
+
+    background_tasks.add_task(
+        submission_crud.update_review_states,
+        db,
+        project_id,
+        update,
+        background_task_id,
+    )
+
+    return {"Message": f"{project_id}", "task_id": f"{background_task_id}"}
+
+
+@router.get("/review-status/{task_id}")
+async def review_status(
+    task_id: uuid.UUID,
+    db: Session = Depends(database.get_db),
+):
+    """
+    Returns the progress of a review state update.
+
+    Args:
+        task_id (uuid.UUID): The ID of the background task.
+        db (Session, optional): A database session. Defaults to Depends(database.get_db).
+
+    Returns:
+        dict: The status and progress message of the update.
+    """
+    task_status, task_message = await project_crud.get_background_task_status(
+        task_id, db
+    )
+    return {"status": task_status.name, "message": task_message}
+
+
+@router.get("/export")
+async def export_submissions(
+    project_id: int,
+    export_format: str = "fgb",
+    task_id: int = None,
+    db: Session = Depends(database.get_db),
+    ws: Workspace = Depends(get_workspace),
+):
+    """
+    Exports the submissions of a project as a compressed GIS file.
+
+    Args:
+        project_id (int): The ID of the project. This endpoint exports the submissions made in this project.
+        export_format (str, optional): "fgb" (FlatGeobuf), "gpkg" (GeoPackage) or "parquet" (GeoParquet). Defaults to "fgb".
+        task_id (int, optional): The ID of the task. If provided, this endpoint exports the submissions made for this task. Defaults to None.
+        db (Session, optional): A database session. Defaults to Depends(database.get_db).
+        ws (Workspace, optional): The scratch directory of the request. Defaults to Depends(get_workspace).
+
+    Returns:
+        StreamingResponse: A zip containing the exported file.
+    """
+    if export_format not in submission_crud.EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"export_format must be one of {list(submission_crud.EXPORT_FORMATS)}",
+        )
+
+    outfile = await run_in_threadpool(
+        submission_crud.export_submissions,
+        db,
+        project_id,
+        export_format,
+        ws.file(f"{project_id}_submissions"),
+        task_id,
+    )
+    # The export can be large, do not serve it past the quota
+    ws.ensure_capacity()
+
+    headers = {
+        "Content-Disposition": f"attachment; filename={os.path.basename(outfile)}.zip"
+    }
+    return StreamingResponse(
+        submission_crud.stream_file_zip(outfile),
+        media_type="application/zip",
+        headers=headers,
+    )
 
 
 @router.get("/convert-to-osm")
@@ -180,64 +376,31 @@ async def get_submission_count(
 @router.post("/conflate_data")
 async def conflate_osm_date(
     project_id: int,
+    after: str = None,
+    limit: int = 1000,
+    tolerance: float = submission_crud.CONFLATION_TOLERANCE,
     db: Session = Depends(database.get_db),
     ):
     """
     Conflates OSM data for a project.
 
+    The submissions stored by the scheduled sync, or by the ingest endpoint,
+    are compared with the project's data extract in the database. Nothing is
+    fetched from ODK Central here.
+
     Args:
         project_id (int): The ID of the project. This endpoint conflates OSM data for this project.
+        after (str, optional): The "next" value of the previous page. Defaults to None.
+        limit (int, optional): The number of submissions per page. Defaults to 1000.
+        tolerance (float, optional): The match distance in meters. Defaults to 10.
         db (Session, optional): A database session. Defaults to Depends(database.get_db).
 
     Returns:
-        Any: The conflated OSM data for the specified project.
+        Any: A GeoJSON FeatureCollection with the conflation result of each submission.
     """
-
-    # Submission JSON
-    submission = submission_crud.get_all_submissions(db, project_id)
-
-    # Data extracta file
-    data_extracts_file = "/tmp/data_extracts_file.geojson"
-
-    await project_crud.get_extracted_data_from_db(db, project_id, data_extracts_file)
-
-    # Output file
-    outfile = "/tmp/output_file.osm"
-    # JSON FILE PATH
-    jsoninfile = "/tmp/json_infile.json"
-
-    # # Delete if these files already exist
-    if os.path.exists(outfile):
-        os.remove(outfile)
-    if os.path.exists(jsoninfile):
-        os.remove(jsoninfile)
-
-    # Write the submission to a file
-    with open(jsoninfile, 'w') as f:
-        f.write(json.dumps(submission))
-
-    # Convert the submission to osm xml format
-    osmoutfile, jsonoutfile = await submission_crud.convert_json_to_osm(jsoninfile)
-
-    # Remove the extra closing </osm> tag from the end of the file
-    with open(osmoutfile, 'r') as f:
-        osmoutfile_data = f.read()
-        # Find the last index of the closing </osm> tag
-        last_osm_index = osmoutfile_data.rfind('</osm>')
-        # Remove the extra closing </osm> tag from the end
-        processed_xml_string = osmoutfile_data[:last_osm_index] + osmoutfile_data[last_osm_index + len('</osm>'):]
-    
-    # Write the modified XML data back to the file
-    with open(osmoutfile, 'w') as f:
-        f.write(processed_xml_string)
-
-    odkf = OsmFile(outfile)
-    osm = odkf.loadFile(osmoutfile)
-    if osm:
-        odk_merge = OdkMerge(data_extracts_file,None)
-        data = odk_merge.conflateData(osm)
-        return data
-    return []
+    return submission_crud.conflate_submissions(
+        db, project_id, after, limit, tolerance
+    )
 
 
 @router.get("/get_osm_xml/{project_id}")
@@ -253,38 +416,13 @@ async def get_osm_xml(
         db (Session, optional): A database session. Defaults to Depends(database.get_db).
 
     Returns:
-        Response: A Response object containing an OSM XML file for the specified project.
+        StreamingResponse: The OSM XML file for the specified project.
     """
 
-    # JSON FILE PATH
-    jsoninfile = "/tmp/json_infile.json"
-
-    # # Delete if these files already exist
-    if os.path.exists(jsoninfile):
-        os.remove(jsoninfile)
-
-    # Submission JSON
-    submission = submission_crud.get_all_submissions(db, project_id)
-
-    # Write the submission to a file
-    with open(jsoninfile, 'w') as f:
-        f.write(json.dumps(submission))
-
-    # Convert the submission to osm xml format
-    osmoutfile = await submission_crud.convert_json_to_osm_xml(jsoninfile)
-
-    # Remove the extra closing </osm> tag from the end of the file
-    with open(osmoutfile, 'r') as f:
-        osmoutfile_data = f.read()
-        # Find the last index of the closing </osm> tag
-        last_osm_index = osmoutfile_data.rfind('</osm>')
-        # Remove the extra closing </osm> tag from the end
-        processed_xml_string = osmoutfile_data[:last_osm_index] + osmoutfile_data[last_osm_index + len('</osm>'):]
-
-    # Write the modified XML data back to the file
-    with open(osmoutfile, 'w') as f:
-        f.write(processed_xml_string)
+    _, submissions = submission_crud.get_submission_stream(db, project_id)
 
-    # Create a plain XML response
-    response = Response(content=processed_xml_string, media_type="application/xml")
-    return response
+    # Convert the submission to osm xml format as it is downloaded
+    features = submission_crud.iter_submission_features(submissions)
+    return StreamingResponse(
+        submission_crud.stream_osm_xml(features), media_type="application/xml"
+    )
@@ -15,3 +15,55 @@
 #     You should have received a copy of the GNU General Public License
 #     along with FMTM.  If not, see <https:#www.gnu.org/licenses/>.
 #
+
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+from ..models.enums import BackgroundTaskStatus, ConflationStatus, ReviewState
+
+
+class ReviewStateUpdate(BaseModel):
+    """
+    Sets the review state of every submission matching a filter.
+
+    Attributes:
+        review_state (ReviewState): The review state to set.
+        task_id (int, optional): Only submissions made for this task.
+        submitted_after (datetime, optional): Only submissions received at or after this time.
+        submitted_before (datetime, optional): Only submissions received before this time.
+        conflation (ConflationStatus, optional): Only submissions with this conflation result.
+        tolerance (float, optional): The match distance in meters used for conflation.
+    """
+
+    review_state: ReviewState
+    task_id: Optional[int]
+    submitted_after: Optional[datetime]
+    submitted_before: Optional[datetime]
+    conflation: Optional[ConflationStatus]
+    tolerance: Optional[float]
+
+
+class SubmissionSyncOut(BaseModel):
+    """
+    How far the submissions of a task have been synced from ODK Central.
+
+    Attributes:
+        task_id (int): The ID of the task.
+        submission_count (int): The number of submissions synced.
+        last_submission_at (datetime, optional): When the newest synced submission was received.
+        last_synced_at (datetime, optional): When the last successful sync ended.
+        status (BackgroundTaskStatus, optional): Whether the last sync attempt succeeded or failed.
+        message (str, optional): The error of the last sync attempt, if it failed.
+    """
+
+    task_id: int
+    submission_count: int
+    last_submission_at: Optional[datetime]
+    last_synced_at: Optional[datetime]
+    status: Optional[BackgroundTaskStatus]
+    message: Optional[str]
+
+    class Config:
+        orm_mode = True
@@ -21,10 +21,11 @@ from typing import List
 
 from fastapi import HTTPException
 from fastapi.logger import logger as logger
-from sqlalchemy import column, select, table
-from sqlalchemy.orm import Session
+from sqlalchemy import cast, column, func, select, table
+from sqlalchemy.orm import Session, noload, selectinload, with_expression
 from sqlalchemy.sql import text
 from osm_fieldwork.make_data_extract import PostgresClient
+from geoalchemy2 import Geography
 from geoalchemy2.shape import from_shape
 from shapely.geometry import shape
 from geojson import dump
@@ -32,7 +33,8 @@ from ..projects import project_crud
 from ..central import central_crud
 
 from ..db import db_models
-from ..db.postgis_utils import geometry_to_geojson, get_centroid
+from ..db.postgis_utils import GeometryOptions, geometry_to_geojson
+from ..pagination import pagination
 from ..models.enums import (
     TaskStatus,
     get_action_for_status_change,
@@ -40,6 +42,7 @@ from ..models.enums import (
 )
 from ..tasks import tasks_schemas
 from ..users import user_crud
+from ..workspace.workspace import workspace
 
 
 async def get_task_count_in_project(db: Session, project_id: int):
@@ -75,8 +78,68 @@ def get_task_lists(db: Session, project_id: int):
     return tasks
 
 
+def get_task_feature_counts(db: Session, project_id: int):
+    """
+    Get the feature and submission counts of the tasks in a project.
+
+    Submission counts are the ones stored by the last submission sync, so
+    they lag ODK Central by up to SUBMISSION_SYNC_INTERVAL seconds. They are
+    None for tasks that were never synced.
+
+    Args:
+        db (Session): Database session.
+        project_id (int): Project ID.
+
+    Returns:
+        List[dict]: The task ID, feature count and submission count of each task.
+    """
+    query = text(
+        """SELECT t.id AS task_id,
+            (SELECT count(*) FROM features f
+                WHERE f.project_id = t.project_id AND f.task_id = t.id
+            ) AS feature_count,
+            CASE WHEN s.last_synced_at IS NOT NULL
+                THEN s.submission_count
+            END AS submission_count
+        FROM tasks t
+        LEFT JOIN submission_sync s
+            ON s.project_id = t.project_id AND s.task_id = t.id
+        WHERE t.project_id = :project_id
+        ORDER BY t.id"""
+    )
+    result = db.execute(query, {"project_id": project_id})
+    return [dict(row) for row in result]
+
+
+def task_outline_geojson(options: GeometryOptions):
+    """
+    Build the SQL expression rendering task outlines like the stored GeoJSON, with other geometry options.
+
+    Args:
+        options (GeometryOptions): The precision and simplification tolerance.
+
+    Returns:
+        A SQL expression to load into DbTask.rendered_geojson with with_expression.
+    """
+    task = db_models.DbTask
+    properties = {
+        "fid": task.project_task_index,
+        "uid": task.id,
+        "name": task.project_task_name,
+    }
+    return geometry_to_geojson(task.outline, properties, task.id, options)
+
+
 def get_tasks(
-    db: Session, project_id: int, user_id: int, skip: int = 0, limit: int = 1000
+    db: Session,
+    project_id: int,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 1000,
+    cursor: str = None,
+    count: bool = False,
+    options: GeometryOptions = GeometryOptions(),
+    history: bool = False,
 ):
     """
     Get a list of tasks for a project or user.
@@ -85,31 +148,74 @@ def get_tasks(
         db (Session): Database session.
         project_id (int): Project ID.
         user_id (int): User ID.
-        skip (int, optional): Number of tasks to skip. Defaults to 0.
+        skip (int, optional): Number of tasks to skip, when no cursor is given. Defaults to 0.
         limit (int, optional): Maximum number of tasks to return. Defaults to 1000.
+        cursor (str, optional): The cursor of the page to return. Defaults to None.
+        count (bool, optional): Whether to estimate the total number of tasks. Defaults to False.
+        options (GeometryOptions, optional): How to render the outlines. Defaults to the stored GeoJSON.
+        history (bool, optional): Whether to include the history of the tasks. Defaults to False, an empty history.
 
     Returns:
-        List[Task]: List of Task objects.
+        Page: A page of Task objects.
     """
-    if project_id:
-        db_tasks = (
-            db.query(db_models.DbTask)
-            .filter(db_models.DbTask.project_id == project_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
+    query = db.query(db_models.DbTask)
+    if history:
+        query = query.options(selectinload(db_models.DbTask.task_history))
+    else:
+        query = query.options(noload(db_models.DbTask.task_history))
+    if options != GeometryOptions():
+        query = query.options(
+            with_expression(
+                db_models.DbTask.rendered_geojson, task_outline_geojson(options)
+            )
         )
+    if project_id:
+        query = query.filter(db_models.DbTask.project_id == project_id)
     elif user_id:
-        db_tasks = (
-            db.query(db_models.DbTask)
-            .filter(db_models.DbTask.locked_by == user_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
-    else:
-        db_tasks = db.query(db_models.DbTask).offset(skip).limit(limit).all()
-    return convert_to_app_tasks(db_tasks)
+        query = query.filter(db_models.DbTask.locked_by == user_id)
+
+    page = pagination.keyset_paginate(
+        db, query, [db_models.DbTask.id], cursor, limit, skip, count
+    )
+    return page._replace(items=convert_to_app_tasks(page.items))
+
+
+def get_task_history(
+    db: Session,
+    project_id: int,
+    task_id: int = None,
+    limit: int = 100,
+    cursor: str = None,
+    count: bool = False,
+):
+    """
+    Get the history of a task or of all the tasks of a project, newest first.
+
+    The history of a project is read in order from
+    idx_task_history_project_id_id. The history of a task is found with
+    idx_task_history_composite and sorted, which stays cheap as a task has
+    few entries.
+
+    Args:
+        db (Session): Database session.
+        project_id (int): Project ID.
+        task_id (int, optional): Task ID. Defaults to None, for the whole project.
+        limit (int, optional): Maximum number of entries to return. Defaults to 100.
+        cursor (str, optional): The cursor of the page to return. Defaults to None.
+        count (bool, optional): Whether to estimate the total number of entries. Defaults to False.
+
+    Returns:
+        Page: A page of task history entries.
+    """
+    history = db_models.DbTaskHistory
+    query = db.query(history).filter(history.project_id == project_id)
+    if task_id:
+        query = query.filter(history.task_id == task_id)
+
+    # Entries are appended, so the newest have the largest IDs
+    return pagination.keyset_paginate(
+        db, query, [history.id], cursor, limit, count=count, descending=True
+    )
 
 
 def get_task(db: Session, task_id: int, db_obj: bool = False):
@@ -170,29 +276,7 @@ def update_task_status(db: Session, user_id: int, task_id: int, new_status: Task
             )
 
         if verify_valid_status_update(db_task.task_status, new_status):
-            # update history prior to updating task
-            update_history = create_task_history_for_status_change(
-                db_task, new_status, db_user
-            )
-            db.add(update_history)
-
-            db_task.task_status = new_status
-
-            if new_status in [
-                TaskStatus.LOCKED_FOR_MAPPING,
-                TaskStatus.LOCKED_FOR_VALIDATION,
-            ]:
-                db_task.locked_by = db_user.id
-            else:
-                db_task.locked_by = None
-
-            if new_status == TaskStatus.MAPPED:
-                db_task.mapped_by = db_user.id
-            if new_status == TaskStatus.VALIDATED:
-                db_task.validated_by = db_user.id
-            if new_status == TaskStatus.INVALIDATED:
-                db_task.mapped_by = None
-
+            set_task_status(db, db_task, new_status, db_user)
             db.commit()
             db.refresh(db_task)
 
@@ -205,11 +289,122 @@ def update_task_status(db: Session, user_id: int, task_id: int, new_status: Task
         )
 
 
+def get_nearest_task(
+    db: Session,
+    lat: float,
+    long: float,
+    project_id: int = None,
+    user_id: int = None,
+    lock: bool = False,
+):
+    """
+    Get the READY task nearest to a location, and optionally lock it for mapping.
+
+    The tasks are ordered with the KNN operator on the indexed outline, so
+    only the nearest row is read. When locking, the row is selected with FOR
+    UPDATE SKIP LOCKED and locked in the same transaction: a mapper asking at
+    the same time gets the next nearest task instead of the same one.
+
+    Args:
+        db (Session): Database session.
+        lat (float): Latitude of the user's location.
+        long (float): Longitude of the user's location.
+        project_id (int, optional): Only return a task of this project. Defaults to None.
+        user_id (int, optional): User ID, required to lock the task. Defaults to None.
+        lock (bool, optional): Whether to lock the task for mapping by the user. Defaults to False.
+
+    Raises:
+        HTTPException: If the task is to be locked but the user does not exist.
+
+    Returns:
+        Tuple[Task, float]: The nearest task and its distance in meters, or (None, None) if no task is available.
+    """
+    db_user = None
+    if lock:
+        if not user_id:
+            raise HTTPException(status_code=400, detail="User id required.")
+        db_user = user_crud.get_user(db, user_id, db_obj=True)
+        if not db_user:
+            raise HTTPException(
+                status_code=400, detail=f"User with id {user_id} does not exist."
+            )
+
+    task = db_models.DbTask
+    point = func.ST_SetSRID(func.ST_MakePoint(long, lat), 4326)
+    query = (
+        db.query(
+            task,
+            func.ST_Distance(
+                cast(task.outline, Geography(srid=4326)),
+                cast(point, Geography(srid=4326)),
+            ),
+        )
+        .filter(task.task_status == TaskStatus.READY)
+        .filter(task.outline.isnot(None))
+    )
+    if project_id:
+        query = query.filter(task.project_id == project_id)
+    query = query.order_by(task.outline.op("<->")(point)).limit(1)
+    if lock:
+        query = query.with_for_update(skip_locked=True, of=task)
+
+    row = query.first()
+    if not row:
+        return None, None
+
+    db_task, distance = row
+    if lock:
+        set_task_status(db, db_task, TaskStatus.LOCKED_FOR_MAPPING, db_user)
+        db.commit()
+        db.refresh(db_task)
+
+    return convert_to_app_task(db_task), distance
+
+
 # ---------------------------
 # ---- SUPPORT FUNCTIONS ----
 # ---------------------------
 
 
+def set_task_status(
+    db: Session,
+    db_task: db_models.DbTask,
+    new_status: TaskStatus,
+    db_user: db_models.DbUser,
+):
+    """
+    Set the status of a task and record it in the task history, without committing.
+
+    Args:
+        db (Session): Database session.
+        db_task (db_models.DbTask): Database task object.
+        new_status (TaskStatus): New status for the task.
+        db_user (db_models.DbUser): The user changing the status.
+    """
+    # update history prior to updating task
+    update_history = create_task_history_for_status_change(
+        db_task, new_status, db_user
+    )
+    db.add(update_history)
+
+    db_task.task_status = new_status
+
+    if new_status in [
+        TaskStatus.LOCKED_FOR_MAPPING,
+        TaskStatus.LOCKED_FOR_VALIDATION,
+    ]:
+        db_task.locked_by = db_user.id
+    else:
+        db_task.locked_by = None
+
+    if new_status == TaskStatus.MAPPED:
+        db_task.mapped_by = db_user.id
+    if new_status == TaskStatus.VALIDATED:
+        db_task.validated_by = db_user.id
+    if new_status == TaskStatus.INVALIDATED:
+        db_task.mapped_by = None
+
+
 def update_qrcode(
     db: Session,
     task_id: int,
@@ -325,28 +520,17 @@ def convert_to_app_task(db_task: db_models.DbTask):
             app_task.task_status.name
         ]
 
-        if db_task.outline:
-            properties = {
-                "fid": db_task.project_task_index,
-                "uid": db_task.id,
-                "name": db_task.project_task_name,
-            }
-            app_task.outline_geojson = geometry_to_geojson(
-                db_task.outline, properties, db_task.id)
-            app_task.outline_centroid = get_centroid(db_task.outline)
-
         if db_task.lock_holder:
             app_task.locked_by_uid = db_task.lock_holder.id
             app_task.locked_by_username = db_task.lock_holder.username
 
-        if db_task.qr_code:
-            logger.debug(
-                f"QR code found for task ID {db_task.id}. Converting to base64"
+        # Only link to the image, versioned by its ID so browsers can keep it
+        if db_task.qr_code_id:
+            app_task.qr_code_url = (
+                f"/tasks/{db_task.id}/qr-code?v={db_task.qr_code_id}"
             )
-            app_task.qr_code_base64 = base64.b64encode(db_task.qr_code.image)
         else:
-            logger.warning(f"No QR code found for task ID {db_task.id}")
-            app_task.qr_code_base64 = ""
+            app_task.qr_code_url = None
 
         if db_task.task_history:
             app_task.task_history = convert_to_app_history(
@@ -378,6 +562,56 @@ def convert_to_app_tasks(db_tasks: List[db_models.DbTask]):
         return []
 
 
+def get_qr_code_id(db: Session, task_id: int):
+    """
+    Get the ID of the QR code of a task.
+
+    Args:
+        db (Session): Database session.
+        task_id (int): Task ID.
+
+    Raises:
+        HTTPException: If the task does not exist or has no QR code.
+
+    Returns:
+        int: The ID of the QR code.
+    """
+    row = (
+        db.query(db_models.DbTask.qr_code_id)
+        .filter(db_models.DbTask.id == task_id)
+        .first()
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="Task does not exist")
+    if not row.qr_code_id:
+        raise HTTPException(status_code=404, detail="QR code not found")
+    return row.qr_code_id
+
+
+def get_qr_code_image(db: Session, qr_code_id: int):
+    """
+    Get the PNG image of a QR code.
+
+    Args:
+        db (Session): Database session.
+        qr_code_id (int): QR code ID.
+
+    Raises:
+        HTTPException: If the QR code does not exist.
+
+    Returns:
+        bytes: The PNG image.
+    """
+    image = (
+        db.query(db_models.DbQrCode.image)
+        .filter(db_models.DbQrCode.id == qr_code_id)
+        .scalar()
+    )
+    if image is None:
+        raise HTTPException(status_code=404, detail="QR code not found")
+    return image
+
+
 def get_qr_codes_for_task(
     db: Session,
     task_id: int,
@@ -452,61 +686,62 @@ async def update_task_files(db: Session,
         bool: True if the update was successful, False otherwise.
     """
 
-    # This file will store osm extracts
-    task_polygons = f"/tmp/{project_name}_{category}_{task_id}.geojson"
+    with workspace(f"task_{task_id}") as ws:
+        # This file will store osm extracts
+        task_polygons = ws.file(f"{project_name}_{category}_{task_id}.geojson")
 
-    # Update data extracts in the odk central
-    pg = PostgresClient('https://raw-data-api0.hotosm.org/v1', "underpass")
+        # Update data extracts in the odk central
+        pg = PostgresClient('https://raw-data-api0.hotosm.org/v1', "underpass")
 
-    category = 'buildings'
+        category = 'buildings'
 
-    # This file will store osm extracts
-    outfile = f"/tmp/test_project_{category}.geojson"
+        # This file will store osm extracts
+        outfile = ws.file(f"test_project_{category}.geojson")
 
-    # Delete all tasks of the project if there are some
-    db.query(db_models.DbFeatures).filter(
-        db_models.DbFeatures.task_id == task_id
-    ).delete()
+        # Delete all tasks of the project if there are some
+        db.query(db_models.DbFeatures).filter(
+            db_models.DbFeatures.task_id == task_id
+        ).delete()
 
-    # OSM Extracts
-    outline_geojson = pg.getFeatures(boundary=task_boundary,
-                                     filespec=outfile,
-                                     polygon=True,
-                                     xlsfile=f'{category}.xls',
-                                     category=category
-                                     )
+        # OSM Extracts
+        outline_geojson = pg.getFeatures(boundary=task_boundary,
+                                         filespec=outfile,
+                                         polygon=True,
+                                         xlsfile=f'{category}.xls',
+                                         category=category
+                                         )
 
-    updated_outline_geojson = {
-        "type": "FeatureCollection",
-        "features": []}
+        updated_outline_geojson = {
+            "type": "FeatureCollection",
+            "features": []}
 
-    # Collect feature mappings for bulk insert
-    for feature in outline_geojson["features"]:
+        # Collect feature mappings for bulk insert
+        for feature in outline_geojson["features"]:
 
-        # If the osm extracts contents do not have a title, provide an empty text for that.
-        feature["properties"]["title"] = ""
+            # If the osm extracts contents do not have a title, provide an empty text for that.
+            feature["properties"]["title"] = ""
 
-        feature_shape = shape(feature['geometry'])
+            feature_shape = shape(feature['geometry'])
 
-        wkb_element = from_shape(feature_shape, srid=4326)
-        updated_outline_geojson['features'].append(feature)
+            wkb_element = from_shape(feature_shape, srid=4326)
+            updated_outline_geojson['features'].append(feature)
 
-        db_feature = db_models.DbFeatures(
-            project_id=project_id,
-            geometry=wkb_element,
-            properties=feature["properties"]
-        )
-        db.add(db_feature)
-        db.commit()
+            db_feature = db_models.DbFeatures(
+                project_id=project_id,
+                geometry=wkb_element,
+                properties=feature["properties"]
+            )
+            db.add(db_feature)
+            db.commit()
 
-    # Update task_polygons file containing osm extracts with the new geojson contents containing title in the properties.
-    with open(task_polygons, "w") as jsonfile:
-        jsonfile.truncate(0)  # clear the contents of the file
-        dump(updated_outline_geojson, jsonfile)
+        # Update task_polygons file containing osm extracts with the new geojson contents containing title in the properties.
+        with open(task_polygons, "w") as jsonfile:
+            jsonfile.truncate(0)  # clear the contents of the file
+            dump(updated_outline_geojson, jsonfile)
 
-    # Update the osm extracts in the form.
-    central_crud.upload_xform_media(
-        project_odk_id, task_id, task_polygons, None)
+        # Update the osm extracts in the form.
+        central_crud.upload_xform_media(
+            project_odk_id, task_id, task_polygons, None)
 
     return True
 
@@ -17,18 +17,29 @@
 #
 
 import json
-import asyncio
-from typing import List
-
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from typing import List, Optional
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Response,
+    UploadFile,
+    File,
+)
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from ..cache import cache
 from ..db import database
+from ..db.postgis_utils import GeometryOptions, geometry_options
+from ..pagination.pagination import set_page_headers
+from ..responses.responses import fast_response, make_etag, not_modified
 from ..models.enums import TaskStatus
+from ..submission import submission_crud
 from ..users import user_schemas
 from . import tasks_crud, tasks_schemas
-from ..projects import project_crud, project_schemas
-from ..central import central_crud
 
 
 router = APIRouter(
@@ -43,14 +54,29 @@ router = APIRouter(
 async def read_task_list(
     project_id: int,
     limit: int = 1000,
+    cursor: str = None,
+    count: bool = False,
+    history: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    geometry: GeometryOptions = Depends(geometry_options()),
     db: Session = Depends(database.get_db),
     ):
     """
     Get a list of tasks for a project.
 
+    The cursors of the next and previous pages are returned in the
+    X-Next-Cursor and X-Prev-Cursor headers. The response has an ETag; send
+    it back in If-None-Match to get a 304 while the tasks are unchanged.
+    Responses are cached until the project or its tasks change.
+
     Args:
         project_id (int): Project ID.
         limit (int, optional): Maximum number of tasks to return. Defaults to 1000.
+        cursor (str, optional): The cursor of the page to return. Defaults to None.
+        count (bool, optional): Whether to send an estimate of the total in X-Total-Count. Defaults to False.
+        history (bool, optional): Whether to include the task history, see /tasks/history to page through it. Defaults to False.
+        if_none_match (str, optional): The ETag of the copy the client has.
+        geometry (GeometryOptions): The precision, simplify_tolerance and zoom query parameters. Outlines have 7 decimal places by default.
         db (Session, optional): Database session. Defaults to Depends(database.get_db).
 
     Raises:
@@ -59,12 +85,38 @@ async def read_task_list(
     Returns:
         List[TaskOut]: List of TaskOut objects.
     """
-
-    tasks = tasks_crud.get_tasks(db, project_id, limit)
-    if tasks:
-        return tasks
-    else:
-        raise HTTPException(status_code=404, detail="Tasks not found")
+    version = cache.get_versions(db, project_id).project
+    etag = make_etag(
+        "task_list", project_id, version, limit, cursor, count, history, *geometry
+    )
+    cached = not_modified(etag, if_none_match)
+    if cached:
+        return cached
+
+    def build():
+        page = tasks_crud.get_tasks(
+            db,
+            project_id,
+            None,
+            limit=limit,
+            cursor=cursor,
+            count=count,
+            options=geometry,
+            history=history,
+        )
+        if page.items:
+            response = fast_response(
+                tasks_schemas.TaskOut, page.items, headers={"ETag": etag}
+            )
+            set_page_headers(response, page)
+            return response
+        else:
+            raise HTTPException(status_code=404, detail="Tasks not found")
+
+    key = (
+        "task_list", project_id, version, limit, cursor, count, history, *geometry
+    )
+    return cache.response_cache.read_through(key, build)
     
 
 @router.get("/", response_model=List[tasks_schemas.TaskOut])
@@ -73,16 +125,27 @@ async def read_tasks(
     user_id: int = None,
     skip: int = 0,
     limit: int = 1000,
+    cursor: str = None,
+    count: bool = False,
+    history: bool = False,
+    geometry: GeometryOptions = Depends(geometry_options()),
     db: Session = Depends(database.get_db),
 ):
     """
     Get a list of tasks for a project or user.
 
+    The cursors of the next and previous pages are returned in the
+    X-Next-Cursor and X-Prev-Cursor headers.
+
     Args:
         project_id (int): Project ID.
         user_id (int, optional): User ID. Defaults to None.
-        skip (int, optional): Number of tasks to skip. Defaults to 0.
+        skip (int, optional): Number of tasks to skip, when no cursor is given. Defaults to 0.
         limit (int, optional): Maximum number of tasks to return. Defaults to 1000.
+        cursor (str, optional): The cursor of the page to return. Defaults to None.
+        count (bool, optional): Whether to send an estimate of the total in X-Total-Count. Defaults to False.
+        history (bool, optional): Whether to include the task history, see /tasks/history to page through it. Defaults to False.
+        geometry (GeometryOptions): The precision, simplify_tolerance and zoom query parameters. Outlines have 7 decimal places by default.
         db (Session, optional): Database session. Defaults to Depends(database.get_db).
 
     Raises:
@@ -97,28 +160,83 @@ async def read_tasks(
             detail="Please provide either user_id OR task_id, not both.",
         )
 
-    tasks = tasks_crud.get_tasks(db, project_id, user_id, skip, limit)
-    if tasks:
-        return tasks
+    page = tasks_crud.get_tasks(
+        db, project_id, user_id, skip, limit, cursor, count, geometry, history
+    )
+    if page.items:
+        response = fast_response(tasks_schemas.TaskOut, page.items)
+        set_page_headers(response, page)
+        return response
     else:
         raise HTTPException(status_code=404, detail="Tasks not found")
 
 
-@router.post("/near_me", response_model=tasks_schemas.TaskOut)
-def get_task(lat: float, long: float, project_id: int = None, user_id: int = None):
+@router.get("/history", response_model=List[tasks_schemas.TaskHistoryOut])
+async def read_task_history(
+    project_id: int,
+    task_id: int = None,
+    limit: int = 100,
+    cursor: str = None,
+    count: bool = False,
+    db: Session = Depends(database.get_db),
+):
+    """
+    Get the history of a task, or of all the tasks of a project, newest first.
+
+    The cursors of the next and previous pages are returned in the
+    X-Next-Cursor and X-Prev-Cursor headers.
+
+    Args:
+        project_id (int): Project ID.
+        task_id (int, optional): Task ID. Defaults to None, for the whole project.
+        limit (int, optional): Maximum number of entries to return. Defaults to 100.
+        cursor (str, optional): The cursor of the page to return. Defaults to None.
+        count (bool, optional): Whether to send an estimate of the total in X-Total-Count. Defaults to False.
+        db (Session, optional): Database session. Defaults to Depends(database.get_db).
+
+    Returns:
+        List[TaskHistoryOut]: The history entries.
+    """
+    page = tasks_crud.get_task_history(db, project_id, task_id, limit, cursor, count)
+    response = fast_response(tasks_schemas.TaskHistoryOut, page.items)
+    set_page_headers(response, page)
+    return response
+
+
+@router.post("/near_me", response_model=tasks_schemas.TaskNearby)
+async def get_task(
+    lat: float,
+    long: float,
+    project_id: int = None,
+    user_id: int = None,
+    lock: bool = False,
+    db: Session = Depends(database.get_db),
+):
     """
-    Get tasks near the requesting user.
+    Get the nearest task ready for mapping.
 
     Args:
         lat (float): Latitude of the user's location.
         long (float): Longitude of the user's location.
         project_id (int, optional): Project ID. Defaults to None.
-        user_id (int, optional): User ID. Defaults to None.
+        user_id (int, optional): User ID, required to lock the task. Defaults to None.
+        lock (bool, optional): Whether to lock the task for mapping by the user. Defaults to False.
+        db (Session, optional): Database session. Defaults to Depends(database.get_db).
+
+    Raises:
+        HTTPException: If no task is ready for mapping.
 
     Returns:
-        TaskOut: TaskOut object for the nearest task.
+        TaskNearby: The nearest task, with its distance in meters.
     """
-    return "Coming..."
+    task, distance = tasks_crud.get_nearest_task(
+        db, lat, long, project_id, user_id, lock
+    )
+    if not task:
+        raise HTTPException(status_code=404, detail="No task is ready for mapping")
+
+    task.distance = distance
+    return task
 
 
 @router.get("/{task_id}", response_model=tasks_schemas.TaskOut)
@@ -177,6 +295,50 @@ async def update_task_status(
         raise HTTPException(status_code=404, detail="Task status could not be updated.")
 
 
+@router.get("/{task_id}/qr-code")
+async def get_qr_code_image(
+    task_id: int,
+    v: int = None,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(database.get_db),
+):
+    """
+    Get the QR code of a task as a PNG image.
+
+    Tasks link to it in qr_code_url, with the ID of the QR code in v. Such a
+    URL always returns the same image, so browsers keep it; without v, the
+    image is revalidated with its ETag. The QR code holds the ODK app user
+    token, so it is never cached by shared caches.
+
+    Args:
+        task_id (int): Task ID.
+        v (int, optional): The ID of the QR code. Defaults to None.
+        if_none_match (str, optional): The ETag of the copy the client has.
+        db (Session, optional): Database session. Defaults to Depends(database.get_db).
+
+    Returns:
+        Response: The PNG image, or a 304 if the client copy is current.
+    """
+    qr_code_id = tasks_crud.get_qr_code_id(db, task_id)
+    if v == qr_code_id:
+        cache_control = "private, max-age=31536000, immutable"
+    else:
+        cache_control = "private, no-cache"
+
+    etag = make_etag("qr_code", qr_code_id)
+    cached = not_modified(etag, if_none_match)
+    if cached:
+        cached.headers["Cache-Control"] = cache_control
+        return cached
+
+    image = tasks_crud.get_qr_code_image(db, qr_code_id)
+    return Response(
+        content=image,
+        media_type="image/png",
+        headers={"ETag": etag, "Cache-Control": cache_control},
+    )
+
+
 @router.post("/task-qr-code/{task_id}")
 async def get_qr_code_list(
     task_id: int,
@@ -230,6 +392,9 @@ async def task_features_count(
     """
     Get the feature count for tasks in a project.
 
+    Submission counts lag ODK Central until the next submission sync. Tasks
+    that were never synced are counted in ODK Central.
+
     Args:
         project_id (int): Project ID.
         db (Session, optional): Database session. Defaults to Depends(database.get_db).
@@ -238,49 +403,13 @@ async def task_features_count(
         dict or list or str or NoneType or Response or JSONResponse or HTMLResponse or RedirectResponse or StreamingResponse or FileResponse or UJSONResponse or ORJSONResponse or MsgpackResponse: Feature count for tasks in the project.
     """
 
-    task_list = tasks_crud.get_task_lists(db, project_id)
-
-    # Get the project object.
-    project = project_crud.get_project(db, project_id)
-
-    # ODK Credentials
-    odk_credentials = project_schemas.ODKCentral(
-        odk_central_url = project.odk_central_url,
-        odk_central_user = project.odk_central_user,
-        odk_central_password = project.odk_central_password,
+    counts = tasks_crud.get_task_feature_counts(db, project_id)
+    unsynced = [row["task_id"] for row in counts if row["submission_count"] is None]
+    if unsynced:
+        live = await run_in_threadpool(
+            submission_crud.get_live_submission_counts, db, project_id, unsynced
         )
-
-    def process_task(task):
-        """
-        Process a task to get its feature and submission counts.
-
-        Args:
-            task (int): Task ID.
-
-        Returns:
-            dict: Dictionary containing the task ID, feature count, and submission count.
-        """
-        feature_count_query = f"""
-            select count(*) from features where project_id = {project_id} and task_id = {task}
-        """
-        result = db.execute(feature_count_query)
-        feature_count = result.fetchone()
-
-        submission_list = central_crud.list_task_submissions(
-            project.odkid, task, odk_credentials)
-
-        # form_details = central_crud.get_form_full_details(project.odkid, task, odk_credentials)
-        return {
-            "task_id": task,
-            "feature_count": feature_count["count"],
-            # 'submission_count': form_details['submissions'],
-            "submission_count": len(submission_list)
-            if isinstance(submission_list, list)
-            else 0,
-        }
-
-    loop = asyncio.get_event_loop()
-    tasks = [loop.run_in_executor(None, process_task, task) for task in task_list]
-    processed_results = await asyncio.gather(*tasks)
-
-    return processed_results
+        for row in counts:
+            if row["submission_count"] is None:
+                row["submission_count"] = live[row["task_id"]]
+    return counts
@@ -21,7 +21,6 @@ import enum
 from datetime import datetime
 from typing import List
 
-from geojson_pydantic import Feature
 from pydantic import BaseModel
 
 from ..models.enums import TaskStatus
@@ -63,8 +62,13 @@ class TaskHistoryBase(BaseModel):
 class TaskHistoryOut(TaskHistoryBase):
     """
     Output model for a task history entry.
+
+    Attributes:
+        task_id (int): Task ID.
+        user_id (int): ID of the user who took the action.
     """
-    pass
+    task_id: int
+    user_id: int
 
 
 class TaskBasicInfo(BaseModel):
@@ -102,8 +106,8 @@ class TaskBase(BaseModel):
         project_id (int): Project ID.
         project_task_index (int): Index of the task within the project.
         project_task_name (str): Name of the task within the project.
-        outline_geojson (Feature): GeoJSON representation of the task outline.
-        outline_centroid (Feature): Centroid of the task outline.
+        outline_geojson (dict): GeoJSON Feature of the task outline, stored when the outline is written.
+        outline_centroid (dict): GeoJSON Feature of the centroid of the task outline, stored when the outline is written.
         task_status (TaskStatus): Status of the task.
         locked_by_uid (int, optional): User ID of the user who has locked the task. Defaults to None.
         locked_by_username (str, optional): Username of the user who has locked the task. Defaults to None.
@@ -113,8 +117,8 @@ class TaskBase(BaseModel):
     project_id: int
     project_task_index: int
     project_task_name: str
-    outline_geojson: Feature
-    outline_centroid: Feature
+    outline_geojson: dict
+    outline_centroid: dict
     # initial_feature_count: int
     task_status: TaskStatus
     locked_by_uid: int = None
@@ -130,11 +134,10 @@ class Task(TaskBase):
     Model for a task.
 
     Attributes:
-        qr_code_base64 (str): Base64 representation of the QR code for the task.
+        qr_code_url (str, optional): URL of the PNG of the QR code for the task, if it has one.
         task_status_str (TaskStatusOption): String representation of the task status.
     """
-    # geometry_geojson: str
-    qr_code_base64: str
+    qr_code_url: str = None
     task_status_str: TaskStatusOption
     pass
 
@@ -150,6 +153,16 @@ class TaskOut(TaskBase):
     pass
 
 
+class TaskNearby(TaskOut):
+    """
+    Output model for a task near a location.
+
+    Attributes:
+        distance (float): Distance from the location to the task outline, in meters.
+    """
+    distance: float
+
+
 class TaskDetails(TaskBase):
     """
     Detailed information about a task.
@@ -0,0 +1 @@
+"""Vector tiles."""
@@ -0,0 +1,168 @@
+# Copyright (c) 2022, 2023 Humanitarian OpenStreetMap Team
+#
+# This file is part of FMTM.
+#
+#     FMTM is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     FMTM is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with FMTM.  If not, see <https:#www.gnu.org/licenses/>.
+#
+"""Mapbox Vector Tiles of the tasks, features and submissions of a project.
+
+A map only needs what is in view, so instead of downloading every geometry of
+a project as GeoJSON it asks for /{z}/{x}/{y}.mvt tiles, built by PostGIS with
+ST_AsMVT. Built tiles are kept in memory, keyed by the version of their layer:
+the tasks layer follows projects.version, the features and submissions layers
+follow the tile_versions table, and both are bumped by triggers on every write.
+A write therefore makes the cached tiles of its layer unreachable, and the
+cache notifications drop them.
+"""
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..cache import cache
+from ..config import settings
+from ..models.enums import TileLayer
+
+MAX_ZOOM = 22
+
+# Extent of a tile in its own coordinates, and the margin drawn around it so
+# that lines and labels crossing the tile edge are not cut
+EXTENT = 4096
+BUFFER = 256
+
+TILE_SQL = """
+WITH bounds AS (
+    SELECT ST_TileEnvelope(:z, :x, :y) AS geom
+),
+search AS (
+    SELECT ST_Transform(
+        ST_Expand(geom, (ST_XMax(geom) - ST_XMin(geom)) * {margin}), 4326
+    ) AS geom
+    FROM bounds
+),
+layer AS (
+    SELECT {columns},
+        ST_AsMVTGeom(
+            ST_Transform(t.{geometry}, 3857), bounds.geom, {extent}, {buffer}
+        ) AS geom
+    FROM {table} t, bounds, search
+    WHERE t.project_id = :project_id AND t.{geometry} && search.geom
+)
+SELECT ST_AsMVT(layer, :layer, {extent}, 'geom'{feature_id}) FROM layer
+"""
+
+LAYERS = {
+    TileLayer.TASKS: {
+        "table": "tasks",
+        "geometry": "outline",
+        "columns": """t.id, t.project_task_index, t.project_task_name,
+            CAST(t.task_status AS text) AS task_status, t.locked_by""",
+        "feature_id": ", 'id'",
+    },
+    TileLayer.FEATURES: {
+        "table": "features",
+        "geometry": "geometry",
+        "columns": "t.id, t.task_id, t.category_title, t.properties",
+        "feature_id": ", 'id'",
+    },
+    # Submission IDs are strings, which MVT feature IDs can not be, so they
+    # are kept as an attribute
+    TileLayer.SUBMISSIONS: {
+        "table": "submissions",
+        "geometry": "geometry",
+        "columns": """t.id, t.task_id, t.review_state,
+            CAST(t.submitted_at AS text) AS submitted_at""",
+        "feature_id": "",
+    },
+}
+
+LAYER_SQL = {
+    layer: text(
+        TILE_SQL.format(
+            margin=BUFFER / EXTENT, extent=EXTENT, buffer=BUFFER, **params
+        )
+    )
+    for layer, params in LAYERS.items()
+}
+
+
+tile_cache = cache.LRUCache(settings.TILE_CACHE_MB * 1024 * 1024)
+
+
+def get_layer_version(db: Session, layer: TileLayer, project_id: int) -> int:
+    """
+    Return the version of a tile layer of a project.
+
+    Args:
+        db (Session): A database session.
+        layer (TileLayer): The tile layer.
+        project_id (int): The ID of the project.
+
+    Returns:
+        int: The version, bumped on every write to the layer.
+    """
+    versions = cache.get_versions(db, project_id)
+    if layer == TileLayer.TASKS:
+        return versions.project
+    if layer == TileLayer.FEATURES:
+        return versions.features
+    return versions.submissions
+
+
+def get_tile(
+    db: Session,
+    layer: TileLayer,
+    project_id: int,
+    z: int,
+    x: int,
+    y: int,
+    version: Optional[int] = None,
+) -> bytes:
+    """
+    Return a vector tile of a project, building it if it is not cached.
+
+    Args:
+        db (Session): A database session.
+        layer (TileLayer): The tile layer.
+        project_id (int): The ID of the project.
+        z (int): The zoom level.
+        x (int): The column of the tile.
+        y (int): The row of the tile.
+        version (int, optional): The version of the layer, if the caller already read it.
+
+    Returns:
+        bytes: The tile, empty if nothing is in it.
+    """
+    if not 0 <= z <= MAX_ZOOM:
+        raise HTTPException(
+            status_code=400, detail=f"z must be between 0 and {MAX_ZOOM}"
+        )
+    if not (0 <= x < 2**z and 0 <= y < 2**z):
+        raise HTTPException(
+            status_code=400, detail=f"x and y must be between 0 and {2**z - 1}"
+        )
+
+    if version is None:
+        version = get_layer_version(db, layer, project_id)
+    key = (layer.value, project_id, version, z, x, y)
+    tile = tile_cache.get(key)
+    if tile is None:
+        tile = db.execute(
+            LAYER_SQL[layer],
+            {"z": z, "x": x, "y": y, "project_id": project_id, "layer": layer.value},
+        ).scalar()
+        tile = bytes(tile) if tile else b""
+        tile_cache.set(key, tile, len(tile))
+    return tile
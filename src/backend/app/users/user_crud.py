@@ -22,6 +22,7 @@ from fastapi import HTTPException
 from sqlalchemy.orm import Session
 
 from ..db import db_models
+from ..pagination.pagination import keyset_paginate
 from . import user_schemas
 
 # --------------
@@ -29,20 +30,38 @@ from . import user_schemas
 # --------------
 
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
+def get_users(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str = None,
+    count: bool = False,
+):
     """
     Get a list of users from the database.
 
     Args:
         db (Session): The database session.
-        skip (int, optional): The number of users to skip. Defaults to 0.
+        skip (int, optional): The number of users to skip, when no cursor is given. Defaults to 0.
         limit (int, optional): The maximum number of users to return. Defaults to 100.
+        cursor (str, optional): The cursor of the page to return. Defaults to None.
+        count (bool, optional): Whether to estimate the total number of users. Defaults to False.
 
     Returns:
-        List[user_schemas.User]: A list of users.
+        Page: A page of user_schemas.User.
     """
-    db_users = db.query(db_models.DbUser).offset(skip).limit(limit).all()
-    return convert_to_app_user(db_users) if db_users else []
+    page = keyset_paginate(
+        db,
+        db.query(db_models.DbUser),
+        [db_models.DbUser.id],
+        cursor,
+        limit,
+        skip,
+        count,
+    )
+    return page._replace(
+        items=convert_to_app_user(page.items) if page.items else []
+    )
 
 
 def get_user(db: Session, user_id: int, db_obj: bool = False):
@@ -18,10 +18,11 @@
 
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 
 from ..db import database
+from ..pagination.pagination import set_page_headers
 from ..models.enums import UserRole as UserRoleEnum
 from . import user_crud, user_schemas
 
@@ -56,25 +57,37 @@ def create_user(user: user_schemas.UserIn, db: Session = Depends(database.get_db
 
 @router.get("/", response_model=List[user_schemas.UserOut])
 def get_users(
+    response: Response,
     username: str = "",
     skip: int = 0,
     limit: int = 100,
+    cursor: str = None,
+    count: bool = False,
     db: Session = Depends(database.get_db),
 ):
     """
     Get a list of users from the database.
 
+    The cursors of the next and previous pages are returned in the
+    X-Next-Cursor and X-Prev-Cursor headers.
+
     Args:
+        response (Response): The response, to add the page headers to.
         username (str, optional): Filter users by username. Defaults to "".
-        skip (int, optional): The number of users to skip. Defaults to 0.
+        skip (int, optional): The number of users to skip, when no cursor is given. Defaults to 0.
         limit (int, optional): The maximum number of users to return. Defaults to 100.
+        cursor (str, optional): The cursor of the page to return. Defaults to None.
+        count (bool, optional): Whether to send an estimate of the total in X-Total-Count. Defaults to False.
         db (Session, optional): The database session. Defaults to Depends(database.get_db).
 
     Returns:
         List[user_schemas.UserOut]: A list of users.
     """
-    users = user_crud.get_users(db, skip=skip, limit=limit)
-    return users
+    page = user_crud.get_users(
+        db, skip=skip, limit=limit, cursor=cursor, count=count
+    )
+    set_page_headers(response, page)
+    return page.items
     # TODO error thrown when no users are in db
 
 
@@ -0,0 +1 @@
+"""Scratch workspaces for requests and background jobs."""
@@ -0,0 +1,273 @@
+# Copyright (c) 2022, 2023 Humanitarian OpenStreetMap Team
+#
+# This file is part of FMTM.
+#
+#     FMTM is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     FMTM is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with FMTM.  If not, see <https:#www.gnu.org/licenses/>.
+#
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from fastapi import HTTPException
+from fastapi.logger import logger as logger
+
+from ..config import settings
+
+# Job logs are kept next to the workspaces, but do not count towards the quota
+LOG_DIR = "logs"
+# Job logs older than this are removed when a new job starts
+JOB_LOG_MAX_AGE = 7 * 24 * 60 * 60
+
+
+class WorkspaceFull(HTTPException):
+    """Raised when the workspaces would exceed WORKSPACE_QUOTA_MB."""
+
+    def __init__(self):
+        super().__init__(
+            status_code=507, detail="Not enough scratch space, try again later"
+        )
+
+
+class Workspace:
+    """A private scratch directory for one request or background job."""
+
+    def __init__(self, path: Path, others: int = 0):
+        """Wrap an existing workspace directory.
+
+        Args:
+            path (Path): The directory of the workspace.
+            others (int, optional): The bytes used by the other workspaces
+                when this one was created. Defaults to 0.
+        """
+        self.path = path
+        self.others = others
+
+    def file(self, name: str) -> str:
+        """Get the path of a file inside the workspace.
+
+        The quota is checked each time a file is handed out, counting what
+        the job wrote so far, so a job that keeps writing stops once the
+        workspaces are full.
+
+        Args:
+            name (str): The file name. Any directory part is dropped.
+
+        Returns:
+            str: The absolute path of the file.
+
+        Raises:
+            WorkspaceFull: If the workspaces exceed WORKSPACE_QUOTA_MB.
+        """
+        self.ensure_capacity()
+        return str(self.path / Path(name).name)
+
+    def ensure_capacity(self, nbytes: int = 0):
+        """Check that the workspaces have room for more data.
+
+        Only this workspace is measured, the others are counted as they were
+        when it was created. Call it after a large write to stop early.
+
+        Args:
+            nbytes (int, optional): The number of bytes about to be written. Defaults to 0.
+
+        Raises:
+            WorkspaceFull: If the data would exceed WORKSPACE_QUOTA_MB.
+        """
+        check_quota(self.others + self.size() + nbytes)
+
+    def size(self) -> int:
+        """Get the number of bytes stored in the workspace."""
+        return disk_usage(self.path)
+
+    def cleanup(self):
+        """Remove the workspace and everything in it."""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def workspace_root() -> Path:
+    """Get the directory all workspaces are created in."""
+    root = Path(settings.WORKSPACE_DIR)
+    root.mkdir(parents=True, exist_ok=True)
+    return root
+
+
+def disk_usage(path: Path, skip: tuple = ()) -> int:
+    """Get the total size of the files under a directory.
+
+    Args:
+        path (Path): The directory to measure.
+        skip (tuple, optional): Names of subdirectories of path to leave out.
+            Defaults to ().
+
+    Returns:
+        int: The size in bytes.
+    """
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        if dirpath == str(path):
+            dirnames[:] = [name for name in dirnames if name not in skip]
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                # Removed by a workspace cleaning up in the meantime
+                continue
+    return total
+
+
+def check_quota(used: int):
+    """Check a number of bytes against WORKSPACE_QUOTA_MB.
+
+    Args:
+        used (int): The bytes the workspaces use, or are about to.
+
+    Raises:
+        WorkspaceFull: If they exceed WORKSPACE_QUOTA_MB.
+    """
+    quota = settings.WORKSPACE_QUOTA_MB * 1024 * 1024
+    if used > quota:
+        logger.error(f"Workspace quota exceeded: {used} bytes used of {quota}")
+        raise WorkspaceFull()
+
+
+def ensure_capacity(nbytes: int = 0) -> int:
+    """Check that the workspaces have room for more data.
+
+    This walks every workspace, so it is only done when one is created.
+
+    Args:
+        nbytes (int, optional): The number of bytes about to be written. Defaults to 0.
+
+    Returns:
+        int: The bytes used by the workspaces.
+
+    Raises:
+        WorkspaceFull: If writing the data would exceed WORKSPACE_QUOTA_MB.
+    """
+    used = disk_usage(workspace_root(), skip=(LOG_DIR,))
+    check_quota(used + nbytes)
+    return used
+
+
+def create_workspace(prefix: str = "job") -> Workspace:
+    """Create a new, uniquely named workspace.
+
+    Args:
+        prefix (str, optional): A prefix for the directory name. Defaults to "job".
+
+    Returns:
+        Workspace: The new workspace. The caller must clean it up.
+    """
+    used = ensure_capacity()
+    path = tempfile.mkdtemp(prefix=f"{prefix}_", dir=workspace_root())
+    return Workspace(Path(path), used)
+
+
+@contextmanager
+def workspace(prefix: str = "job"):
+    """Provide a workspace that is removed when the block exits.
+
+    Args:
+        prefix (str, optional): A prefix for the directory name. Defaults to "job".
+
+    Yields:
+        Workspace: The workspace.
+    """
+    ws = create_workspace(prefix)
+    try:
+        yield ws
+    finally:
+        ws.cleanup()
+
+
+def get_workspace():
+    """FastAPI dependency providing a workspace for the current request.
+
+    The workspace is removed once the response, including any streamed
+    body, has been sent.
+
+    Yields:
+        Workspace: The workspace.
+    """
+    with workspace("request") as ws:
+        yield ws
+
+
+def job_log_path(background_task_id: uuid.UUID) -> str:
+    """Get the path of the log file of a background job.
+
+    Logs live outside the job workspace, so they can be read after the job ends.
+
+    Args:
+        background_task_id (uuid.UUID): The ID of the background task.
+
+    Returns:
+        str: The path of the log file.
+    """
+    logs = workspace_root() / LOG_DIR
+    logs.mkdir(exist_ok=True)
+    return str(logs / f"{background_task_id}.log")
+
+
+def prune_job_logs(max_age: int = JOB_LOG_MAX_AGE):
+    """Remove the log files of jobs that finished a while ago.
+
+    Args:
+        max_age (int, optional): The age in seconds after which a log is
+            removed. Defaults to JOB_LOG_MAX_AGE.
+    """
+    cutoff = time.time() - max_age
+    for path in (workspace_root() / LOG_DIR).glob("*.log"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            # Removed by another worker in the meantime
+            continue
+
+
+@contextmanager
+def job_log(job_logger: logging.Logger, background_task_id: uuid.UUID):
+    """Copy the records a job logs from its own thread to its log file.
+
+    Args:
+        job_logger (logging.Logger): The logger the job writes to.
+        background_task_id (uuid.UUID): The ID of the background task.
+
+    Yields:
+        logging.Handler: The file handler, removed when the block exits.
+    """
+    path = job_log_path(background_task_id)
+    prune_job_logs()
+    handler = logging.FileHandler(path)
+    handler.setLevel(logging.DEBUG)
+    handler.setFormatter(
+        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    )
+    # Jobs run concurrently on the same logger, keep each file to its own job
+    thread_id = threading.get_ident()
+    handler.addFilter(lambda record: record.thread == thread_id)
+    job_logger.addHandler(handler)
+    try:
+        yield handler
+    finally:
+        job_logger.removeHandler(handler)
+        handler.close()
@@ -0,0 +1,45 @@
+# Copyright (c) 2022, 2023 Humanitarian OpenStreetMap Team
+#
+# This file is part of FMTM.
+#
+#     FMTM is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     FMTM is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with FMTM.  If not, see <https:#www.gnu.org/licenses/>.
+#
+"""Compare the default and fast encoding of a project with 5,000 tasks.
+
+Run from src/backend with: python -m benchmarks.bench_responses
+"""
+import json
+import timeit
+
+from tests.test_responses import default_encoding, fast_encoding, make_project
+
+TASKS = 5000
+
+
+def main():
+    """Time both encodings and print the speedup."""
+    project = make_project(tasks=TASKS)
+    assert json.loads(default_encoding(project)) == json.loads(fast_encoding(project))
+
+    runs = 5
+    default = min(timeit.repeat(lambda: default_encoding(project), number=1, repeat=runs))
+    fast = min(timeit.repeat(lambda: fast_encoding(project), number=1, repeat=runs))
+    print(f"{TASKS} tasks, best of {runs}")
+    print(f"  response_model + jsonable_encoder + json: {default * 1000:8.1f} ms")
+    print(f"  fast_response:                            {fast * 1000:8.1f} ms")
+    print(f"  speedup: {default / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
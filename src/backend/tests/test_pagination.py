@@ -0,0 +1,139 @@
+# Copyright (c) 2022, 2023 Humanitarian OpenStreetMap Team
+#
+# This file is part of FMTM.
+#
+#     FMTM is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     FMTM is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with FMTM.  If not, see <https:#www.gnu.org/licenses/>.
+#
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import Column, Integer, create_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from app.pagination.pagination import decode_cursor, encode_cursor, keyset_paginate
+
+Base = declarative_base()
+
+
+class Item(Base):
+    """A row sorted by its ID only."""
+
+    __tablename__ = "items"
+
+    id = Column(Integer, primary_key=True)
+
+
+@pytest.fixture
+def items():
+    """An in-memory session holding items 1 to 10."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all(Item(id=i) for i in range(1, 11))
+    session.commit()
+    yield session
+    session.close()
+
+
+def ids(page):
+    """Get the IDs of the items of a page."""
+    return [item.id for item in page.items]
+
+
+def test_cursor_round_trip():
+    """A cursor decodes to the direction and keys it was encoded from."""
+    cursor = encode_cursor("prev", [3, "2023-06-01T10:00:00"])
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == ("prev", [3, "2023-06-01T10:00:00"])
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    ["not base64!", "e30", encode_cursor("sideways", [1]), encode_cursor("next", 1)],
+)
+def test_invalid_cursor(cursor):
+    """Malformed cursors are rejected with a 400."""
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_keyset_pages_forward_and_back(items):
+    """Following next and then prev cursors walks the list in order."""
+    keys = [Item.id]
+    first = keyset_paginate(items, items.query(Item), keys, limit=4)
+    assert ids(first) == [1, 2, 3, 4]
+    assert first.prev_cursor is None
+
+    second = keyset_paginate(items, items.query(Item), keys, first.next_cursor, 4)
+    assert ids(second) == [5, 6, 7, 8]
+
+    last = keyset_paginate(items, items.query(Item), keys, second.next_cursor, 4)
+    assert ids(last) == [9, 10]
+    assert last.next_cursor is None
+
+    back = keyset_paginate(items, items.query(Item), keys, last.prev_cursor, 4)
+    assert ids(back) == [5, 6, 7, 8]
+    assert back.next_cursor is not None
+
+    start = keyset_paginate(items, items.query(Item), keys, back.prev_cursor, 4)
+    assert ids(start) == [1, 2, 3, 4]
+    assert start.prev_cursor is None
+
+
+def test_keyset_descending(items):
+    """Descending lists page from the largest keys, in both directions."""
+    keys = [Item.id]
+    first = keyset_paginate(items, items.query(Item), keys, limit=4, descending=True)
+    assert ids(first) == [10, 9, 8, 7]
+
+    second = keyset_paginate(
+        items, items.query(Item), keys, first.next_cursor, 4, descending=True
+    )
+    assert ids(second) == [6, 5, 4, 3]
+
+    back = keyset_paginate(
+        items, items.query(Item), keys, second.prev_cursor, 4, descending=True
+    )
+    assert ids(back) == [10, 9, 8, 7]
+
+
+def test_keyset_skip(items):
+    """Without a cursor, skip offsets the first page, which then has a prev cursor."""
+    page = keyset_paginate(items, items.query(Item), [Item.id], limit=3, skip=2)
+    assert ids(page) == [3, 4, 5]
+    assert page.prev_cursor is not None
+
+
+def test_keyset_cursor_of_other_keys(items):
+    """A cursor with a different number of keys is rejected."""
+    cursor = encode_cursor("next", [1, 2])
+    with pytest.raises(HTTPException):
+        keyset_paginate(items, items.query(Item), [Item.id], cursor, 4)
+
+
+def test_keyset_without_limit(items):
+    """No limit returns every row in one page."""
+    page = keyset_paginate(items, items.query(Item), [Item.id])
+    assert ids(page) == list(range(1, 11))
+    assert page.next_cursor is None
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_keyset_invalid_limit(items, limit):
+    """A limit that is not positive is rejected, not read as no limit."""
+    with pytest.raises(HTTPException) as error:
+        keyset_paginate(items, items.query(Item), [Item.id], limit=limit)
+    assert error.value.status_code == 422
@@ -0,0 +1,36 @@
+# Copyright (c) 2022, 2023 Humanitarian OpenStreetMap Team
+#
+# This file is part of FMTM.
+#
+#     FMTM is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     FMTM is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with FMTM.  If not, see <https:#www.gnu.org/licenses/>.
+#
+
+import pytest
+
+from app.db.postgis_utils import GeometryOptions, geometry_options, zoom_tolerance
+
+
+def test_zoom_tolerance():
+    """The tolerance is one pixel of a 256 pixels tile, halving with each zoom."""
+    assert zoom_tolerance(0) == pytest.approx(360 / 256)
+    for zoom in range(1, 23):
+        assert zoom_tolerance(zoom) == pytest.approx(zoom_tolerance(zoom - 1) / 2)
+
+
+def test_geometry_options():
+    """An explicit tolerance overrides the zoom, and no tolerance means none."""
+    dependency = geometry_options(zoom=12)
+    assert dependency(7, None, 12) == GeometryOptions(7, zoom_tolerance(12))
+    assert dependency(5, 0.01, 12) == GeometryOptions(5, 0.01)
+    assert dependency(7, None, None) == GeometryOptions(7, None)
@@ -0,0 +1,163 @@
+# Copyright (c) 2022, 2023 Humanitarian OpenStreetMap Team
+#
+# This file is part of FMTM.
+#
+#     FMTM is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     FMTM is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with FMTM.  If not, see <https:#www.gnu.org/licenses/>.
+#
+"""Tests of fast_response and the conditional GET helpers."""
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+from app.models.enums import ProjectStatus, TaskStatus
+from app.projects import project_schemas
+from app.responses.responses import RawJSON, fast_response, make_etag, not_modified
+from app.tasks.tasks_schemas import TaskStatusOption
+
+
+def square(x, y, size=0.001):
+    """Build the GeoJSON Feature of a square task, as stored in the database."""
+    ring = [
+        [x, y],
+        [x + size, y],
+        [x + size, y + size],
+        [x, y + size],
+        [x, y],
+    ]
+    return {
+        "type": "Feature",
+        "id": None,
+        "geometry": {"type": "Polygon", "coordinates": [ring]},
+        "properties": {},
+        "bbox": [x, y, x + size, y + size],
+    }
+
+
+def make_project(tasks):
+    """Build an object shaped like the project returned by get_project_by_id."""
+    project_tasks = []
+    for index in range(tasks):
+        outline = square(85.3 + (index % 100) * 0.001, 27.7 + (index // 100) * 0.001)
+        outline["id"] = index + 1
+        outline["properties"] = {"fid": index, "uid": index + 1, "name": str(index)}
+        project_tasks.append(
+            SimpleNamespace(
+                id=index + 1,
+                project_id=1,
+                project_task_index=index,
+                project_task_name=str(index),
+                outline_geojson=outline,
+                outline_centroid={
+                    "type": "Feature",
+                    "geometry": {
+                        "type": "Point",
+                        "coordinates": outline["geometry"]["coordinates"][0][0],
+                    },
+                    "properties": {},
+                },
+                task_status=TaskStatus.READY,
+                task_status_str=TaskStatusOption.READY,
+                locked_by_uid=None,
+                locked_by_username=None,
+                qr_code_url=f"/tasks/{index + 1}/qr-code?v={index + 1}",
+                task_history=[
+                    SimpleNamespace(
+                        id=index + 1,
+                        action_text="Status changed from READY to LOCKED_FOR_MAPPING",
+                        action_date=datetime(2023, 1, 1),
+                    )
+                ],
+            )
+        )
+
+    return SimpleNamespace(
+        id=1,
+        odkid=1,
+        author=SimpleNamespace(id=1, username="mapper"),
+        project_info=[
+            SimpleNamespace(name="Bench", short_description="", description="")
+        ],
+        status=ProjectStatus.PUBLISHED,
+        outline_geojson=square(85.3, 27.7, 0.1),
+        project_tasks=project_tasks,
+        xform_title="buildings",
+        hashtags=["#fmtm"],
+    )
+
+
+def default_encoding(project):
+    """Encode the project the way FastAPI does for a response_model."""
+    model = project_schemas.ProjectOut.from_orm(project)
+    return json.dumps(jsonable_encoder(model)).encode("utf-8")
+
+
+def fast_encoding(project):
+    """Encode the project with fast_response."""
+    return fast_response(project_schemas.ProjectOut, project).body
+
+
+def test_fast_response_matches_response_model():
+    """fast_response returns the same document as the response_model path."""
+    project = make_project(tasks=50)
+    assert json.loads(default_encoding(project)) == json.loads(fast_encoding(project))
+
+
+def test_fast_response_splices_raw_json():
+    """GeoJSON encoded by the database is returned unchanged."""
+    project = make_project(tasks=50)
+    expected = json.loads(default_encoding(project))
+
+    project.outline_geojson = RawJSON(json.dumps(project.outline_geojson))
+    for task in project.project_tasks:
+        task.outline_geojson = RawJSON(json.dumps(task.outline_geojson))
+
+    assert json.loads(fast_encoding(project)) == expected
+    assert json.loads(default_encoding(project)) == expected
+
+
+def test_make_etag():
+    """ETags are quoted, stable, and change with any of their parts."""
+    etag = make_etag("project", 1, 7)
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag == make_etag("project", 1, 7)
+    assert etag != make_etag("project", 1, 8)
+    assert make_etag("a", "bc") != make_etag("ab", "c")
+
+
+@pytest.mark.parametrize(
+    "if_none_match, matches",
+    [
+        (None, False),
+        ("", False),
+        ('"other"', False),
+        ("{etag}", True),
+        ("W/{etag}", True),
+        ('"other", {etag}', True),
+        ("*", True),
+    ],
+)
+def test_not_modified(if_none_match, matches):
+    """A matching If-None-Match gets a 304 carrying the ETag, others get None."""
+    etag = make_etag("project", 1)
+    if if_none_match:
+        if_none_match = if_none_match.format(etag=etag)
+    response = not_modified(etag, if_none_match)
+    if matches:
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+    else:
+        assert response is None
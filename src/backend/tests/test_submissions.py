@@ -0,0 +1,217 @@
+# Copyright (c) 2022, 2023 Humanitarian OpenStreetMap Team
+#
+# This file is part of FMTM.
+#
+#     FMTM is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     FMTM is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with FMTM.  If not, see <https:#www.gnu.org/licenses/>.
+#
+
+import pytest
+
+from app.db import db_models
+from app.models.enums import BackgroundTaskStatus
+from app.submission import submission_crud
+from app.users import user_schemas
+from app.users.user_crud import create_user
+
+
+def make_submission(instance_id, submitted_at, updated_at=None):
+    """Build a submission as the OData API of ODK Central returns it."""
+    return {
+        "__id": instance_id,
+        "__system": {
+            "submissionDate": submitted_at,
+            "updatedAt": updated_at,
+            "submitterName": "mapper",
+        },
+        "meta": {"instanceID": instance_id},
+        "xlocation": "27.7 85.3 0.0 4.0",
+        "building": "yes",
+    }
+
+
+class FakeResponse:
+    """The parts of a requests response the ingest code reads."""
+
+    def __init__(self, body, status_code=200):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        """Return the decoded body."""
+        return self.body
+
+
+class FakeCentral:
+    """Serves canned OData pages of submissions, as ODK Central does."""
+
+    base = "http://central/v1/"
+    auth = None
+    verify = True
+
+    def __init__(self):
+        self.session = self
+        self.forms = {}
+        self.filters = []
+        self.broken = set()
+
+    def get(self, url, params=None, **kwargs):
+        """Return one page of the submissions of a form, after the filter."""
+        xml_form_id = url.split("/forms/")[1].split(".svc")[0]
+        if xml_form_id in self.broken:
+            return FakeResponse({}, status_code=500)
+        submissions = self.forms.get(xml_form_id, [])
+
+        if params.get("$count"):
+            return FakeResponse({"value": [], "@odata.count": len(submissions)})
+
+        query = params.get("$filter")
+        self.filters.append(query)
+        if query:
+            since = query.split(" gt ")[1].split(" or ")[0]
+            submissions = [
+                s
+                for s in submissions
+                if max(
+                    s["__system"]["submissionDate"], s["__system"]["updatedAt"] or ""
+                )
+                > since
+            ]
+
+        skip, top = params["$skip"], params["$top"]
+        return FakeResponse({"value": submissions[skip : skip + top]})
+
+
+@pytest.fixture
+def central(monkeypatch):
+    """Replace ODK Central with a FakeCentral."""
+    fake = FakeCentral()
+    monkeypatch.setattr(submission_crud, "get_odk_form", lambda credentials: fake)
+    return fake
+
+
+@pytest.fixture
+def project(db):
+    """Create a project linked to ODK Central, with two tasks."""
+    user = create_user(db, user_schemas.UserIn(username="ingest", password="ingest"))
+    project = db_models.DbProject(
+        author_id=user.id,
+        odkid=1,
+        project_name_prefix="ingest",
+        odk_central_url="http://central",
+        odk_central_user="user",
+        odk_central_password="password",
+    )
+    project.tasks = [db_models.DbTask(), db_models.DbTask()]
+    db.add(project)
+    db.commit()
+    return project
+
+
+def test_ingest_submissions(project, central, client):
+    """Only new submissions are pulled, and the per-task counts follow."""
+    first, second = (task.id for task in project.tasks)
+    central.forms[str(first)] = [
+        make_submission("uuid:1", "2023-06-01T10:00:00.000Z"),
+        make_submission("uuid:2", "2023-06-01T11:00:00.000Z"),
+    ]
+    central.forms[str(second)] = [
+        make_submission("uuid:3", "2023-06-02T09:00:00.000Z"),
+    ]
+
+    response = client.post(f"/submission/ingest/{project.id}")
+    assert response.json() == {"ingested": 3}
+
+    central.forms[str(first)].append(
+        make_submission("uuid:4", "2023-06-03T08:00:00.000Z")
+    )
+    central.filters.clear()
+
+    response = client.post(f"/submission/ingest/{project.id}")
+    assert response.json() == {"ingested": 1}
+    # Only submissions newer than the last ingested one are requested
+    assert (
+        "__system/submissionDate gt 2023-06-01T11:00:00.000Z"
+        " or __system/updatedAt gt 2023-06-01T11:00:00.000Z"
+    ) in central.filters
+
+    response = client.get(f"/submission/get-submission-count/{project.id}")
+    assert response.json() == 4
+
+    response = client.get("/tasks/tasks-features/", params={"project_id": project.id})
+    counts = {task["task_id"]: task["submission_count"] for task in response.json()}
+    assert counts == {first: 3, second: 1}
+
+
+def test_sync_status(project, central, client):
+    """A task that fails to sync is recorded as failed, the others still sync."""
+    first, second = (task.id for task in project.tasks)
+    central.forms[str(first)] = [
+        make_submission("uuid:1", "2023-06-01T10:00:00.000Z"),
+    ]
+    central.broken.add(str(second))
+
+    response = client.post(f"/submission/ingest/{project.id}")
+    assert response.json() == {"ingested": 1}
+
+    response = client.get(f"/submission/sync-status/{project.id}")
+    status = {task["task_id"]: task for task in response.json()}
+    assert status[first]["status"] == BackgroundTaskStatus.SUCCESS
+    assert status[first]["submission_count"] == 1
+    assert status[second]["status"] == BackgroundTaskStatus.FAILED
+    assert "500" in status[second]["message"]
+
+    central.broken.clear()
+    response = client.post(f"/submission/ingest/{project.id}")
+    response = client.get(f"/submission/sync-status/{project.id}")
+    status = {task["task_id"]: task for task in response.json()}
+    assert status[second]["status"] == BackgroundTaskStatus.SUCCESS
+    assert status[second]["message"] is None
+
+
+def test_counts_before_sync(project, central, client):
+    """Tasks that were never synced are counted in ODK Central."""
+    first, second = (task.id for task in project.tasks)
+    central.forms[str(first)] = [
+        make_submission("uuid:1", "2023-06-01T10:00:00.000Z"),
+        make_submission("uuid:2", "2023-06-01T11:00:00.000Z"),
+    ]
+
+    response = client.get(f"/submission/get-submission-count/{project.id}")
+    assert response.json() == 2
+
+    response = client.get("/tasks/tasks-features/", params={"project_id": project.id})
+    counts = {task["task_id"]: task["submission_count"] for task in response.json()}
+    assert counts == {first: 2, second: 0}
+
+
+def test_ingest_edited_submissions(project, central, client, db):
+    """A submission edited after the last sync is pulled again."""
+    first, _ = (task.id for task in project.tasks)
+    central.forms[str(first)] = [
+        make_submission("uuid:1", "2023-06-01T10:00:00.000Z"),
+    ]
+    client.post(f"/submission/ingest/{project.id}")
+
+    edited = make_submission(
+        "uuid:1", "2023-06-01T10:00:00.000Z", "2023-06-02T10:00:00.000Z"
+    )
+    edited["building"] = "house"
+    central.forms[str(first)] = [edited]
+
+    response = client.post(f"/submission/ingest/{project.id}")
+    # Edits are not new submissions
+    assert response.json() == {"ingested": 0}
+    submission = db.query(db_models.DbSubmission).get("uuid:1")
+    db.refresh(submission)
+    assert submission.data["building"] == "house"
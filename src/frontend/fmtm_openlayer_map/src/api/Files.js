@@ -1,5 +1,6 @@
 import React,{ useEffect, useState } from "react";
 import CoreModules from "fmtm/CoreModules";
+import environment from "fmtm/environment";
  
 export const ProjectFilesById = (url, taskId) => {
   const [loading, setLoading] = useState(true);
@@ -16,8 +17,10 @@ export const ProjectFilesById = (url, taskId) => {
         const taskIndex = resp.project_tasks.findIndex(
           (task) => task.id == taskId
         );
-        const getQrcodeByIndex = resp.project_tasks[taskIndex].qr_code_base64;
-        setQrcode(getQrcodeByIndex);
+        const getQrcodeByIndex = resp.project_tasks[taskIndex].qr_code_url;
+        setQrcode(
+          getQrcodeByIndex ? `${environment.baseApiUrl}${getQrcodeByIndex}` : ""
+        );
         setLoading(false);
       } catch (error) {
         setLoading(false);
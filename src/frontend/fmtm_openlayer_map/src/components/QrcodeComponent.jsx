@@ -64,7 +64,7 @@ const TasksComponent = ({ type, task, defaultTheme }) => {
                 ) : (
                   <img
                     id="qrcodeImg"
-                    src={`data:image/png;base64,${qrcode}`}
+                    src={qrcode}
                     alt="qrcode"
                   />
                 )}
@@ -84,12 +84,16 @@ const TasksComponent = ({ type, task, defaultTheme }) => {
                   justifyContent={"center"}
                 >
                   <CoreModules.IconButton
-                    onClick={() => {
-                      const linkSource = `data:image/png;base64,${qrcode}`;
+                    onClick={async () => {
+                      const image = await CoreModules.axios.get(qrcode, {
+                        responseType: "blob",
+                      });
+                      const linkSource = URL.createObjectURL(image.data);
                       const downloadLink = document.createElement("a");
                       downloadLink.href = linkSource;
                       downloadLink.download = `Task_${task}`;
                       downloadLink.click();
+                      URL.revokeObjectURL(linkSource);
                     }}
                     disabled={qrcode == "" ? true : false}
                     color="info"
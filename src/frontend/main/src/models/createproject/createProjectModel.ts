@@ -61,7 +61,7 @@ export interface ProjectDetailsModel {
         action_text: string;
         action_date: string;
       }[];
-      qr_code_base64: string;
+      qr_code_url: string | null;
       task_status_str: string;
     }[];
   }
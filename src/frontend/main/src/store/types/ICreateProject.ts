@@ -54,7 +54,7 @@ export type ProjectTaskTypes = {
   locked_by_uid: number | null;
   locked_by_username: string | null;
   task_history: any[];
-  qr_code_base64: string;
+  qr_code_url: string | null;
   task_status_str: string;
 };
 